@@ -4,8 +4,9 @@ from Constants import *
 import gym
 
 class HarfangEnv():
-    def __init__(self):      
+    def __init__(self, action_repeat=1):
         self.done = False
+        self.action_repeat = action_repeat # scene updates per step (frame skip)
         self.loc_diff = 0
         self.action_space = gym.spaces.Box(low=np.array([-1.0,-1.0,-1.0]), high=np.array([1.0,1.0,1.0]), dtype=np.float64)
         self.Plane_ID_oppo = "ennemy_2" # Opponent aircrafts name
@@ -16,6 +17,10 @@ class HarfangEnv():
         self.Plane_Irtifa = 0
         self.plane_heading = 0
         self.plane_heading_2 = 0
+        # Server computes only the fields used by _get_observation
+        self.spec_id = "harfang_env"
+        df.register_observation_spec(self.spec_id, ["position", "Euler_angles", "heading", "pitch_attitude", "roll_attitude",
+                                                    "target_locked", "target_angle"])
 
     def reset(self): # reset simulation beginning of episode
         self.done = False
@@ -26,8 +31,8 @@ class HarfangEnv():
         return state_ally
 
     def step(self, action_ally):
-        self._apply_action(action_ally) # apply neural networks output
-        state_ally = self._get_observation() # in each step, get observation
+        states = self._apply_action(action_ally) # apply neural networks output, get back new planes states
+        state_ally = self._get_observation(states) # in each step, get observation
         self._get_reward() # get reward value
         self._get_termination() # check termination conditions
 
@@ -63,16 +68,13 @@ class HarfangEnv():
 
 
     def _apply_action(self,action_ally):
-        df.set_plane_pitch(self.Plane_ID_ally, float(action_ally[0]))
-        df.set_plane_roll(self.Plane_ID_ally, float(action_ally[1]))
-        df.set_plane_yaw(self.Plane_ID_ally, float(action_ally[2]))
-
-        df.set_plane_pitch(self.Plane_ID_oppo, float(0))
-        df.set_plane_roll(self.Plane_ID_oppo, float(0))
-        df.set_plane_yaw(self.Plane_ID_oppo, float(0))
-        df.update_scene()
-        if self.Ally_target_locked:
-            df.fire_missile(self.Plane_ID_ally,0)
+        # One STEP round trip: actions, scene updates and observations
+        actions = {
+            self.Plane_ID_ally: {"pitch": float(action_ally[0]), "roll": float(action_ally[1]), "yaw": float(action_ally[2]),
+                                 "fire": 0 if self.Ally_target_locked else None},
+            self.Plane_ID_oppo: {"pitch": float(0), "roll": float(0), "yaw": float(0)}
+        }
+        return df.step(actions, self.action_repeat, [self.Plane_ID_ally, self.Plane_ID_oppo], self.spec_id)
 
         
 
@@ -85,23 +87,25 @@ class HarfangEnv():
 
 
     def _reset_machine(self):
-        df.set_health("ennemy_2",1)
-        df.reset_machine_matrix(self.Plane_ID_oppo, 0, 4200, 0, 0, 0, 0)
-        df.reset_machine_matrix(self.Plane_ID_ally, 0, 3500, -4000, 0, 0, 0)
-
-        df.set_plane_thrust(self.Plane_ID_ally,1)
-        df.set_plane_thrust(self.Plane_ID_oppo, 0.6)
-        df.set_plane_linear_speed(self.Plane_ID_ally,300)
-        df.set_plane_linear_speed(self.Plane_ID_oppo, 200)
-        df.retract_gear(self.Plane_ID_ally)
-        df.retract_gear(self.Plane_ID_oppo)
+        with df.batch():
+            df.set_health("ennemy_2",1)
+            # Matrix, speed, thrust and JSBSim FDM reset
+            df.reset_machine_state(self.Plane_ID_oppo, 0, 4200, 0, 0, 0, 0, 200, 0.6)
+            df.reset_machine_state(self.Plane_ID_ally, 0, 3500, -4000, 0, 0, 0, 300, 1)
+            df.retract_gear(self.Plane_ID_ally)
+            df.retract_gear(self.Plane_ID_oppo)
 
     def _get_loc_diff(self):
         self.loc_diff = (((self.Aircraft_Loc[0] - self.Oppo_Loc[0]) ** 2) + ((self.Aircraft_Loc[1] - self.Oppo_Loc[1]) ** 2) + ((self.Aircraft_Loc[2] - self.Oppo_Loc[2]) ** 2)) ** (1 / 2)
     
-    def  _get_observation(self):
+    def  _get_observation(self, states=None):
+        if states is None:
+            with df.batch() as states:
+                df.get_observation(self.Plane_ID_ally, self.spec_id)
+                df.get_observation(self.Plane_ID_oppo, self.spec_id)
+        plane_state, Oppo_state = states
+
         # Plane States
-        plane_state = df.get_plane_state(self.Plane_ID_ally)
         Plane_Pos = [plane_state["position"][0] / NormStates["Plane_position"],
                      plane_state["position"][1] / NormStates["Plane_position"],
                      plane_state["position"][2] / NormStates["Plane_position"]]
@@ -111,8 +115,6 @@ class HarfangEnv():
         Plane_Heading = plane_state["heading"] / NormStates["Plane_heading"]
         
         # Opponent States
-        Oppo_state = df.get_plane_state(self.Plane_ID_oppo)
-
         Oppo_Pos = [Oppo_state["position"][0] / NormStates["Plane_position"],
                        Oppo_state["position"][1] / NormStates["Plane_position"],
                        Oppo_state["position"][2] / NormStates["Plane_position"]]
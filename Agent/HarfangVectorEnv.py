@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+import socket
+import subprocess
+import numpy as np
+import gymnasium
+import socket_lib
+import dogfight_client as df
+from HarfangEnv_GYM import HarfangEnv
+
+# Vectorized HarfangEnv: one headless sandbox process per env, each env runs in its own worker process
+# (HarfangEnv uses the dogfight_client module functions: one connection per process). Steps are asynchronous, finished episodes are
+# reset automatically and observations / rewards are stacked NumPy arrays (gymnasium.vector.AsyncVectorEnv).
+#
+#   envs = make_vector_env(8, base_port=57805)
+#   states, infos = envs.reset()
+#   states, rewards, terminated, truncated, infos = envs.step(actions)    # actions: (8, 3)
+
+sandbox_source_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "source")
+
+
+class SandboxProcess:
+    """
+    Headless sandbox ("main.py --headless") listening on its own port.
+    """
+
+    def __init__(self, port, host=None, log_file=None, start_timeout=120):
+        self.port = port
+        self.host = socket_lib.HOST if host is None else host
+        self.log_file = log_file
+        self.start_timeout = start_timeout
+        self.process = None
+
+    def start(self):
+        if self.log_file is not None:
+            output = open(self.log_file, "a")
+        else:
+            output = subprocess.DEVNULL
+        self.process = subprocess.Popen([sys.executable, "main.py", "--headless", "--port", str(self.port)],
+                                        cwd=sandbox_source_folder, stdout=output, stderr=subprocess.STDOUT)
+        if output is not subprocess.DEVNULL:
+            output.close()
+        self.wait_ready()
+
+    def wait_ready(self):
+        # The sandbox is ready when its network server accepts connections
+        t0 = time.time()
+        while time.time() - t0 < self.start_timeout:
+            if not self.is_running():
+                raise RuntimeError("Sandbox on port %d exited with code %s" % (self.port, str(self.process.returncode)))
+            try:
+                probe = socket.create_connection((self.host, self.port), timeout=1)
+                probe.close()
+                return
+            except OSError:
+                time.sleep(0.5)
+        raise TimeoutError("Sandbox on port %d not ready after %d s" % (self.port, self.start_timeout))
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.is_running():
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+
+class HarfangGymnasiumEnv(gymnasium.Env):
+    """
+    Gymnasium API of HarfangEnv, with its own sandbox process.
+    Must run in its own process (see make_vector_env()): HarfangEnv uses the dogfight_client default client.
+    If the sandbox dies, it is restarted and the running episode is truncated.
+    """
+
+    def __init__(self, port, host=None, action_repeat=1, max_episode_steps=11000, launch_sandbox=True, log_file=None):
+        self.sandbox = SandboxProcess(port, host, log_file)
+        self.launch_sandbox = launch_sandbox
+        self.action_repeat = action_repeat
+        self.max_episode_steps = max_episode_steps
+        self.num_steps = 0
+        self.env = None
+        self.observation_space = gymnasium.spaces.Box(low=-np.inf, high=np.inf, shape=(11,), dtype=np.float64)
+        self.action_space = gymnasium.spaces.Box(low=-1.0, high=1.0, shape=(3,), dtype=np.float64)
+        self._connect()
+
+    def _connect(self):
+        if self.launch_sandbox:
+            self.sandbox.restart()
+        df.connect(self.sandbox.host, self.sandbox.port)
+        df.disable_log()
+        df.set_renderless_mode(True)
+        df.set_client_update_mode(True)
+        self.env = HarfangEnv(self.action_repeat)
+
+    def _restart_sandbox(self):
+        df.disconnect()
+        self._connect()
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        if self.launch_sandbox and not self.sandbox.is_running():
+            self._restart_sandbox()
+        self.num_steps = 0
+        return self.env.reset(), {}
+
+    def step(self, action):
+        try:
+            state, reward, done, info = self.env.step(action)
+        except Exception:
+            if not self.launch_sandbox or self.sandbox.is_running():
+                raise
+            self._restart_sandbox()
+            state, info = self.reset()
+            return state, 0.0, False, True, {"sandbox_restarted": True}
+        self.num_steps += 1
+        truncated = self.max_episode_steps is not None and self.num_steps >= self.max_episode_steps
+        return state, float(reward), done, truncated and not done, info
+
+    def close(self):
+        if self.env is not None:
+            df.disconnect()
+            self.env = None
+        if self.launch_sandbox:
+            self.sandbox.stop()
+
+
+def make_vector_env(num_envs, base_port=57805, host=None, action_repeat=1, max_episode_steps=11000, launch_sandbox=True, log_folder=None):
+    """
+    num_envs environments on ports base_port, base_port + 1, ... stepped in parallel worker processes.
+    launch_sandbox=False: connects to sandboxes already running on these ports.
+    log_folder: sandboxes outputs, one "sandbox_<port>.log" file per process (default: discarded)
+    """
+    def env_function(port):
+        log_file = None if log_folder is None else os.path.join(log_folder, "sandbox_%d.log" % port)
+        return lambda: HarfangGymnasiumEnv(port, host, action_repeat, max_episode_steps, launch_sandbox, log_file)
+
+    return gymnasium.vector.AsyncVectorEnv([env_function(base_port + i) for i in range(num_envs)])
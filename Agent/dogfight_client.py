@@ -1,341 +1,563 @@
 import json
+import numpy as np
+import asyncio
+import socket
+from contextlib import contextmanager, asynccontextmanager
 import socket_lib
 
 
-def connect(_host, _port):
-	socket_lib.connect_socket(_host, _port)
 
+def check_answer_array_size(answer, expected_size=None):
+	# A failed command answers an error json instead of the binary records
+	if expected_size is None:
+		expected_size = len(answer) - len(answer) % 4
+	if len(answer) != expected_size or bytes(answer[:9]) == b'{"error":':
+		raise ValueError("Binary answer of %d bytes, %d expected: %s" % (len(answer), expected_size, bytes(answer[:200]).decode(errors="replace")))
+
+
+class DogfightClient:
+	"""
+	Connection to one sandbox. Several clients can drive several sandboxes from the same process:
+
+	clients = [DogfightClient() for port in ports]
+	for client, port in zip(clients, ports):
+		client.connect(host, port)
 
-def disconnect():
-	socket_lib.close_socket()
+	The module functions (df.connect(), df.step()...) use a default client.
+	"""
 
+	def __init__(self):
+		self.connection = socket_lib.Connection()
+		self.batch_commands = None  # Commands queued by batch()
+		self.current_arena = None  # Arena addressed by the commands (None: server current arena)
+
+	def connect(self, _host, _port):
+		self.connection.connect(_host, _port)
+
+	def disconnect(self):
+		self.connection.close()
+
+	def send_command(self, command):
+		if self.current_arena is not None:
+			command = {"command": command["command"], "args": dict(command["args"], arena=self.current_arena)}
+		if self.batch_commands is not None:
+			self.batch_commands.append(command)
+		else:
+			self.connection.send_message(str.encode(json.dumps(command)))
+
+	def get_answer(self):
+		# Inside a batch, answers are only available when the batch is flushed
+		if self.batch_commands is not None:
+			return None
+		return json.loads((self.connection.get_answer()).decode())
+
+	@contextmanager
+	def batch(self):
+		"""
+		Queues the commands called in the "with" block and sends them in one BATCH message on exit.
+		The yielded list is filled with one answer per queued command (None for commands without answer):
+
+		with df.batch() as answers:
+			df.set_plane_pitch("ally_1", 0.1)
+			df.update_scene()
+			df.get_plane_state("ally_1")
+		state = answers[2]
+		"""
+		answers = []
+		self.batch_commands = []
+		try:
+			yield answers
+			commands = self.batch_commands
+			self.batch_commands = None
+			if len(commands) > 0:
+				self.send_command({"command": "BATCH", "args": {"commands": commands}})
+				answers.extend(self.get_answer())
+		finally:
+			self.batch_commands = None
+
+	# Globals
+
+	def set_current_arena(self, arena_id):
+		# Next commands run on this arena (None: server current arena)
+		self.current_arena = arena_id
+
+	def get_arenas(self):
+		self.send_command({"command": "GET_ARENAS", "args": {}})
+		return self.get_answer()
+
+	def disable_log(self):
+		self.send_command({"command": "DISABLE_LOG", "args": {}})
+
+	def enable_log(self):
+		self.send_command({"command": "ENABLE_LOG", "args": {}})
+
+	def enable_profiler(self):
+		self.send_command({"command": "ENABLE_PROFILER", "args": {}})
+
+	def disable_profiler(self):
+		self.send_command({"command": "DISABLE_PROFILER", "args": {}})
+
+	def get_profile(self):
+		# {"enabled", "num_ticks", "history_size", "scopes": {name: {"last", "min", "mean", "p99", "max" (ms per tick), "calls", "ticks"}}}
+		self.send_command({"command": "GET_PROFILE", "args": {}})
+		state = self.get_answer()
+		return state
+
+	def get_running(self):
+		self.send_command({"command": "GET_RUNNING", "args": {}})
+		return self.get_answer()
+
+	def set_timestep(self, t):
+		self.send_command({"command": "SET_TIMESTEP", "args": {"timestep": t}})
+
+	def get_timestep(self):
+		self.send_command({"command": "GET_TIMESTEP", "args": {}})
+		return self.get_answer()
+
+	def set_renderless_mode(self, flag: bool):
+		self.send_command({"command": "SET_RENDERLESS_MODE", "args": {"flag": flag}})
+
+	def set_client_update_mode(self, flag: bool):
+		self.send_command({"command": "SET_CLIENT_UPDATE_MODE", "args": {"flag": flag}})
+
+	def set_display_radar_in_renderless_mode(self, flag: bool):
+		self.send_command({"command": "SET_DISPLAY_RADAR_IN_RENDERLESS_MODE", "args": {"flag": flag}})
+
+	def update_scene(self):
+		self.send_command({"command": "UPDATE_SCENE", "args": {}})
+
+	def step(self, actions: dict, ticks=1, observe=[], spec_id=None):
+		# actions: {plane_id: {"pitch": level, "roll": level, "yaw": level, "thrust": level, "fire": slot_id}}
+		# Returns the states of the "observe" machines after "ticks" scene updates
+		# With an observation spec, "observe" items can be machine_id or [machine_id, other_id]
+		self.send_command({"command": "STEP", "args": {"actions": actions, "ticks": ticks, "observe": observe, "spec_id": spec_id}})
+		return self.get_answer()
+
+	def set_state_encoding(self, encoding):
+		# "json" (default) or "binary": GET_PLANE_STATE, GET_MISSILE_STATE, GET_MISSILE_LAUNCHER_STATE and STEP answers
+		self.send_command({"command": "SET_STATE_ENCODING", "args": {"encoding": encoding}})
+
+	def get_state_schema(self, state_type):
+		# state_type: "plane", "missile" or "missile_launcher". Fields offsets and sizes are counted in float32
+		self.send_command({"command": "GET_STATE_SCHEMA", "args": {"state_type": state_type}})
+		return self.get_answer()
+
+	def get_answer_array(self, out=None):
+		# Binary state answer, decoded in "out" (preallocated float32 array) if given
+		# Raises OSError if no answer could be read, ValueError if the answer is not the expected records size
+		self.connection.logger = ""
+		if out is None:
+			answer = self.connection.get_answer()
+			if answer is None:
+				raise OSError("Binary answer failed: " + (self.connection.logger or "connection closed"))
+			check_answer_array_size(answer)
+			return np.frombuffer(answer, dtype="<f4").copy()
+		size = self.connection.get_answer_into(out)
+		if size is None:
+			raise OSError("Binary answer failed: " + (self.connection.logger or "connection closed"))
+		check_answer_array_size(memoryview(out).cast("B")[:size], out.nbytes)
+		return out
+
+	def step_array(self, actions: dict, ticks=1, observe=[], spec_id=None, out=None):
+		# Binary encoding version of step(): the states records are concatenated in "observe" order
+		self.send_command({"command": "STEP", "args": {"actions": actions, "ticks": ticks, "observe": observe, "spec_id": spec_id}})
+		return self.get_answer_array(out)
+
+	def step_arenas(self, actions_list: list, ticks=1, observe=[], spec_id=None):
+		# step() on all arenas: actions_list holds one actions dict per arena, the same "observe" machines are returned for each arena
+		self.send_command({"command": "STEP_ARENAS", "args": {"actions": actions_list, "ticks": ticks, "observe": observe, "spec_id": spec_id}})
+		return self.get_answer()
+
+	def step_arenas_array(self, actions_list: list, ticks=1, observe=[], spec_id=None, out=None):
+		# Binary encoding version of step_arenas(): array shaped (num arenas, len(observe), record size)
+		self.send_command({"command": "STEP_ARENAS", "args": {"actions": actions_list, "ticks": ticks, "observe": observe, "spec_id": spec_id}})
+		states = self.get_answer_array(out)
+		if len(observe) == 0:
+			return states
+		return states.reshape(len(actions_list), len(observe), -1)
+
+	def register_observation_spec(self, spec_id, fields: list):
+		# Returns the spec binary layout (fields offsets and sizes in float32)
+		self.send_command({"command": "REGISTER_OBSERVATION_SPEC", "args": {"spec_id": spec_id, "fields": fields}})
+		return self.get_answer()
+
+	def get_observation(self, machine_id, spec_id, other_id=None):
+		# other_id: machine used by "relative_..." fields (default: current target)
+		self.send_command({"command": "GET_OBSERVATION", "args": {"spec_id": spec_id, "machine_id": machine_id, "other_id": other_id}})
+		return self.get_answer()
+
+	def get_observation_array(self, machine_id, spec_id, other_id=None, out=None):
+		self.send_command({"command": "GET_OBSERVATION", "args": {"spec_id": spec_id, "machine_id": machine_id, "other_id": other_id}})
+		return self.get_answer_array(out)
+
+	def display_vector(self, position, direction, label, label_offset2D, color, label_size):
+		self.send_command({"command": "DISPLAY_VECTOR", "args": {"position": position, "direction": direction, "label": label, "label_offset2D": label_offset2D, "color": color, "label_size": label_size}})
+
+	def display_2DText(self, position, text, size, color):
+		self.send_command({"command": "DISPLAY_2DTEXT", "args": {"position": position, "text": text, "size": size, "color": color}})
+
+	# Machines
+
+	def get_mobile_parts_list(self, machine_id):
+		self.send_command({"command": "GET_MOBILE_PARTS_LIST", "args": {"machine_id": machine_id}})
+		return self.get_answer()
+
+	def set_machine_custom_physics_mode(self, machine_id, flag: bool):
+		self.send_command({"command": "SET_MACHINE_CUSTOM_PHYSICS_MODE", "args": {"machine_id": machine_id, "flag": flag}})
+
+	def get_machine_custom_physics_mode(self, machine_id):
+		self.send_command({"command": "GET_MACHINE_CUSTOM_PHYSICS_MODE", "args": {"machine_id": machine_id}})
+		state = self.get_answer()
+		return state
+
+	def update_machine_kinetics(self, machine_id, matrix_3_4: list, speed_vector: list):
+		self.send_command({"command": "UPDATE_MACHINE_KINETICS", "args": {"machine_id": machine_id, "matrix": matrix_3_4, "v_move": speed_vector}})
+
+	def get_targets_list(self, machine_id):
+		self.send_command({"command": "GET_TARGETS_LIST", "args": {"machine_id": machine_id}})
+		state = self.get_answer()
+		return state
+
+	def get_target_idx(self, machine_id):
+		self.send_command({"command": "GET_TARGET_IDX", "args": {"machine_id": machine_id}})
+		state = self.get_answer()
+		return state
+
+	def set_target_id(self, machine_id, target_id):
+		# target_id: index in targets list. 0 = no target
+		self.send_command({"command": "SET_TARGET_ID", "args": {"machine_id": machine_id, "target_id": target_id}})
+
+	def get_health(self, machine_id):
+		self.send_command({"command": "GET_HEALTH", "args": {"machine_id": machine_id}})
+		state = self.get_answer()
+		return state
+
+	def set_health(self, machine_id, level):
+		self.send_command({"command": "SET_HEALTH", "args": {"machine_id": machine_id, "health_level": level}})
+
+	def get_machine_missiles_list(self, machine_id):
+		self.send_command({"command": "GET_MACHINE_MISSILES_LIST", "args": {"machine_id": machine_id}})
+		return self.get_answer()
+
+	def get_missiles_device_slots_state(self, machine_id):
+		self.send_command({"command": "GET_MISSILESDEVICE_SLOTS_STATE", "args": {"machine_id": machine_id}})
+		state = self.get_answer()
+		return state
+
+	def fire_missile(self, machine_id, slot_id):
+		self.send_command({"command": "FIRE_MISSILE", "args": {"machine_id": machine_id, "slot_id": slot_id}})
 
-# Globals
+	def rearm_machine(self, machine_id):
+		self.send_command({"command": "REARM_MACHINE", "args": {"machine_id": machine_id}})
 
-def disable_log():
-	socket_lib.send_message(str.encode(json.dumps({"command": "DISABLE_LOG", "args": {}})))
+	def reset_machine(self, machine_id):
+		self.send_command({"command": "RESET_MACHINE", "args": {"machine_id": machine_id}})
 
+	def reset_machine_matrix(self, machine_id, x, y, z, rx, ry, rz):
+		self.send_command({"command": "RESET_MACHINE_MATRIX", "args": {"machine_id": machine_id, "position": [x, y, z], "rotation": [rx, ry, rz]}})
 
-def enable_log():
-	socket_lib.send_message(str.encode(json.dumps({"command": "ENABLE_LOG", "args": {}})))
+	def reset_machine_state(self, machine_id, x, y, z, rx, ry, rz, linear_speed, thrust_level=None, trim=False):
+		# Matrix, linear speed, thrust level and JSBSim FDM (trim: trimmed initial condition, computed once then restored)
+		self.send_command({"command": "RESET_MACHINE_STATE", "args": {"machine_id": machine_id, "position": [x, y, z], "rotation": [rx, ry, rz],
+																	   "linear_speed": linear_speed, "thrust_level": thrust_level, "trim": trim}})
 
+	def activate_autopilot(self, machine_id):
+		self.send_command({"command": "ACTIVATE_AUTOPILOT", "args": {"machine_id": machine_id}})
 
-def get_running():
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_RUNNING", "args": {}})))
-	return json.loads((socket_lib.get_answer()).decode())
+	def deactivate_autopilot(self, machine_id):
+		self.send_command({"command": "DEACTIVATE_AUTOPILOT", "args": {"machine_id": machine_id}})
 
+	def activate_IA(self, machine_id):
+		self.send_command({"command": "ACTIVATE_IA", "args": {"machine_id": machine_id}})
 
-def set_timestep(t):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_TIMESTEP", "args": {"timestep": t}})))
+	def deactivate_IA(self, machine_id):
+		self.send_command({"command": "DEACTIVATE_IA", "args": {"machine_id": machine_id}})
 
+	def get_machine_gun_state(self, machine_id):
+		self.send_command({"command": "GET_MACHINE_GUN_STATE", "args": {"machine_id": machine_id}})
+		state = self.get_answer()
+		return state
 
-def get_timestep():
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_TIMESTEP", "args": {}})))
-	return json.loads((socket_lib.get_answer()).decode())
+	def activate_machine_gun(self, machine_id):
+		self.send_command({"command": "ACTIVATE_MACHINE_GUN", "args": {"machine_id": machine_id}})
 
+	def deactivate_machine_gun(self, machine_id):
+		self.send_command({"command": "DEACTIVATE_MACHINE_GUN", "args": {"machine_id": machine_id}})
 
-def set_renderless_mode(flag: bool):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_RENDERLESS_MODE", "args": {"flag": flag}})))
+	def is_autopilot_activated(self, machine_id):
+		self.send_command({"command": "IS_AUTOPILOT_ACTIVATED", "args": {"machine_id": machine_id}})
+		state = self.get_answer()
+		return state
 
+	def activate_autopilot(self, machine_id):
+		self.send_command({"command": "ACTIVATE_AUTOPILOT", "args": {"machine_id": machine_id}})
 
-def set_client_update_mode(flag: bool):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_CLIENT_UPDATE_MODE", "args": {"flag": flag}})))
+	def deactivate_autopilot(self, machine_id):
+		self.send_command({"command": "DEACTIVATE_AUTOPILOT", "args": {"machine_id": machine_id}})
 
+	def is_ia_activated(self, machine_id):
+		self.send_command({"command": "IS_IA_ACTIVATED", "args": {"machine_id": machine_id}})
+		state = self.get_answer()
+		return state
 
-def set_display_radar_in_renderless_mode(flag: bool):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_DISPLAY_RADAR_IN_RENDERLESS_MODE", "args": {"flag": flag}})))
+	def activate_ia(self, machine_id):
+		self.send_command({"command": "ACTIVATE_IA", "args": {"machine_id": machine_id}})
 
+	def deactivate_ia(self, machine_id):
+		self.send_command({"command": "DEACTIVATE_IA", "args": {"machine_id": machine_id}})
 
-def update_scene():
-	socket_lib.send_message(str.encode(json.dumps({"command": "UPDATE_SCENE", "args": {}})))
+	def is_user_control_activated(self, machine_id):
+		self.send_command({"command": "IS_USER_CONTROL_ACTIVATED", "args": {"machine_id": machine_id}})
+		state = self.get_answer()
+		return state
 
+	def activate_user_control(self, machine_id):
+		self.send_command({"command": "ACTIVATE_USER_CONTROL", "args": {"machine_id": machine_id}})
 
-def display_vector(position, direction, label, label_offset2D, color, label_size):
-	socket_lib.send_message(str.encode(json.dumps({"command": "DISPLAY_VECTOR", "args": {"position": position, "direction": direction, "label": label, "label_offset2D": label_offset2D, "color": color, "label_size": label_size}})))
+	def deactivate_user_control(self, machine_id):
+		self.send_command({"command": "DEACTIVATE_USER_CONTROL", "args": {"machine_id": machine_id}})
 
+	# Aircrafts
 
-def display_2DText(position, text, size, color):
-	socket_lib.send_message(str.encode(json.dumps({"command": "DISPLAY_2DTEXT", "args": {"position": position, "text": text, "size": size, "color": color}})))
+	def get_planes_list(self):
+		self.send_command({"command": "GET_PLANESLIST", "args": {}})
+		return self.get_answer()
 
+	def get_plane_state(self, plane_id):
+		self.send_command({"command": "GET_PLANE_STATE", "args": {"plane_id": plane_id}})
+		state = self.get_answer()
+		return state
 
-# Machines
+	def get_plane_state_array(self, plane_id, out=None):
+		self.send_command({"command": "GET_PLANE_STATE", "args": {"plane_id": plane_id}})
+		return self.get_answer_array(out)
 
-def get_mobile_parts_list(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_MOBILE_PARTS_LIST", "args": {"machine_id": machine_id}})))
-	return json.loads((socket_lib.get_answer()).decode())
+	def get_plane_thrust(self, plane_id):
+		self.send_command({"command": "GET_PLANE_THRUST", "args": {"plane_id": plane_id}})
+		state = self.get_answer()
+		return state
 
+	def set_plane_thrust(self, plane_id, level):
+		self.send_command({"command": "SET_PLANE_THRUST", "args": {"plane_id": plane_id, "thrust_level": level}})
 
-def set_machine_custom_physics_mode(machine_id, flag: bool):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_MACHINE_CUSTOM_PHYSICS_MODE", "args": {"machine_id": machine_id, "flag": flag}})))
+	def reset_gear(self, plane_id, gear_deployed: bool):
+		self.send_command({"command": "RESET_GEAR", "args": {"plane_id": plane_id, "gear_deployed": gear_deployed}})
 
+	def set_plane_linear_speed(self, plane_id, speed):
+		self.send_command({"command": "SET_PLANE_LINEAR_SPEED", "args": {"plane_id": plane_id, "linear_speed": speed}})
 
-def get_machine_custom_physics_mode(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_MACHINE_CUSTOM_PHYSICS_MODE", "args": {"machine_id": machine_id}})))
-	state = json.loads((socket_lib.get_answer()).decode())
-	return state
+	def record_plane_start_state(self, plane_id):
+		self.send_command({"command": "RECORD_PLANE_START_STATE", "args": {"plane_id": plane_id}})
 
+	def set_plane_brake(self, plane_id, level):
+		self.send_command({"command": "SET_PLANE_BRAKE", "args": {"plane_id": plane_id, "brake_level": level}})
 
-def update_machine_kinetics(machine_id, matrix_3_4: list, speed_vector: list):
-	socket_lib.send_message(str.encode(json.dumps({"command": "UPDATE_MACHINE_KINETICS", "args": {"machine_id": machine_id, "matrix": matrix_3_4, "v_move": speed_vector}})))
+	def set_plane_flaps(self, plane_id, level):
+		self.send_command({"command": "SET_PLANE_FLAPS", "args": {"plane_id": plane_id, "flaps_level": level}})
 
+	def activate_post_combustion(self, plane_id):
+		self.send_command({"command": "ACTIVATE_PC", "args": {"plane_id": plane_id}})
 
-def get_targets_list(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_TARGETS_LIST", "args": {"machine_id": machine_id}})))
-	state = json.loads((socket_lib.get_answer()).decode())
-	return state
+	def deactivate_post_combustion(self, plane_id):
+		self.send_command({"command": "DEACTIVATE_PC", "args": {"plane_id": plane_id}})
 
+	def set_plane_pitch(self, plane_id, level):
+		self.send_command({"command": "SET_PLANE_PITCH", "args": {"plane_id": plane_id, "pitch_level": level}})
 
-def get_target_idx(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_TARGET_IDX", "args": {"machine_id": machine_id}})))
-	state = json.loads((socket_lib.get_answer()).decode())
-	return state
+	def set_plane_roll(self, plane_id, level):
+		self.send_command({"command": "SET_PLANE_ROLL", "args": {"plane_id": plane_id, "roll_level": level}})
 
+	def set_plane_yaw(self, plane_id, level):
+		self.send_command({"command": "SET_PLANE_YAW", "args": {"plane_id": plane_id, "yaw_level": level}})
 
-def set_target_id(machine_id, target_id):
-	# target_id: index in targets list. 0 = no target
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_TARGET_ID", "args": {"machine_id": machine_id, "target_id": target_id}})))
+	def stabilize_plane(self, plane_id):
+		self.send_command({"command": "STABILIZE_PLANE", "args": {"plane_id": plane_id}})
 
+	def deploy_gear(self, plane_id):
+		self.send_command({"command": "DEPLOY_GEAR", "args": {"plane_id": plane_id}})
 
-def get_health(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_HEALTH", "args": {"machine_id": machine_id}})))
-	state = json.loads((socket_lib.get_answer()).decode())
-	return state
+	def retract_gear(self, plane_id):
+		self.send_command({"command": "RETRACT_GEAR", "args": {"plane_id": plane_id}})
 
+	def activate_plane_easy_steering(self, plane_id):
+		self.send_command({"command": "ACTIVATE_EASY_STEERING", "args": {"plane_id": plane_id}})
 
-def set_health(machine_id, level):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_HEALTH", "args": {"machine_id": machine_id, "health_level": level}})))
+	def deactivate_plane_easy_steering(self, plane_id):
+		self.send_command({"command": "DEACTIVATE_EASY_STEERING", "args": {"plane_id": plane_id}})
 
+	def set_plane_autopilot_heading(self, plane_id, level):
+		self.send_command({"command": "SET_PLANE_AUTOPILOT_HEADING", "args": {"plane_id": plane_id, "ap_heading": level}})
 
-def get_machine_missiles_list(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_MACHINE_MISSILES_LIST", "args": {"machine_id": machine_id}})))
-	return json.loads((socket_lib.get_answer()).decode())
+	def set_plane_autopilot_speed(self, plane_id, level):
+		self.send_command({"command": "SET_PLANE_AUTOPILOT_SPEED", "args": {"plane_id": plane_id, "ap_speed": level}})
 
+	def set_plane_autopilot_altitude(self, plane_id, level):
+		self.send_command({"command": "SET_PLANE_AUTOPILOT_ALTITUDE", "args": {"plane_id": plane_id, "ap_altitude": level}})
 
-def get_missiles_device_slots_state(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_MISSILESDEVICE_SLOTS_STATE", "args": {"machine_id": machine_id}})))
-	state = json.loads((socket_lib.get_answer()).decode())
-	return state
+	# Missile launchers
 
+	def get_missile_launchers_list(self):
+		self.send_command({"command": "GET_MISSILE_LAUNCHERS_LIST", "args": {}})
+		return self.get_answer()
 
-def fire_missile(machine_id, slot_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "FIRE_MISSILE", "args": {"machine_id": machine_id, "slot_id": slot_id}})))
+	def get_missile_launcher_state(self, machine_id):
+		self.send_command({"command": "GET_MISSILE_LAUNCHER_STATE", "args": {"machine_id": machine_id}})
+		state = self.get_answer()
+		return state
 
+	def get_missile_launcher_state_array(self, machine_id, out=None):
+		self.send_command({"command": "GET_MISSILE_LAUNCHER_STATE", "args": {"machine_id": machine_id}})
+		return self.get_answer_array(out)
 
-def rearm_machine(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "REARM_MACHINE", "args": {"machine_id": machine_id}})))
+	# Missiles
 
+	def get_missiles_list(self):
+		self.send_command({"command": "GET_MISSILESLIST", "args": {}})
+		return self.get_answer()
 
-def reset_machine(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "RESET_MACHINE", "args": {"machine_id": machine_id}})))
+	def get_missile_state(self, missile_id):
+		self.send_command({"command": "GET_MISSILE_STATE", "args": {"missile_id": missile_id}})
+		state = self.get_answer()
+		return state
 
+	def get_missile_state_array(self, missile_id, out=None):
+		self.send_command({"command": "GET_MISSILE_STATE", "args": {"missile_id": missile_id}})
+		return self.get_answer_array(out)
 
-def reset_machine_matrix(machine_id, x, y, z, rx, ry, rz):
-	socket_lib.send_message(str.encode(json.dumps({"command": "RESET_MACHINE_MATRIX", "args": {"machine_id": machine_id, "position": [x, y, z], "rotation": [rx, ry, rz]}})))
+	def set_missile_target(self, missile_id, target_id):
+		self.send_command({"command": "SET_MISSILE_TARGET", "args": {"missile_id": missile_id, "target_id": target_id}})
 
+	def set_missile_life_delay(self, missile_id, life_delay):
+		self.send_command({"command": "SET_MISSILE_LIFE_DELAY", "args": {"missile_id": missile_id, "life_delay": life_delay}})
 
-def activate_autopilot(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "ACTIVATE_AUTOPILOT", "args": {"machine_id": machine_id}})))
+	def get_missile_targets_list(self, missile_id):
+		self.send_command({"command": "GET_MISSILE_TARGETS_LIST", "args": {"missile_id": missile_id}})
+		state = self.get_answer()
+		return state
 
 
-def deactivate_autopilot(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "DEACTIVATE_AUTOPILOT", "args": {"machine_id": machine_id}})))
+# Module functions: default client
 
+default_client = DogfightClient()
 
-def activate_IA(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "ACTIVATE_IA", "args": {"machine_id": machine_id}})))
+for _name, _member in list(vars(DogfightClient).items()):
+	if callable(_member) and not _name.startswith("_"):
+		globals()[_name] = getattr(default_client, _name)
 
 
-def deactivate_IA(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "DEACTIVATE_IA", "args": {"machine_id": machine_id}})))
-
-
-def get_machine_gun_state(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_MACHINE_GUN_STATE", "args": {"machine_id": machine_id}})))
-	state = json.loads((socket_lib.get_answer()).decode())
-	return state
-
-
-def activate_machine_gun(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "ACTIVATE_MACHINE_GUN", "args": {"machine_id": machine_id}})))
-
-
-def deactivate_machine_gun(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "DEACTIVATE_MACHINE_GUN", "args": {"machine_id": machine_id}})))
-
-
-def is_autopilot_activated(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "IS_AUTOPILOT_ACTIVATED", "args": {"machine_id": machine_id}})))
-	state = json.loads((socket_lib.get_answer()).decode())
-	return state
-
-
-def activate_autopilot(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "ACTIVATE_AUTOPILOT", "args": {"machine_id": machine_id}})))
-
-
-def deactivate_autopilot(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "DEACTIVATE_AUTOPILOT", "args": {"machine_id": machine_id}})))
-
-
-def is_ia_activated(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "IS_IA_ACTIVATED", "args": {"machine_id": machine_id}})))
-	state = json.loads((socket_lib.get_answer()).decode())
-	return state
-
-
-def activate_ia(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "ACTIVATE_IA", "args": {"machine_id": machine_id}})))
-
-
-def deactivate_ia(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "DEACTIVATE_IA", "args": {"machine_id": machine_id}})))
-
-
-def is_user_control_activated(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "IS_USER_CONTROL_ACTIVATED", "args": {"machine_id": machine_id}})))
-	state = json.loads((socket_lib.get_answer()).decode())
-	return state
-
-
-def activate_user_control(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "ACTIVATE_USER_CONTROL", "args": {"machine_id": machine_id}})))
-
-
-def deactivate_user_control(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "DEACTIVATE_USER_CONTROL", "args": {"machine_id": machine_id}})))
-
-
-# Aircrafts
-
-def get_planes_list():
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_PLANESLIST", "args": {}})))
-	return json.loads((socket_lib.get_answer()).decode())
-
-
-def get_plane_state(plane_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_PLANE_STATE", "args": {"plane_id": plane_id}})))
-	state = json.loads((socket_lib.get_answer()).decode())
-	return state
-
-
-def get_plane_thrust(plane_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_PLANE_THRUST", "args": {"plane_id": plane_id}})))
-	state = json.loads((socket_lib.get_answer()).decode())
-	return state
-
-
-def set_plane_thrust(plane_id, level):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_PLANE_THRUST", "args": {"plane_id": plane_id, "thrust_level": level}})))
-
-
-def reset_gear(plane_id, gear_deployed: bool):
-	socket_lib.send_message(str.encode(json.dumps({"command": "RESET_GEAR", "args": {"plane_id": plane_id, "gear_deployed": gear_deployed}})))
-
-
-def set_plane_linear_speed(plane_id, speed):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_PLANE_LINEAR_SPEED", "args": {"plane_id": plane_id, "linear_speed": speed}})))
-
-
-def record_plane_start_state(plane_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "RECORD_PLANE_START_STATE", "args": {"plane_id": plane_id}})))
-
-
-def set_plane_brake(plane_id, level):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_PLANE_BRAKE", "args": {"plane_id": plane_id, "brake_level": level}})))
-
-
-def set_plane_flaps(plane_id, level):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_PLANE_FLAPS", "args": {"plane_id": plane_id, "flaps_level": level}})))
-
-
-def activate_post_combustion(plane_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "ACTIVATE_PC", "args": {"plane_id": plane_id}})))
-
-
-def deactivate_post_combustion(plane_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "DEACTIVATE_PC", "args": {"plane_id": plane_id}})))
-
-
-def set_plane_pitch(plane_id, level):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_PLANE_PITCH", "args": {"plane_id": plane_id, "pitch_level": level}})))
-
-
-def set_plane_roll(plane_id, level):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_PLANE_ROLL", "args": {"plane_id": plane_id, "roll_level": level}})))
-
-
-def set_plane_yaw(plane_id, level):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_PLANE_YAW", "args": {"plane_id": plane_id, "yaw_level": level}})))
-
-
-def stabilize_plane(plane_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "STABILIZE_PLANE", "args": {"plane_id": plane_id}})))
-
-
-def deploy_gear(plane_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "DEPLOY_GEAR", "args": {"plane_id": plane_id}})))
-
-
-def retract_gear(plane_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "RETRACT_GEAR", "args": {"plane_id": plane_id}})))
-
-
-def activate_plane_easy_steering(plane_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "ACTIVATE_EASY_STEERING", "args": {"plane_id": plane_id}})))
-
-
-def deactivate_plane_easy_steering(plane_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "DEACTIVATE_EASY_STEERING", "args": {"plane_id": plane_id}})))
-
-
-def set_plane_autopilot_heading(plane_id, level):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_PLANE_AUTOPILOT_HEADING", "args": {"plane_id": plane_id, "ap_heading": level}})))
-
-
-def set_plane_autopilot_speed(plane_id, level):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_PLANE_AUTOPILOT_SPEED", "args": {"plane_id": plane_id, "ap_speed": level}})))
-
-
-def set_plane_autopilot_altitude(plane_id, level):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_PLANE_AUTOPILOT_ALTITUDE", "args": {"plane_id": plane_id, "ap_altitude": level}})))
-
-
-# Missile launchers
-
-def get_missile_launchers_list():
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_MISSILE_LAUNCHERS_LIST", "args": {}})))
-	return json.loads((socket_lib.get_answer()).decode())
-
-
-def get_missile_launcher_state(machine_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_MISSILE_LAUNCHER_STATE", "args": {"machine_id": machine_id}})))
-	state = json.loads((socket_lib.get_answer()).decode())
-	return state
-
-# Missiles
-
-def get_missiles_list():
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_MISSILESLIST", "args": {}})))
-	return json.loads((socket_lib.get_answer()).decode())
-
-
-def get_missile_state(missile_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_MISSILE_STATE", "args": {"missile_id": missile_id}})))
-	state = json.loads((socket_lib.get_answer()).decode())
-	return state
-
-
-def set_missile_target(missile_id, target_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_MISSILE_TARGET", "args": {"missile_id": missile_id, "target_id": target_id}})))
-
-
-def set_missile_life_delay(missile_id, life_delay):
-	socket_lib.send_message(str.encode(json.dumps({"command": "SET_MISSILE_LIFE_DELAY", "args": {"missile_id": missile_id, "life_delay": life_delay}})))
-
-
-def get_missile_targets_list(missile_id):
-	socket_lib.send_message(str.encode(json.dumps({"command": "GET_MISSILE_TARGETS_LIST", "args": {"missile_id": missile_id}})))
-	state = json.loads((socket_lib.get_answer()).decode())
-	return state
+class CommandsRecorder:
+	# Stands for a DogfightClient while an AsyncDogfightClient runs its methods: records the commands and the expected answer
+	def __init__(self):
+		self.commands = []
+		self.answer_type = None
+		self.out = None
 
+	def send_command(self, command):
+		self.commands.append(command)
 
+	def get_answer(self):
+		self.answer_type = "json"
+
+	def get_answer_array(self, out=None):
+		self.answer_type = "array"
+		self.out = out
+
+
+class AsyncDogfightClient:
+	"""
+	asyncio version of DogfightClient, each method is a coroutine:
+
+	async def rollout(host, port):
+		client = AsyncDogfightClient()
+		await client.connect(host, port)
+		await client.set_client_update_mode(True)
+		states = await client.step_array(actions, 4, ["ally_1", "ennemy_1"])
+
+	await asyncio.gather(*[rollout(host, port) for port in ports])
+
+	Any DogfightClient method can be awaited (same arguments). Commands queued in "async with client.batch()" are sent on exit.
+	"""
+
+	def __init__(self):
+		self.reader = None
+		self.writer = None
+		self.batch_commands = None
+		self.current_arena = None
+
+	async def connect(self, _host, _port):
+		self.reader, self.writer = await asyncio.open_connection(_host, _port)
+		self.writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+	async def disconnect(self):
+		self.writer.close()
+		await self.writer.wait_closed()
+
+	def set_current_arena(self, arena_id):
+		self.current_arena = arena_id
+
+	async def send_command(self, command):
+		if self.current_arena is not None:
+			command = {"command": command["command"], "args": dict(command["args"], arena=self.current_arena)}
+		message = str.encode(json.dumps(command))
+		self.writer.write(len(message).to_bytes(4, byteorder='big') + message)
+		await self.writer.drain()
+
+	async def get_message(self):
+		size = int.from_bytes(await self.reader.readexactly(4), "big")
+		return await self.reader.readexactly(size)
+
+	async def get_answer(self):
+		return json.loads((await self.get_message()).decode())
+
+	async def get_answer_array(self, out=None):
+		answer = await self.get_message()
+		if out is None:
+			check_answer_array_size(answer)
+			return np.frombuffer(answer, dtype="<f4").copy()
+		check_answer_array_size(answer, out.nbytes)
+		out[:] = np.frombuffer(answer, dtype="<f4").reshape(out.shape)
+		return out
+
+	@asynccontextmanager
+	async def batch(self):
+		# See DogfightClient.batch()
+		answers = []
+		self.batch_commands = []
+		try:
+			yield answers
+			commands = self.batch_commands
+			self.batch_commands = None
+			if len(commands) > 0:
+				await self.send_command({"command": "BATCH", "args": {"commands": commands}})
+				answers.extend(await self.get_answer())
+		finally:
+			self.batch_commands = None
+
+	async def step_arenas_array(self, actions_list: list, ticks=1, observe=[], spec_id=None, out=None):
+		await self.send_command({"command": "STEP_ARENAS", "args": {"actions": actions_list, "ticks": ticks, "observe": observe, "spec_id": spec_id}})
+		states = await self.get_answer_array(out)
+		if len(observe) == 0:
+			return states
+		return states.reshape(len(actions_list), len(observe), -1)
+
+	def __getattr__(self, name):
+		# Other commands: the DogfightClient method is run on a recorder, then its commands are sent
+		method = getattr(DogfightClient, name, None)
+		if method is None or name.startswith("_"):
+			raise AttributeError(name)
+
+		async def run_method(*args, **kwargs):
+			recorder = CommandsRecorder()
+			method(recorder, *args, **kwargs)
+			if self.batch_commands is not None:
+				self.batch_commands.extend(recorder.commands)
+				return None
+			for command in recorder.commands:
+				await self.send_command(command)
+			if recorder.answer_type == "json":
+				return await self.get_answer()
+			if recorder.answer_type == "array":
+				return await self.get_answer_array(recorder.out)
+			return None
+
+		return run_method
@@ -18,18 +18,108 @@ def broadcast_msg(msg, port):
 	s.sendto(msg, ("<broadcast>", port))
 
 
-def connect_socket(c_host, port):
-	global sock
+class Connection:
+	"""
+	Client socket with its own receive state: one Connection per sandbox.
+	Messages: 4 bytes big endian size header + message.
+	"""
 
-	# Create a socket (SOCK_STREAM means a TCP socket)
-	sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-	# sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-	# Connect to server and send data
-	while (1):
+	def __init__(self):
+		self.sock = None
+		self.logger = ""
+
+	def connect(self, c_host, port):
+		# Create a socket (SOCK_STREAM means a TCP socket)
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		# Small commands are sent right away (no Nagle delay before the next command answer)
+		self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		# Connect to server and send data
+		while (1):
+			try:
+				return self.sock.connect((c_host, port)) == 0
+			except:
+				pass
+
+	def close(self):
+		self.sock.close()
+
+	def send_message(self, message):
+		size = len(message)
+		sizeb = size.to_bytes(4, byteorder='big')
+		self.sock.sendall(sizeb + message)
+
+	def get_answer_header(self):  # int with the length of the msg
 		try:
-			return sock.connect((c_host, port)) == 0
-		except:
-			pass
+			received = self.sock.recv(4)
+			while len(received) > 0 and len(received) < 4:
+				received += self.sock.recv(4 - len(received))
+
+			if len(received) <= 0:
+				return None
+			size = int.from_bytes(received, "big")
+			return size  # size of the waiting message
+		except Exception:
+			self.logger = "Error: Crash socket get_answer_header\n {0}".format(sys.exc_info()[0])
+			return None
+
+	def get_answer(self, max_size_before_flush=-1):
+		try:
+			size = self.get_answer_header()
+			if size is None or (max_size_before_flush != -1 and size > max_size_before_flush):
+				return None
+
+			received = self.sock.recv(size)
+
+			while len(received) < size:
+				received += self.sock.recv(size - len(received))
+
+			return received
+		except Exception:
+			self.logger = "Error: Crash socket get answer\n {0}".format(sys.exc_info()[0])
+			return None
+
+	def drain(self, size):
+		# Reads and discards size bytes
+		while size > 0:
+			received = self.sock.recv(min(size, 65536))
+			if len(received) == 0:
+				raise ConnectionError("socket closed by the server")
+			size -= len(received)
+
+	def get_answer_into(self, buffer):
+		# Receives a message directly into a writable buffer (bytearray, numpy array...), returns its size
+		try:
+			size = self.get_answer_header()
+			if size is None:
+				return None
+			view = memoryview(buffer).cast("B")
+			if size > len(view):
+				# The payload is dropped: the next answer header must be read from the stream
+				self.drain(size)
+				self.logger = "Error: answer size {0} > buffer size {1}".format(size, len(view))
+				return None
+
+			received = 0
+			while received < size:
+				n = self.sock.recv_into(view[received:size], size - received)
+				if n == 0:
+					raise ConnectionError("socket closed by the server")
+				received += n
+
+			return size
+		except Exception:
+			self.logger = "Error: Crash socket get answer into\n {0}".format(sys.exc_info()[0])
+			return None
+
+
+default_connection = Connection()  # Used by the module functions
+
+
+def connect_socket(c_host, port):
+	global sock
+	result = default_connection.connect(c_host, port)
+	sock = default_connection.sock
+	return result
 
 
 def listener_socket(port_):
@@ -42,11 +132,12 @@ def listener_socket(port_):
 	server_socket.bind((HOST, port_))
 	server_socket.listen(1)
 	sock, address = server_socket.accept()
+	default_connection.sock = sock
 	logger = "{} connected".format(address)
 
 
 def close_socket():
-	sock.close()
+	default_connection.close()
 
 
 def check_send_message(cv):
@@ -84,18 +175,7 @@ def send_message_with_id(id, message):
 
 
 def send_message(message):
-	# create header with id of the binding function and the length of the message
-	size = len(message)
-	sizeb = size.to_bytes(4, byteorder='big')
-	sock.sendall(sizeb + message)
-
-	"""
-	values = (len(message),)
-	packer = struct.Struct('i')
-	packed_data = packer.pack(*values)
-
-	sock.sendall(packed_data + message)
-	"""
+	default_connection.send_message(message)
 
 
 def get_answer_header_with_id():
@@ -107,28 +187,15 @@ def get_answer_header_with_id():
 
 
 def get_answer_header():  # int with the length of the msg
-	global logger
-	try:
-		received = sock.recv(4)
-		while len(received) > 0 and len(received) < 4:
-			received += sock.recv(4 - len(received))
-
-		if len(received) <= 0:
-			return None
-		size = int.from_bytes(received, "big")
-		return size  # size of the waiting message
-	except Exception:
-		logger = "Error: Crash socket get_answer_header\n {0}".format(sys.exc_info()[0])
-		return None
+	return default_connection.get_answer_header()
 
 
 def get_answer(with_id=False, max_size_before_flush=-1):
 	global logger
+	if not with_id:
+		return default_connection.get_answer(max_size_before_flush)
 	try:
-		if with_id:
-			size = get_answer_header_with_id()
-		else:
-			size = get_answer_header()
+		size = get_answer_header_with_id()
 		if size is None or (max_size_before_flush != -1 and size > max_size_before_flush):
 			return None
 
@@ -142,3 +209,7 @@ def get_answer(with_id=False, max_size_before_flush=-1):
 		logger = "Error: Crash socket get answer\n {0}".format(sys.exc_info()[0])
 		return None
 
+
+def get_answer_into(buffer):
+	# Receives a message directly into a writable buffer (bytearray, numpy array...), returns its size
+	return default_connection.get_answer_into(buffer)
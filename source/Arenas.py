@@ -0,0 +1,48 @@
+# Arenas: independent sets of machines simulated together in the same scene.
+# Each arena owns its machines lists, update list and timestamp. Arenas share the scene, the terrain and the physics,
+# but machines of different arenas don't see each other (raycasts filtered by Physics.raycast_first_hit()).
+#
+# The arena state lives in Main / Destroyable_Machine class attributes: Main.set_current_arena() swaps them,
+# so the existing code (missions setup, network commands, updates) runs unchanged on the current arena.
+
+from Machines import *
+
+
+class Arena:
+
+    # Main attributes owned by each arena: (name, default value factory)
+    main_attributes = [
+        ("players_allies", list), ("players_ennemies", list),
+        ("missiles_allies", list), ("missiles_ennemies", list),
+        ("aircraft_carrier_allies", list), ("aircraft_carrier_ennemies", list),
+        ("missile_launchers_allies", list), ("missile_launchers_ennemies", list),
+        ("destroyables_list", list), ("destroyables_items", dict),
+        ("num_players_allies", int), ("num_players_ennemies", int),
+        ("num_missile_launchers_allies", int), ("num_missile_launchers_ennemies", int),
+        ("timestamp", int), ("user_aircraft", lambda: None)
+    ]
+
+    # Destroyable_Machine attributes owned by each arena
+    machines_attributes = [("update_list", list), ("machines_list", list), ("machines_items", dict)]
+
+    def __init__(self, arena_id):
+        self.arena_id = arena_id
+        self.main_values = {}
+        self.machines_values = {}
+        for name, default in Arena.main_attributes:
+            self.main_values[name] = default()
+        for name, default in Arena.machines_attributes:
+            self.machines_values[name] = default()
+
+    def save(self, main):
+        for name, default in Arena.main_attributes:
+            self.main_values[name] = getattr(main, name)
+        for name, default in Arena.machines_attributes:
+            self.machines_values[name] = getattr(Destroyable_Machine, name)
+
+    def load(self, main):
+        for name, value in self.main_values.items():
+            setattr(main, name, value)
+        for name, value in self.machines_values.items():
+            setattr(Destroyable_Machine, name, value)
+        Collisions_Object.current_arena_id = self.arena_id
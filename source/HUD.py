@@ -2,6 +2,7 @@
 
 
 import harfang as hg
+import Physics
 from Machines import *
 from MachineDevice import *
 from MathsSupp import *
@@ -103,8 +104,18 @@ class HUD_Radar:
 		i_missile_launcher = 0
 		td = machine.get_device("TargettingDevice")
 
+		# Missiles out of the radar range aren't displayed
+		if MachinesStates.flag_valid:
+			radar_ids = set(MachinesSpatialIndex.get_candidates(hg.GetT(mat), radar_scale * 1.5).tolist())
+		else:
+			radar_ids = None
+
 		for target in targets:
 			if not target.wreck and target.activated:
+				if radar_ids is not None and target.type == Destroyable_Machine.TYPE_MISSILE:
+					sid = MachinesStates.get_state_id(target)
+					if sid is not None and MachinesSpatialIndex.indexed[sid] and sid not in radar_ids:
+						continue
 				t_mat, t_pos, t_rot, aX, aY, aZ = target.decompose_matrix()
 				aZ.y = 0
 				aZ = hg.Normalize(aZ)
@@ -418,7 +429,11 @@ class HUD_Aircraft:
 			speed_kmh = 0  # 如果速度异常，显示 0
 			print(f"警告：飞机速度异常 = {linear_speed}")
 		
-		Overlays.add_text2D("Speed: %d km/h" % speed_kmh, hg.Vec2(0.05, 0.94), 0.018, hg.Color.White * f, Main.hud_font)
+		if math.isfinite(linear_speed):
+			mach = Physics.compute_mach(linear_speed, aircraft.get_parent_node().GetTransform().GetPos().y)
+		else:
+			mach = 0
+		Overlays.add_text2D("Speed: %d km/h  Mach %.2f" % (speed_kmh, mach), hg.Vec2(0.05, 0.94), 0.018, hg.Color.White * f, Main.hud_font)
 		
 		# 显示仿真速度（如果不是1.0x）
 		if Main.simulation_speed != 1.0:
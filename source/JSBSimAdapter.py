@@ -5,8 +5,9 @@ JSBSim 飞行动力学引擎适配器
 """
 
 import harfang as hg
-from math import radians, degrees
+from math import radians, degrees, pi
 import os
+import numpy as np
 
 # JSBSim 导入（如果未安装会给出友好提示）
 try:
@@ -30,18 +31,106 @@ class JSBSimAdapter:
     3. 输入控制信号到 JSBSim
     4. 从 JSBSim 读取姿态和速度
     """
-    
-    def __init__(self, aircraft_name="f16", use_jsbsim=False):
+
+    # Property nodes are resolved once by _init_jsbsim(), then read / written through their handles.
+    # Controls: (controls key, property)
+    controls_properties = [
+        ('throttle', 'fcs/throttle-cmd-norm'),
+        ('elevator', 'fcs/elevator-cmd-norm'),
+        ('aileron', 'fcs/aileron-cmd-norm'),
+        ('rudder', 'fcs/rudder-cmd-norm'),
+        ('flaps', 'fcs/flap-cmd-norm'),
+        ('brake', 'fcs/brake-cmd-norm')
+    ]
+
+    # State fields: (name, property, scale). Harfang units: m, m/s, degrees.
+    # Roll and pitch signs are inverted (Harfang convention), v-down is turned to up.
+    state_properties = [
+        ('altitude', 'position/h-sl-meters', 1.0),
+        ('roll', 'attitude/roll-rad', -180.0 / pi),
+        ('pitch', 'attitude/pitch-rad', -180.0 / pi),
+        ('yaw', 'attitude/heading-true-rad', 180.0 / pi),
+        ('u', 'velocities/u-fps', 0.3048),
+        ('v', 'velocities/v-fps', 0.3048),
+        ('w', 'velocities/w-fps', 0.3048),
+        ('vx', 'velocities/v-north-fps', 0.3048),
+        ('vy', 'velocities/v-down-fps', -0.3048),
+        ('vz', 'velocities/v-east-fps', 0.3048),
+        ('p', 'velocities/p-rad_sec', 1.0),
+        ('q', 'velocities/q-rad_sec', 1.0),
+        ('r', 'velocities/r-rad_sec', 1.0),
+        ('ax', 'accelerations/udot-ft_sec2', 0.3048),
+        ('ay', 'accelerations/vdot-ft_sec2', 0.3048),
+        ('az', 'accelerations/wdot-ft_sec2', 0.3048),
+        ('alpha', 'aero/alpha-deg', 1.0),  # Optional properties: 0 if the model doesn't have them
+        ('beta', 'aero/beta-deg', 1.0),
+        ('mach', 'velocities/mach', 1.0)
+    ]
+    state_dtype = np.dtype([(name, np.float64) for name, prop, scale in state_properties])
+    checked_fields = ['u', 'v', 'w', 'vx', 'vy', 'vz']  # Reset to 0 if not finite
+
+    # Snapshots (see get_snapshot()): (initial condition property, state property), restored by fdm.reset_to_initial_conditions()
+    snapshot_properties = [
+        ('ic/h-sl-ft', 'position/h-sl-ft'),
+        ('ic/lat-geod-deg', 'position/lat-geod-deg'),
+        ('ic/long-gc-deg', 'position/long-gc-deg'),
+        ('ic/u-fps', 'velocities/u-fps'),
+        ('ic/v-fps', 'velocities/v-fps'),
+        ('ic/w-fps', 'velocities/w-fps'),
+        ('ic/p-rad_sec', 'velocities/p-rad_sec'),
+        ('ic/q-rad_sec', 'velocities/q-rad_sec'),
+        ('ic/r-rad_sec', 'velocities/r-rad_sec'),
+        ('ic/phi-deg', 'attitude/phi-deg'),
+        ('ic/theta-deg', 'attitude/theta-deg'),
+        ('ic/psi-true-deg', 'attitude/psi-deg')
+    ]
+    # Trim commands, set by the trim and written back after the reset
+    trim_properties = ['fcs/pitch-trim-cmd-norm', 'fcs/roll-trim-cmd-norm', 'fcs/yaw-trim-cmd-norm']
+    max_snapshots = 64  # Trimmed initial conditions kept per adapter (see reset_state())
+
+    # Process-wide models cache: the data root is resolved once, the configs that loaded are remembered, and the FDMs
+    # of destroyed aircraft (close()) are kept loaded, then reused by the next aircraft of the same config (mission restart)
+    data_root = None
+    loaded_configs = {}  # aircraft name: config loaded
+    fdms_pool = {}  # config: [FGFDMExec, ...]
+    max_pooled_fdms = 16  # Per config
+
+    # Multi-rate: the FDM runs at its own fixed rate ("JSBSimRate" in config.json), update(dt) runs as many
+    # fdm.run() substeps as dt covers. The time left over is kept for the next update.
+    default_rate = 120  # Hz
+    max_substeps = 200  # Per update. Beyond, the FDM time slows down
+    flag_batch_substeps = True  # The state is read after the last substep only (else after each substep)
+
+    def __init__(self, aircraft_name="f16", use_jsbsim=False, rate=None):
         """
         初始化 JSBSim 适配器
         
         Args:
             aircraft_name: 飞机型号名称（对应 JSBSim 的飞机配置文件）
             use_jsbsim: 是否启用 JSBSim（如果为 False，则使用简化物理）
+            rate: FDM 积分频率 (Hz)，None: default_rate
         """
         self.enabled = use_jsbsim and JSBSIM_AVAILABLE
         self.fdm = None  # Flight Dynamics Model
+        self.aircraft_config = None
         self.initialized = False
+        self.fdm_dt = 1.0 / (JSBSimAdapter.default_rate if rate is None else rate)
+        self.time_accumulator = 0.0
+        self.state = None  # Last state read
+
+        # Cached property nodes and state buffer (see _init_property_nodes())
+        self.controls_nodes = []
+        self.state_nodes = []
+        self.state_buffer = np.zeros(1, dtype=JSBSimAdapter.state_dtype)
+        self.state_values = self.state_buffer.view(np.float64)  # Flat view of the state fields
+        self.state_scales = np.array([scale for name, prop, scale in JSBSimAdapter.state_properties])
+        self.state_raw = np.zeros(len(JSBSimAdapter.state_properties))
+        self.checked_ids = [self.state_dtype.names.index(name) for name in JSBSimAdapter.checked_fields]
+        self.ic_nodes = []
+        self.snapshot_nodes = []
+        self.trim_nodes = []
+        self.running_node = None
+        self.snapshots = {}  # Trimmed initial conditions, (position, rotation, speed): snapshot
         
         if self.enabled:
             try:
@@ -51,12 +140,12 @@ class JSBSimAdapter:
                 print("回退到简化物理模型")
                 self.enabled = False
     
-    def _init_jsbsim(self, aircraft_name):
-        """初始化 JSBSim 引擎"""
-        # 创建 FDM 实例
-        self.fdm = jsbsim.FGFDMExec(None)
-        
-        # 查找 JSBSim 数据路径
+    @classmethod
+    def get_data_root(cls):
+        """查找 JSBSim 数据路径 (once per process)"""
+        if cls.data_root is not None:
+            return cls.data_root
+
         # 尝试多个可能的位置
         jsbsim_module_path = os.path.dirname(jsbsim.__file__)
         
@@ -67,22 +156,37 @@ class JSBSimAdapter:
         ]
         
         # 尝试每个路径
-        root_found = False
         for root_path in possible_roots:
-            if os.path.exists(root_path):
-                # 检查是否有 aircraft 目录
-                aircraft_dir = os.path.join(root_path, 'aircraft')
-                if os.path.exists(aircraft_dir):
-                    print(f"找到 JSBSim 数据目录: {root_path}")
-                    self.fdm.set_root_dir(root_path)
-                    root_found = True
-                    break
-        
-        if not root_found:
-            # 如果找不到数据目录，使用默认路径并继续尝试
-            print(f"警告：未找到 JSBSim 数据目录，使用默认路径")
-            self.fdm.set_root_dir(jsbsim_module_path)
-        
+            # 检查是否有 aircraft 目录
+            if os.path.exists(os.path.join(root_path, 'aircraft')):
+                print(f"找到 JSBSim 数据目录: {root_path}")
+                cls.data_root = root_path
+                return cls.data_root
+        
+        # 如果找不到数据目录，使用默认路径并继续尝试
+        print(f"警告：未找到 JSBSim 数据目录，使用默认路径")
+        cls.data_root = jsbsim_module_path
+        return cls.data_root
+
+    @classmethod
+    def load_fdm(cls, aircraft_name):
+        """
+        Returns (fdm, config, flag_reused): a pooled FDM of the aircraft config if any, else a new FGFDMExec
+        """
+        name = aircraft_name.lower()
+        config = cls.loaded_configs.get(name)
+        if config is not None and len(cls.fdms_pool.get(config, [])) > 0:
+            return cls.fdms_pool[config].pop(), config, True
+
+        # 创建 FDM 实例
+        fdm = jsbsim.FGFDMExec(None)
+        fdm.set_root_dir(cls.get_data_root())
+
+        if config is not None:
+            if fdm.load_model(config):
+                return fdm, config, False
+            del cls.loaded_configs[name]
+
         # 飞机配置映射
         # 注意：不同的 JSBSim 安装可能有不同的可用飞机
         available_aircraft = {
@@ -96,12 +200,12 @@ class JSBSimAdapter:
             "simple": "c172p"  # 使用 c172p 作为简单模型
         }
         
-        aircraft_config = available_aircraft.get(aircraft_name.lower(), "c172p")
+        aircraft_config = available_aircraft.get(name, "c172p")
         
         print(f"正在加载 JSBSim 飞机配置: {aircraft_config}")
         
         # 尝试加载飞机
-        if not self.fdm.load_model(aircraft_config):
+        if not fdm.load_model(aircraft_config):
             # 如果失败，尝试备用方案
             print(f"警告：无法加载 {aircraft_config}，尝试备用方案...")
             
@@ -112,7 +216,7 @@ class JSBSimAdapter:
             for fallback in fallback_aircraft:
                 if fallback != aircraft_config:
                     print(f"  尝试加载 {fallback}...")
-                    if self.fdm.load_model(fallback):
+                    if fdm.load_model(fallback):
                         print(f"  ✅ 成功加载 {fallback}")
                         aircraft_config = fallback
                         loaded = True
@@ -122,16 +226,34 @@ class JSBSimAdapter:
                 raise Exception(
                     f"无法加载任何飞机模型！\n"
                     f"  请求的型号: {aircraft_config}\n"
-                    f"  JSBSim 路径: {jsbsim_module_path}\n"
+                    f"  JSBSim 路径: {cls.get_data_root()}\n"
                     f"  \n"
                     f"  解决方案：\n"
                     f"  1. 重新安装 JSBSim: pip uninstall jsbsim && pip install jsbsim\n"
                     f"  2. 或禁用 JSBSim（使用简化物理模型）\n"
                     f"  3. 检查 JSBSim 版本: python -c \"import jsbsim; print(jsbsim.__version__)\""
                 )
+
+        cls.loaded_configs[name] = aircraft_config
+        return fdm, aircraft_config, False
+
+    @classmethod
+    def release_fdm(cls, fdm, config):
+        pool = cls.fdms_pool.setdefault(config, [])
+        if len(pool) < cls.max_pooled_fdms:
+            pool.append(fdm)
+
+    @classmethod
+    def clear_fdms_pool(cls):
+        cls.fdms_pool = {}
+
+    def _init_jsbsim(self, aircraft_name):
+        """初始化 JSBSim 引擎"""
+        self.fdm, aircraft_config, flag_reused = JSBSimAdapter.load_fdm(aircraft_name)
+        self.aircraft_config = aircraft_config
         
         # 初始化飞行条件
-        self.fdm.set_dt(1.0 / 60.0)  # 60 FPS
+        self.fdm.set_dt(self.fdm_dt)  # 固定积分步长 (see update())
         
         # 设置初始位置和姿态（安全模式）
         # JSBSim 使用地理坐标系（纬度、经度、海拔）
@@ -158,12 +280,20 @@ class JSBSimAdapter:
             raise Exception(f"JSBSim 初始化参数设置失败: {e}")
         
         # 运行初始化
-        if not self.fdm.run_ic():
+        if flag_reused:
+            # Pooled FDM: models reset too (the reset stops the engines)
+            self.fdm.reset_to_initial_conditions(0)
+            self.fdm.set_property_value('propulsion/set-running', -1)
+            for prop in JSBSimAdapter.trim_properties:
+                self.fdm.set_property_value(prop, 0.0)
+        elif not self.fdm.run_ic():
             raise Exception("JSBSim 初始化条件设置失败")
         
+        self._init_property_nodes()
+
         self.initialized = True
         print("JSBSim 初始化成功！")
-        print(f"  飞机型号: {aircraft_config}")
+        print(f"  飞机型号: {aircraft_config}" + (" (reused)" if flag_reused else ""))
         
         # 安全读取属性（某些属性可能不存在）
         try:
@@ -178,6 +308,21 @@ class JSBSimAdapter:
         except:
             print(f"  初始高度: 10000 ft (默认)")
     
+    def _init_property_nodes(self):
+        """Resolve the controls and state property nodes once (FGPropertyNode handles)"""
+        pm = self.fdm.get_property_manager()
+        self.controls_nodes = [(key, pm.get_node(prop, True)) for key, prop in JSBSimAdapter.controls_properties]
+        self.state_nodes = []
+        for name, prop, scale in JSBSimAdapter.state_properties:
+            node = pm.get_node(prop, False)
+            if node is None:
+                print(f"WARNING - JSBSim property not found: {prop} (state '{name}' = 0)")
+            self.state_nodes.append(node)
+        self.ic_nodes = [pm.get_node(ic_prop, True) for ic_prop, prop in JSBSimAdapter.snapshot_properties]
+        self.snapshot_nodes = [pm.get_node(prop, True) for ic_prop, prop in JSBSimAdapter.snapshot_properties]
+        self.trim_nodes = [pm.get_node(prop, True) for prop in JSBSimAdapter.trim_properties]
+        self.running_node = pm.get_node('propulsion/set-running', True)
+
     def update(self, dt, controls):
         """
         更新 JSBSim 物理模拟一帧
@@ -193,15 +338,13 @@ class JSBSimAdapter:
                 - brake: 刹车 (0-1)
         
         Returns:
-            dict: 包含飞机状态的字典
+            包含飞机状态的记录（见 _get_state()），state['altitude'] 等. The record is overwritten by the next update:
+            test it with "is not None" (a record of zeros is falsy), copy() it to keep it
         """
         if not self.enabled or not self.initialized:
             return None
         
         try:
-            # 设置 JSBSim 时间步长
-            self.fdm.set_dt(dt)
-            
             # 输入控制信号到 JSBSim（安全模式）
             # JSBSim 使用规范化的控制输入 (-1 到 1 或 0 到 1)
             throttle_value = controls.get('throttle', 0.0)
@@ -210,16 +353,8 @@ class JSBSimAdapter:
             rudder_value = controls.get('rudder', 0.0)
             flaps_value = controls.get('flaps', 0.0)
             
-            try:
-                self.fdm.set_property_value('fcs/throttle-cmd-norm', throttle_value)
-                self.fdm.set_property_value('fcs/elevator-cmd-norm', elevator_value)
-                self.fdm.set_property_value('fcs/aileron-cmd-norm', aileron_value)
-                self.fdm.set_property_value('fcs/rudder-cmd-norm', rudder_value)
-                self.fdm.set_property_value('fcs/flap-cmd-norm', flaps_value)
-                self.fdm.set_property_value('fcs/brake-cmd-norm', controls.get('brake', 0.0))
-            except Exception as e:
-                # 某些控制可能不存在，继续运行
-                pass
+            for key, node in self.controls_nodes:
+                node.set_double_value(controls.get(key, 0.0))
             
             # 调试：显示输入到 JSBSim 的所有舵面控制（前5帧）
             if not hasattr(self, '_jsbsim_debug_count'):
@@ -229,34 +364,52 @@ class JSBSimAdapter:
                 print(f"     油门={throttle_value:.2f}, 升降舵={elevator_value:.3f}, 副翼={aileron_value:.3f}, 方向舵={rudder_value:.3f}")
                 self._jsbsim_debug_count += 1
             
-            # 运行一帧物理模拟 ← 这里！JSBSim 真实物理计算
-            self.fdm.run()
-            
+            # 运行物理模拟 ← 这里！JSBSim 真实物理计算, fixed fdm_dt substeps
+            self.time_accumulator += dt
+            num_substeps = int(self.time_accumulator / self.fdm_dt)
+            if num_substeps > JSBSimAdapter.max_substeps:
+                num_substeps = JSBSimAdapter.max_substeps
+                self.time_accumulator = num_substeps * self.fdm_dt
+            self.time_accumulator -= num_substeps * self.fdm_dt
+
+            run = self.fdm.run
+            if JSBSimAdapter.flag_batch_substeps:
+                for i in range(num_substeps):
+                    run()
+                if num_substeps > 0 or self.state is None:
+                    self.state = self._get_state()
+            else:
+                for i in range(num_substeps):
+                    run()
+                    self.state = self._get_state()
+                if self.state is None:
+                    self.state = self._get_state()
+
             # 从 JSBSim 读取状态
-            state = self._get_state()
+            state = self.state
             
             # 调试：显示完整的闭环系统（前5帧）
             if hasattr(self, '_jsbsim_debug_count') and self._jsbsim_debug_count <= 5:
-                if state:
+                if state is not None:
                     # 速度和加速度
-                    u = state.get('u', 0)  # 前向速度
-                    v = state.get('v', 0)  # 侧向速度
-                    w = state.get('w', 0)  # 垂直速度
+                    u = state['u']  # 前向速度
+                    v = state['v']  # 侧向速度
+                    w = state['w']  # 垂直速度
                     speed_kmh = u * 3.6
                     
                     # 姿态角
-                    roll = state.get('roll', 0)
-                    pitch = state.get('pitch', 0)
-                    yaw = state.get('yaw', 0)
+                    roll = state['roll']
+                    pitch = state['pitch']
+                    yaw = state['yaw']
                     
                     # 角速度（姿态变化率）
-                    p = state.get('p', 0)  # Roll rate
-                    q = state.get('q', 0)  # Pitch rate
-                    r = state.get('r', 0)  # Yaw rate
+                    p = state['p']  # Roll rate
+                    q = state['q']  # Pitch rate
+                    r = state['r']  # Yaw rate
                     
                     # 气动参数
-                    alpha = state.get('alpha', 0)  # 迎角
-                    beta = state.get('beta', 0)    # 侧滑角
+                    alpha = state['alpha']  # 迎角
+                    beta = state['beta']    # 侧滑角
                     
                     print(f"  ← JSBSim 闭环输出:")
                     print(f"     速度: u={u:.1f} m/s ({speed_kmh:.1f} km/h), v={v:.1f}, w={w:.1f}")
@@ -271,130 +424,31 @@ class JSBSimAdapter:
             return None
     
     def _get_state(self):
-        """从 JSBSim 读取当前飞机状态（安全模式）"""
+        """
+        从 JSBSim 读取当前飞机状态（安全模式）
+        Returns the state record (fields of state_properties, Harfang units). The record is a view of the adapter
+        preallocated buffer: it is overwritten by the next call.
+        """
         if not self.fdm:
             return None
-        
+
         try:
-            # 位置（转换为米）
-            # JSBSim 使用英尺和经纬度，需要转换
-            altitude_m = self.fdm.get_property_value('position/h-sl-meters')  # 海拔（米）
-            
-            # 欧拉角（度）
-            # 坐标系说明：
-            # - JSBSim: 右手坐标系，pitch 向上为正，roll 右侧向下为正
-            # - Harfang: pitch 和 roll 符号相反
-            # 
-            # 🔧 修复：反转 pitch 和 roll 符号用于显示
-            # Pitch:
-            # - JSBSim pitch > 0 (抬头) → Harfang pitch < 0 (显示为抬头)
-            # - JSBSim pitch < 0 (低头) → Harfang pitch > 0 (显示为低头)
-            # Roll:
-            # - JSBSim roll > 0 (右滚) → Harfang roll < 0 (显示为右滚)
-            # - JSBSim roll < 0 (左滚) → Harfang roll > 0 (显示为左滚)
-            roll_deg = -self.fdm.get_property_value('attitude/roll-rad') * 180.0 / 3.14159  # 🔧 反转符号！
-            pitch_deg = -self.fdm.get_property_value('attitude/pitch-rad') * 180.0 / 3.14159  # 🔧 反转符号！
-            yaw_deg = self.fdm.get_property_value('attitude/heading-true-rad') * 180.0 / 3.14159
-            
-            # 机体坐标系速度
-            u_mps = self.fdm.get_property_value('velocities/u-fps') * 0.3048  # X轴速度
-            v_mps = self.fdm.get_property_value('velocities/v-fps') * 0.3048  # Y轴速度
-            w_mps = self.fdm.get_property_value('velocities/w-fps') * 0.3048  # Z轴速度
-            
-            # 安全检查：防止无穷大或 NaN
-            import math
-            if not math.isfinite(u_mps):
-                print(f"警告：u 异常 = {u_mps}，重置为 0")
-                u_mps = 0.0
-            if not math.isfinite(v_mps):
-                print(f"警告：v 异常 = {v_mps}，重置为 0")
-                v_mps = 0.0
-            if not math.isfinite(w_mps):
-                print(f"警告：w 异常 = {w_mps}，重置为 0")
-                w_mps = 0.0
-            
-            # 线速度（惯性系）
-            vx = self.fdm.get_property_value('velocities/v-north-fps') * 0.3048
-            vy = self.fdm.get_property_value('velocities/v-down-fps') * 0.3048 * -1  # JSBSim down是负的
-            vz = self.fdm.get_property_value('velocities/v-east-fps') * 0.3048
-            
-            # 安全检查：防止无穷大或 NaN
-            import math
-            if not math.isfinite(vx):
-                print(f"警告：vx 异常 = {vx}，重置为 0")
-                vx = 0.0
-            if not math.isfinite(vy):
-                print(f"警告：vy 异常 = {vy}，重置为 0")
-                vy = 0.0
-            if not math.isfinite(vz):
-                print(f"警告：vz 异常 = {vz}，重置为 0")
-                vz = 0.0
-            
-            # 角速度（弧度/秒）
-            p = self.fdm.get_property_value('velocities/p-rad_sec')  # Roll rate
-            q = self.fdm.get_property_value('velocities/q-rad_sec')  # Pitch rate
-            r = self.fdm.get_property_value('velocities/r-rad_sec')  # Yaw rate
-            
-            # 加速度（m/s²）
-            ax = self.fdm.get_property_value('accelerations/udot-ft_sec2') * 0.3048
-            ay = self.fdm.get_property_value('accelerations/vdot-ft_sec2') * 0.3048
-            az = self.fdm.get_property_value('accelerations/wdot-ft_sec2') * 0.3048
-            
-            # 气动参数（可选，可能不存在）
-            try:
-                alpha_deg = self.fdm.get_property_value('aero/alpha-deg')  # 迎角
-            except:
-                alpha_deg = 0.0
-            
-            try:
-                beta_deg = self.fdm.get_property_value('aero/beta-deg')    # 侧滑角
-            except:
-                beta_deg = 0.0
-            
-            try:
-                mach = self.fdm.get_property_value('velocities/mach')      # 马赫数
-            except:
-                mach = 0.0
-        
+            raw = self.state_raw
+            for i, node in enumerate(self.state_nodes):
+                raw[i] = 0.0 if node is None else node.get_double_value()
+            np.multiply(raw, self.state_scales, out=self.state_values)
         except Exception as e:
             print(f"JSBSim 状态读取错误: {e}")
             return None
-        
-        return {
-            # 位置
-            'altitude': altitude_m,
-            
-            # 姿态（度）
-            'roll': roll_deg,
-            'pitch': pitch_deg,
-            'yaw': yaw_deg,
-            
-            # 速度（机体坐标系，m/s）
-            'u': u_mps,
-            'v': v_mps,
-            'w': w_mps,
-            
-            # 速度（惯性坐标系，m/s）
-            'vx': vx,
-            'vy': vy,
-            'vz': vz,
-            
-            # 角速度（rad/s）
-            'p': p,
-            'q': q,
-            'r': r,
-            
-            # 加速度（m/s²）
-            'ax': ax,
-            'ay': ay,
-            'az': az,
-            
-            # 气动参数
-            'alpha': alpha_deg,
-            'beta': beta_deg,
-            'mach': mach
-        }
-    
+
+        # 安全检查：防止无穷大或 NaN
+        for i in self.checked_ids:
+            if not np.isfinite(self.state_values[i]):
+                print(f"警告：{self.state_dtype.names[i]} 异常 = {self.state_values[i]}，重置为 0")
+                self.state_values[i] = 0.0
+
+        return self.state_buffer[0]
+
     def set_position(self, position_hg):
         """
         设置飞机位置（Harfang 坐标 -> JSBSim）
@@ -464,6 +518,95 @@ class JSBSimAdapter:
         except Exception as e:
             print(f"JSBSim 设置姿态错误: {e}")
     
+    def get_snapshot(self):
+        """
+        当前 FDM 状态快照 (initial conditions + trim commands), restored by restore_snapshot()
+        """
+        if not self.enabled or not self.initialized:
+            return None
+        return np.array([node.get_double_value() for node in self.snapshot_nodes + self.trim_nodes])
+
+    def restore_snapshot(self, snapshot):
+        """
+        恢复快照: initial conditions + fdm.reset_to_initial_conditions(), the model is not reloaded
+        Returns a copy of the state record
+        """
+        if not self.enabled or not self.initialized:
+            return None
+        n = len(self.ic_nodes)
+        for node, value in zip(self.ic_nodes, snapshot[:n]):
+            node.set_double_value(value)
+        return self._reset_fdm(snapshot[n:])
+
+    def reset_state(self, position_hg, rotation_hg, speed, trim=False):
+        """
+        重置 FDM 到 Harfang 位置/姿态/速度 (episode resets)
+
+        Args:
+            position_hg: hg.Vec3 位置（Harfang 坐标系）
+            rotation_hg: hg.Vec3 Harfang 欧拉角（弧度）
+            speed: 速度 (m/s), along the aircraft axis
+            trim: 配平. The trimmed initial condition is computed once per (position, rotation, speed), then restored from self.snapshots
+
+        Returns a copy of the state record
+        """
+        if not self.enabled or not self.initialized:
+            return None
+
+        key = None
+        if trim:
+            key = tuple(round(v, 3) for v in (position_hg.x, position_hg.y, position_hg.z, rotation_hg.x, rotation_hg.y, rotation_hg.z, speed))
+            if key in self.snapshots:
+                return self.restore_snapshot(self.snapshots[key])
+
+        # Harfang -> JSBSim: roll and pitch signs are inverted (see state_properties)
+        ic_values = [position_hg.y * 3.28084, position_hg.z / 111000.0, position_hg.x / 111000.0,
+                     speed * 3.28084, 0.0, 0.0,
+                     0.0, 0.0, 0.0,
+                     -degrees(rotation_hg.z), -degrees(rotation_hg.x), degrees(rotation_hg.y) % 360.0]
+        for node, value in zip(self.ic_nodes, ic_values):
+            node.set_double_value(value)
+        state = self._reset_fdm([0.0] * len(self.trim_nodes))
+
+        if trim:
+            try:
+                self.fdm.set_property_value('simulation/do_simple_trim', 1)
+            except Exception as e:
+                print(f"WARNING - JSBSim trim failed: {e}")
+                return state
+            if len(self.snapshots) >= JSBSimAdapter.max_snapshots:
+                self.snapshots = {}
+            self.snapshots[key] = self.get_snapshot()
+            self.state = self._get_state()
+            state = None if self.state is None else self.state.copy()
+        return state
+
+    def _reset_fdm(self, trims):
+        try:
+            self.fdm.reset_to_initial_conditions(0)
+            self.running_node.set_double_value(-1)  # The reset stops the engines
+            for node, value in zip(self.trim_nodes, trims):
+                node.set_double_value(value)
+        except Exception as e:
+            print(f"JSBSim 重置错误: {e}")
+            return None
+        self.time_accumulator = 0.0
+        self.state = self._get_state()
+        return None if self.state is None else self.state.copy()  # Episode resets: the caller may keep it
+
+    def is_lost(self):
+        """FDM lost (worker process of a JSBSimRemoteAdapter): the aircraft falls back to an in-process FDM"""
+        return False
+
+    def close(self):
+        """释放 FDM (aircraft destroyed), kept loaded in the FDMs pool"""
+        if self.fdm is not None and self.initialized:
+            JSBSimAdapter.release_fdm(self.fdm, self.aircraft_config)
+        self.fdm = None
+        self.controls_nodes = []
+        self.state_nodes = []
+        self.initialized = False
+
     def harfang_to_jsbsim_controls(self, aircraft):
         """
         将 Harfang 飞机控制转换为 JSBSim 控制格式
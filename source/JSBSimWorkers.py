@@ -0,0 +1,423 @@
+# -*- coding:utf-8 -*-
+"""
+JSBSim 多进程解算池
+The aircraft FDMs run in persistent worker processes and all of them are stepped concurrently, once per tick.
+The jsbsim binding keeps the GIL during fdm.run(): threads would step the FDMs one after the other, so each worker is a
+process owning a set of JSBSimAdapter. Controls and states go through a shared memory block, the connections only carry
+the commands (create / step / call / remove).
+
+Enabled by "JSBSimWorkers" in config.json (number of worker processes, 0: the FDMs run in the main process).
+Workers are started with "python JSBSimWorkers.py <address> <shared memory> <slots>" (not multiprocessing.Process:
+spawned children would re-import main.py).
+"""
+
+import os
+import sys
+import time
+import atexit
+import threading
+import traceback
+import subprocess
+from multiprocessing import shared_memory
+from multiprocessing.connection import Listener, Client
+import numpy as np
+import harfang as hg
+from JSBSimAdapter import JSBSimAdapter, JSBSIM_AVAILABLE
+
+
+# Shared memory layout, per slot (one slot per aircraft): inputs = [dt, controls...], states = state fields, valid = 1 if state is up to date
+control_keys = [key for key, prop in JSBSimAdapter.controls_properties]
+num_inputs = 1 + len(control_keys)
+num_states = len(JSBSimAdapter.state_properties)
+
+
+def map_arrays(buffer, num_slots):
+    inputs = np.ndarray((num_slots, num_inputs), dtype=np.float64, buffer=buffer)
+    offset = inputs.nbytes
+    states = np.ndarray((num_slots, num_states), dtype=np.float64, buffer=buffer, offset=offset)
+    offset += states.nbytes
+    valid = np.ndarray(num_slots, dtype=np.float64, buffer=buffer, offset=offset)
+    return inputs, states, valid
+
+
+def get_buffer_size(num_slots):
+    return num_slots * (num_inputs + num_states + 1) * 8
+
+
+class JSBSimWorkers:
+
+    num_workers = 0  # "JSBSimWorkers" in config.json
+    max_slots = 256  # Aircraft count limit
+    start_timeout = 30  # s, worker connection wait
+
+    flag_running = False
+    flag_start_failed = False  # Not retried: the FDMs run in the main process
+    processes = []
+    connections = []
+    shm = None
+    inputs = None
+    states = None
+    valid = None
+    free_slots = []
+    slots_workers = {}  # slot: worker id
+    dead_workers = set()  # Workers whose connection failed: no longer used
+    lost_slots = set()  # Slots of the dead workers, freed when their adapter is closed (see JSBSimRemoteAdapter.is_lost())
+    submitted = {}  # worker id: slots submitted since the last step()
+
+    @classmethod
+    def start(cls, num_workers=None):
+        if cls.flag_running:
+            return True
+        if cls.flag_start_failed:
+            return False
+        if num_workers is not None:
+            cls.num_workers = num_workers
+        if cls.num_workers <= 0 or not JSBSIM_AVAILABLE:
+            return False
+        try:
+            cls.shm = shared_memory.SharedMemory(create=True, size=get_buffer_size(cls.max_slots))
+            cls.inputs, cls.states, cls.valid = map_arrays(cls.shm.buf, cls.max_slots)
+            cls.inputs[:] = 0
+            cls.valid[:] = 0
+            authkey = os.urandom(16)
+            listener = Listener(authkey=authkey)
+            worker_file = os.path.abspath(__file__)
+            for i in range(cls.num_workers):
+                process = subprocess.Popen([sys.executable, worker_file, str(listener.address), cls.shm.name, str(cls.max_slots)],
+                                           cwd=os.path.dirname(worker_file), stdin=subprocess.PIPE)
+                process.stdin.write(authkey.hex().encode() + b"\n")
+                process.stdin.close()
+                cls.processes.append(process)
+                cls.connections.append(cls.accept(listener, process, authkey))
+            listener.close()
+        except Exception as e:
+            print("ERROR - JSBSim workers start failed: " + str(e))
+            cls.stop()
+            cls.flag_start_failed = True
+            return False
+        cls.free_slots = list(range(cls.max_slots - 1, -1, -1))
+        cls.slots_workers = {}
+        cls.dead_workers = set()
+        cls.lost_slots = set()
+        cls.submitted = {}
+        cls.flag_running = True
+        atexit.register(cls.stop)
+        print("JSBSim workers: %d processes started" % cls.num_workers)
+        return True
+
+    @classmethod
+    def accept(cls, listener, process, authkey):
+        # listener.accept() blocks: it runs in a thread while the worker process is watched
+        accepted = []
+        thread = threading.Thread(target=lambda: accepted.append(listener.accept()), daemon=True)
+        thread.start()
+        t0 = time.time()
+        while thread.is_alive():
+            thread.join(0.1)
+            if not thread.is_alive():
+                break
+            exit_code = process.poll()
+            if exit_code is not None or time.time() - t0 > cls.start_timeout:
+                # Unblocks accept() with a connection of our own
+                try:
+                    Client(listener.address, authkey=authkey).close()
+                except Exception:
+                    pass
+                thread.join(1)
+                for connection in accepted:
+                    connection.close()
+                if exit_code is not None:
+                    raise RuntimeError("worker exited with code %d" % exit_code)
+                raise RuntimeError("worker connection timeout (%d s)" % cls.start_timeout)
+        if len(accepted) == 0:
+            raise RuntimeError("worker connection failed")
+        return accepted[0]
+
+    @classmethod
+    def stop(cls):
+        for connection in cls.connections:
+            try:
+                connection.send(("stop",))
+                connection.close()
+            except (EOFError, OSError):
+                pass
+        for process in cls.processes:
+            try:
+                process.wait(5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        cls.processes = []
+        cls.connections = []
+        if cls.shm is not None:
+            cls.inputs, cls.states, cls.valid = None, None, None
+            cls.shm.close()
+            cls.shm.unlink()
+            cls.shm = None
+        cls.flag_running = False
+
+    @classmethod
+    def worker_failed(cls, worker_id, e):
+        # The worker process is considered dead: its slots are lost, their aircrafts fall back to in-process FDMs
+        if worker_id in cls.dead_workers:
+            return
+        print("ERROR - JSBSim worker %d lost (%s): %d FDMs moved to the main process" % (worker_id, str(e), list(cls.slots_workers.values()).count(worker_id)))
+        cls.dead_workers.add(worker_id)
+        for slot, wid in list(cls.slots_workers.items()):
+            if wid == worker_id:
+                cls.slots_workers.pop(slot)
+                cls.lost_slots.add(slot)
+                cls.valid[slot] = 0
+
+    @classmethod
+    def request(cls, worker_id, message):
+        if worker_id in cls.dead_workers:
+            return None
+        try:
+            cls.connections[worker_id].send(message)
+            return cls.connections[worker_id].recv()
+        except (EOFError, OSError) as e:
+            cls.worker_failed(worker_id, e)
+            return None
+
+    @classmethod
+    def create(cls, aircraft_name, rate):
+        # Returns the slot id, None if the FDM could not be created
+        if not cls.flag_running or len(cls.free_slots) == 0:
+            return None
+        # Least loaded worker
+        loads = [0] * cls.num_workers
+        for worker_id in cls.slots_workers.values():
+            loads[worker_id] += 1
+        for worker_id in cls.dead_workers:
+            loads[worker_id] = cls.max_slots + 1
+        worker_id = loads.index(min(loads))
+        if worker_id in cls.dead_workers:
+            return None
+        slot = cls.free_slots.pop()
+        cls.valid[slot] = 0
+        if not cls.request(worker_id, ("create", slot, aircraft_name, rate)):
+            cls.free_slots.append(slot)
+            return None
+        cls.slots_workers[slot] = worker_id
+        return slot
+
+    @classmethod
+    def remove(cls, slot):
+        if not cls.flag_running:
+            return
+        if slot in cls.lost_slots:
+            cls.lost_slots.remove(slot)
+            cls.free_slots.append(slot)
+            return
+        if slot not in cls.slots_workers:
+            return
+        worker_id = cls.slots_workers.pop(slot)
+        if worker_id in cls.submitted and slot in cls.submitted[worker_id]:
+            cls.submitted[worker_id].remove(slot)
+        cls.request(worker_id, ("remove", slot))
+        cls.valid[slot] = 0
+        cls.free_slots.append(slot)
+
+    @classmethod
+    def call(cls, slot, method_name, *args):
+        # JSBSimAdapter method call in the worker. hg.Vec3 arguments are sent as tuples
+        if not cls.flag_running or slot not in cls.slots_workers:
+            return None
+        args = [(a.x, a.y, a.z) if isinstance(a, hg.Vec3) else a for a in args]
+        return cls.request(cls.slots_workers[slot], ("call", slot, method_name, args))
+
+    @classmethod
+    def submit(cls, slot, dt, controls):
+        if slot not in cls.slots_workers:
+            return
+        inputs = cls.inputs[slot]
+        inputs[0] = dt
+        for i, key in enumerate(control_keys):
+            inputs[i + 1] = controls.get(key, 0.0)
+        worker_id = cls.slots_workers[slot]
+        if worker_id not in cls.submitted:
+            cls.submitted[worker_id] = []
+        cls.submitted[worker_id].append(slot)
+
+    @classmethod
+    def step(cls):
+        # Steps all the submitted slots: workers run concurrently, returns when all of them are done
+        if not cls.flag_running:
+            return
+        workers_ids = []
+        for worker_id, slots in cls.submitted.items():
+            if len(slots) > 0:
+                try:
+                    cls.connections[worker_id].send(("step", slots))
+                    workers_ids.append(worker_id)
+                except (EOFError, OSError) as e:
+                    cls.worker_failed(worker_id, e)
+        for worker_id in workers_ids:
+            try:
+                cls.connections[worker_id].recv()
+            except (EOFError, OSError) as e:
+                cls.worker_failed(worker_id, e)
+        cls.submitted = {}
+
+
+class JSBSimRemoteAdapter(JSBSimAdapter):
+    """
+    JSBSimAdapter interface, the FDM runs in a JSBSimWorkers process.
+    submit() + JSBSimWorkers.step() + get_state() is the concurrent version of update().
+    """
+
+    def __init__(self, aircraft_name="f16", rate=None, num_workers=None):
+        JSBSimAdapter.__init__(self, aircraft_name, use_jsbsim=False, rate=rate)
+        self.aircraft_name = aircraft_name
+        self.rate = rate
+        self.slot = None
+        if JSBSimWorkers.start(num_workers):
+            self.slot = JSBSimWorkers.create(aircraft_name, rate)
+        self.enabled = self.slot is not None
+        self.initialized = self.enabled
+        if not self.enabled:
+            print("JSBSim 初始化失败: no worker slot")
+
+    def is_lost(self):
+        return self.slot is not None and self.slot in JSBSimWorkers.lost_slots
+
+    def submit(self, dt, controls):
+        if self.enabled and self.initialized:
+            JSBSimWorkers.submit(self.slot, dt, controls)
+
+    def get_state(self):
+        # State record read from the shared memory, overwritten by the next get_state() (as JSBSimAdapter._get_state())
+        if not self.enabled or not self.initialized or JSBSimWorkers.valid is None or JSBSimWorkers.valid[self.slot] == 0:
+            return None
+        self.state_values[:] = JSBSimWorkers.states[self.slot]
+        self.state = self.state_buffer[0]
+        return self.state
+
+    def update(self, dt, controls):
+        if not self.enabled or not self.initialized:
+            return None
+        self.submit(dt, controls)
+        JSBSimWorkers.step()
+        return self.get_state()
+
+    def set_position(self, position_hg):
+        JSBSimWorkers.call(self.slot, "set_position", position_hg)
+
+    def set_velocity(self, velocity_hg):
+        JSBSimWorkers.call(self.slot, "set_velocity", velocity_hg)
+
+    def set_orientation(self, roll_deg, pitch_deg, yaw_deg):
+        JSBSimWorkers.call(self.slot, "set_orientation", roll_deg, pitch_deg, yaw_deg)
+
+    def get_snapshot(self):
+        return JSBSimWorkers.call(self.slot, "get_snapshot")
+
+    def restore_snapshot(self, snapshot):
+        JSBSimWorkers.call(self.slot, "restore_snapshot", snapshot)
+        state = self.get_state()
+        return None if state is None else state.copy()
+
+    def reset_state(self, position_hg, rotation_hg, speed, trim=False):
+        JSBSimWorkers.call(self.slot, "reset_state", position_hg, rotation_hg, speed, trim)
+        state = self.get_state()
+        return None if state is None else state.copy()
+
+    def close(self):
+        if self.slot is not None:
+            JSBSimWorkers.remove(self.slot)
+            self.slot = None
+        self.enabled = False
+        self.initialized = False
+
+
+# =============== Worker process ===============
+
+def worker_main(address, shm_name, num_slots, authkey):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        # The block belongs to the main process: don't let this process resource tracker unlink it at exit
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    inputs, states, valid = map_arrays(shm.buf, num_slots)
+    connection = Client(address, authkey=authkey)
+    adapters = {}
+
+    while True:
+        try:
+            message = connection.recv()
+        except (EOFError, OSError):
+            break
+        command = message[0]
+
+        if command == "step":
+            for slot in message[1]:
+                adapter = adapters.get(slot)
+                state = None
+                if adapter is not None:
+                    try:
+                        state = adapter.update(inputs[slot, 0], dict(zip(control_keys, inputs[slot, 1:])))
+                    except Exception:
+                        traceback.print_exc()
+                if state is None:
+                    valid[slot] = 0
+                else:
+                    states[slot] = adapter.state_values
+                    valid[slot] = 1
+            connection.send(True)
+
+        elif command == "create":
+            slot, aircraft_name, rate = message[1:]
+            flag_created = False
+            try:
+                adapter = JSBSimAdapter(aircraft_name, use_jsbsim=True, rate=rate)
+                if adapter.enabled and adapter.initialized:
+                    adapters[slot] = adapter
+                    flag_created = True
+            except Exception:
+                traceback.print_exc()
+            connection.send(flag_created)
+
+        elif command == "remove":
+            adapter = adapters.pop(message[1], None)
+            if adapter is not None:
+                try:
+                    adapter.close()  # FDM kept in this worker's pool
+                except Exception:
+                    traceback.print_exc()
+            connection.send(True)
+
+        elif command == "call":
+            slot, method_name, args = message[1:]
+            adapter = adapters.get(slot)
+            result = None
+            if adapter is not None:
+                try:
+                    args = [hg.Vec3(*a) if isinstance(a, tuple) else a for a in args]
+                    result = getattr(adapter, method_name)(*args)
+                    if isinstance(result, np.void):
+                        result = None  # State record: sent through the shared memory
+                    if adapter.state is not None:
+                        states[slot] = adapter.state_values
+                        valid[slot] = 1
+                except Exception:
+                    traceback.print_exc()
+                    result = None
+            try:
+                connection.send(result)
+            except Exception:
+                traceback.print_exc()  # Not picklable
+                connection.send(None)
+
+        elif command == "stop":
+            break
+
+    adapters = {}
+    del inputs, states, valid
+    connection.close()
+    shm.close()
+
+
+if __name__ == "__main__":
+    worker_main(sys.argv[1], sys.argv[2], int(sys.argv[3]), bytes.fromhex(sys.stdin.readline().strip()))
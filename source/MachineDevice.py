@@ -2,9 +2,12 @@
 
 import harfang as hg
 import json
+import numpy as np
 from math import radians, degrees, pi, sqrt, exp, floor, acos, asin, sin, cos
 from random import uniform
 from Particles import *
+import Physics
+from MachinesStates import *
 
 # =====================================================================================================
 #                                  Landing
@@ -415,6 +418,52 @@ class MissilesDevice(MachineDevice):
 
 class MachineGun(MachineDevice):
 
+    # Bullets hits are resolved against the targets bounding boxes, for all the guns at once (see update_bullets_hits()).
+    # Targets without bounding boxe, or all the targets if the machines states are out of date, use Bullet raycasts.
+    flag_precise_hits = False  # Bounding boxes hits are confirmed by a Bullet raycast
+    bullets_batch = []  # (gun, bullet id, position, displacement, targets mask) of the current tick
+
+    @classmethod
+    def update_bullets_hits(cls):
+        # Swept segments of all the bullets of the tick vs the oriented bounding boxes of their targets
+        batch = cls.bullets_batch
+        cls.bullets_batch = []
+        if len(batch) == 0 or not MachinesStates.flag_valid:
+            return
+        masks = np.array([b[4] for b in batch])
+        targets_ids = np.nonzero(np.any(masks, axis=0))[0]
+        if len(targets_ids) == 0:
+            return
+        masks = masks[:, targets_ids]
+        p0 = np.array([[b[2].x, b[2].y, b[2].z] for b in batch])
+        d = np.array([[b[3].x, b[3].y, b[3].z] for b in batch])
+
+        # Segments in the targets local spaces: (bullets, targets, 3)
+        axes = MachinesStates.orientations[targets_ids]
+        local_p0 = np.einsum("tij,btj->bti", axes, p0[:, None, :] - MachinesStates.positions[targets_ids][None, :, :])
+        local_d = np.einsum("tij,bj->bti", axes, d)
+        local_d = np.where(np.abs(local_d) < 1e-9, 1e-9, local_d)
+
+        # Slabs test, segment parameter in [0, 1]
+        t1 = (MachinesStates.bounds_min[targets_ids][None, :, :] - local_p0) / local_d
+        t2 = (MachinesStates.bounds_max[targets_ids][None, :, :] - local_p0) / local_d
+        t_in = np.max(np.minimum(t1, t2), axis=2)
+        t_out = np.min(np.maximum(t1, t2), axis=2)
+        hits = masks & (t_in <= t_out) & (t_out >= 0) & (t_in <= 1)
+        t_in = np.where(hits, np.maximum(t_in, 0), np.inf)
+
+        for bi in np.nonzero(np.any(hits, axis=1))[0]:
+            gun, i, pos, displacement, mask = batch[bi]
+            bullet = gun.bullets_particles.particles[i]
+            if not bullet.get_enabled():
+                continue
+            target = MachinesStates.machines[targets_ids[np.argmin(t_in[bi])]]
+            if cls.flag_precise_hits and not gun.raycast_bullet(pos, bullet.v_move, displacement, [target]):
+                continue
+            target.hit(0.1)
+            bullet.v_move = target.v_move
+            gun.strike(i)
+
     def __init__(self, name, machine, slot_node, scene, scene_physics, num_bullets, bullet_node_name="gun_bullet"):
         MachineDevice.__init__(self, name, machine, True)
         self.scene = scene
@@ -479,6 +528,19 @@ class MachineGun(MachineDevice):
             fb.reset()
             fb.flow = 3000
 
+    def raycast_bullet(self, pos, v_move, displacement, targets):
+        # Bullet raycast along the bullet direction, returns the hit target of the list or None
+        p1 = pos + v_move
+        rc_len = hg.Len(p1 - pos)
+        hit = Physics.raycast_first_hit(pos, p1, self.machine.arena_id)
+        if hit is not None and 0 < hit.t < rc_len:
+            v_impact = hit.P - pos
+            if hg.Len(v_impact) < hg.Len(displacement):
+                target = Physics.get_object_by_collision_node(hit.node)
+                if target in targets:
+                    return target
+        return None
+
     def update(self, dts):
         td = self.machine.get_device("TargettingDevice")
         if td is not None:
@@ -489,6 +551,14 @@ class MachineGun(MachineDevice):
             position = pos_prec + v0 * dts
 
             self.bullets_particles.update_kinetics(position, direction, v0, axisY, dts)
+
+            targets_mask = MachinesSpatialIndex.get_mask(targets)
+            if targets_mask is not None:
+                boxes_mask = targets_mask & MachinesStates.has_bounds
+                flag_boxes = np.any(boxes_mask)
+                raycasts_mask = targets_mask & ~MachinesStates.has_bounds
+                flag_raycasts = np.any(raycasts_mask)
+
             for i in range(self.bullets_particles.num_particles):
                 bullet = self.bullets_particles.particles[i]
                 mat = bullet.node.GetTransform()
@@ -501,8 +571,6 @@ class MachineGun(MachineDevice):
                         bullet.v_move *= 0
                         self.strike(i)
 
-                    p1 = pos_fb + bullet.v_move
-
                     #Collision using distance:
                     """
                     for target in targets:
@@ -514,20 +582,23 @@ class MachineGun(MachineDevice):
                             break
 
                     """
-                    rc_len = hg.Len(p1 - pos_fb)
-                    hit = self.scene_physics.RaycastFirstHit(self.scene, pos_fb, p1)
-                    if 0 < hit.t < rc_len:
-                        v_impact = hit.P - pos_fb
-                        if hg.Len(v_impact) < 2 * hg.Len(bullet.v_move) * dts:
-                            for target in targets:
-                                cnds = target.get_collision_nodes()
-                                for nd in cnds:
-                                    if nd == hit.node:
-                                        target.hit(0.1)
-                                        bullet.v_move = target.v_move
-                                        self.strike(i)
-                                        break
-
+                    displacement = bullet.v_move * (2 * dts)
+                    if targets_mask is None:
+                        raycast_targets = targets
+                    else:
+                        if flag_boxes:
+                            MachineGun.bullets_batch.append((self, i, pos_fb, displacement, boxes_mask))
+                        raycast_targets = []
+                        if flag_raycasts:
+                            # Raycast only if a target without bounding boxe is in reach of the bullet
+                            raycast_targets = MachinesSpatialIndex.get_machines(MachinesSpatialIndex.query_range(pos_fb, hg.Len(displacement), raycasts_mask))
+
+                    if len(raycast_targets) > 0:
+                        target = self.raycast_bullet(pos_fb, bullet.v_move, displacement, raycast_targets)
+                        if target is not None:
+                            target.hit(0.1)
+                            bullet.v_move = target.v_move
+                            self.strike(i)
 
                 if len(self.bullets_feed_backs) > 0:
                     fb = self.bullets_feed_backs[i]
@@ -2183,16 +2254,21 @@ class AircraftIAControlDevice(ControlDevice):
         aircraft = self.machine
         td = aircraft.get_device("TargettingDevice")
         offenders = []
-        for target_id, target in enumerate(td.targets):
+        for target in td.targets:
             td_t = target.get_device("TargettingDevice")
             if td_t is not None:
                 offender_target = td_t.get_target()
                 if offender_target == aircraft:
-                    offenders.append([target_id, hg.Len(target.get_parent_node().GetTransform().GetPos() - aircraft.parent_node.GetTransform().GetPos())])
+                    offenders.append(target)
         if len(offenders) > 0:
-            if len(offenders) > 1:
-                offenders.sort(key=lambda p: p[1])
-            td.set_target_id(offenders[0][0])
+            pos = aircraft.parent_node.GetTransform().GetPos()
+            mask = MachinesSpatialIndex.get_mask(offenders)
+            sid = None if mask is None else MachinesSpatialIndex.query_nearest(pos, mask)
+            if sid is not None:
+                offender = MachinesStates.machines[sid]
+            else:
+                offender = min(offenders, key=lambda target: hg.Len(target.get_parent_node().GetTransform().GetPos() - pos))
+            td.set_target_id(td.targets.index(offender))
     # =============================== Keyboard commands ====================================
 
     def activate_user_control_kb(self, value):
@@ -7,6 +7,8 @@ from Particles import *
 import tools
 import Physics
 from MachineDevice import *
+from MachinesStates import *
+from Profiler import Profiler
 import math
 from overlays import *
 
@@ -19,32 +21,40 @@ from overlays import *
 class Collisions_Object(MachineDevice):
 
     _instances = []
+    current_arena_id = 0  # Arena of the new objects (see Arenas.py)
 
     @classmethod
     def reset_collisions_objects(cls):
         cls._instances = []
+        Physics.nodes_objects = {}
+        Physics.nodes_arenas = {}
 
     @classmethod
     def get_object_by_collision_node(cls, node: hg.Node):
-        #nm0 = node.GetName()
-        for col_obj in cls._instances:
-            nds = col_obj.get_collision_nodes()
-            if len(nds) > 0:
-                for nd in nds:
-                    #nm = nd.GetName()
-                    if node.GetUid() == nd.GetUid():
-                        return col_obj
-        return None
+        return Physics.get_object_by_collision_node(node)
 
     def __init__(self, name):
         MachineDevice.__init__(self, name, None, True)
         self.collision_nodes = []
         Collisions_Object._instances.append(self)
         self.instance_id = len(Collisions_Object._instances) - 1
+        self.arena_id = Collisions_Object.current_arena_id
+        self.terrain_sample = None  # (x, z, altitude, normale) sampled by Main.update_terrain_samples()
 
     def get_collision_nodes(self):
         return self.collision_nodes
 
+    def add_collision_node(self, node: hg.Node):
+        self.collision_nodes.append(node)
+        Physics.nodes_objects[node.GetUid()] = self
+        Physics.nodes_arenas[node.GetUid()] = self.arena_id
+
+    def remove_collision_nodes(self):
+        for nd in self.collision_nodes:
+            Physics.nodes_objects.pop(nd.GetUid(), None)
+            Physics.nodes_arenas.pop(nd.GetUid(), None)
+        self.collision_nodes = []
+
     def test_collision(self, nd: hg.Node):
         if len(self.collision_nodes) > 0:
             for ndt in self.collision_nodes:
@@ -57,14 +67,23 @@ class Collisions_Object(MachineDevice):
 # =====================================================================================================
 class AnimatedModel(Collisions_Object):
 
+    # Headless mode: models, materials and textures are not loaded (no GPU context)
+    flag_load_resources = True
+    assets_folder = "assets_compiled"
+
     def __init__(self, name, model_name, scene, pipeline_ressource: hg.PipelineResources, instance_scene_name):
         Collisions_Object.__init__(self, name)
         self.commands.update({"SET_CURRENT_PILOT": self.set_current_pilot})
+        self.state_id = None  # Index in MachinesStates
         self.model_name = model_name
         self.scene = scene
         self.res = pipeline_ressource
 
-        self.parent_node, f = hg.CreateInstanceFromAssets(scene, hg.TranslationMat4(hg.Vec3(0, 0, 0)), instance_scene_name, pipeline_ressource, hg.GetForwardPipelineInfo())
+        if AnimatedModel.flag_load_resources:
+            self.parent_node, f = hg.CreateInstanceFromAssets(scene, hg.TranslationMat4(hg.Vec3(0, 0, 0)), instance_scene_name, pipeline_ressource, hg.GetForwardPipelineInfo())
+        else:
+            self.parent_node, f = hg.CreateInstanceFromAssets(scene, hg.TranslationMat4(hg.Vec3(0, 0, 0)), instance_scene_name, pipeline_ressource, hg.GetForwardPipelineInfo(), hg.LSSF_All | hg.LSSF_DoNotLoadResources)
+            tools.setup_instances(scene, self.parent_node.GetInstanceSceneView().GetNodes(scene), pipeline_ressource)
 
         self.parent_node.SetName(self.name)
         self.remove_dummies_objects()
@@ -83,6 +102,15 @@ class AnimatedModel(Collisions_Object):
     def setup_particles(self):
         pass
 
+    def get_object_minmax(self, nd: hg.Node):
+        if AnimatedModel.flag_load_resources:
+            return nd.GetObject().GetMinMax(self.res)
+        # Unloaded model: bounds are read from the model file
+        model_name = self.res.GetModelName(nd.GetObject().GetModelRef())
+        if model_name == "":
+            return False, hg.MinMax()
+        return tools.get_model_file_minmax(AnimatedModel.assets_folder + "/" + model_name)
+
     def reset(self):
         Collisions_Object.reset(self)
         self.set_current_pilot(1)
@@ -185,10 +213,14 @@ class AnimatedModel(Collisions_Object):
         self.parent_node.GetTransform().SetRot(rot)
         mat = hg.TransformationMat4(pos, rot)
         self.parent_node.GetTransform().SetWorld(mat)
+        MachinesStates.invalidate(self)
+
+    def get_world_matrix(self):
+        return MachinesStates.get_world_matrix(self)
 
     def decompose_matrix(self, matrix=None):
         if matrix is None:
-            matrix = self.parent_node.GetTransform().GetWorld()
+            matrix = self.get_world_matrix()
         aX = hg.GetX(matrix)
         aY = hg.GetY(matrix)
         aZ = hg.GetZ(matrix)
@@ -197,13 +229,13 @@ class AnimatedModel(Collisions_Object):
         return matrix, pos, rot, aX, aY, aZ
 
     def get_X_axis(self):
-        return hg.GetX((self.parent_node.GetTransform().GetWorld()))
+        return hg.GetX(self.get_world_matrix())
 
     def get_Y_axis(self):
-        return hg.GetY((self.parent_node.GetTransform().GetWorld()))
+        return hg.GetY(self.get_world_matrix())
 
     def get_Z_axis(self):
-        return hg.GetZ((self.parent_node.GetTransform().GetWorld()))
+        return hg.GetZ(self.get_world_matrix())
 
     def define_mobile_parts(self, mobile_parts_definitions):
         for mpd in mobile_parts_definitions:
@@ -314,7 +346,7 @@ class Destroyable_Machine(AnimatedModel):
     @classmethod
     def get_machine_by_node(cls, node:hg.Node):
         collision_object = cls.get_object_by_collision_node(node)
-        if collision_object.name in cls.machines_items:
+        if collision_object is not None and collision_object.name in cls.machines_items:
             return cls.machines_items[collision_object.name]
         else:
             return None
@@ -322,6 +354,8 @@ class Destroyable_Machine(AnimatedModel):
     @classmethod
     def reset_machines(cls):
         Collisions_Object.reset_collisions_objects()
+        Physics.MissilesKinetics.reset()
+        MachinesStates.reset()
         cls.update_list = []
 
     @classmethod
@@ -428,8 +462,15 @@ class Destroyable_Machine(AnimatedModel):
         return None
 
     def update_devices(self, dts):
-        for name, device in self.devices.items():
-            device.update(dts)
+        if Profiler.flag_enabled:
+            for name, device in self.devices.items():
+                scope = "Device." + type(device).__name__
+                Profiler.begin(scope)
+                device.update(dts)
+                Profiler.end(scope)
+        else:
+            for name, device in self.devices.items():
+                device.update(dts)
 
     def get_device(self, device_name):
         if device_name in self.devices:
@@ -490,15 +531,16 @@ class Destroyable_Machine(AnimatedModel):
 
     def destroy_nodes(self):
         AnimatedModel.destroy_nodes(self)
-        for nd in self.collision_nodes:
+        collision_nodes = self.collision_nodes
+        self.remove_collision_nodes()
+        for nd in collision_nodes:
             self.scene.DestroyNode(nd)
-        self.collision_nodes = []
         hg.SceneGarbageCollectSystems(self.scene, self.scene_physics)
 
     def setup_collisions(self):
 
         self.scene.Update(1000)
-        self.collision_nodes = []
+        self.remove_collision_nodes()
         self.collision_boxes = []
 
         nodes = self.parent_node.GetInstanceSceneView().GetNodes(self.scene)
@@ -507,10 +549,13 @@ class Destroyable_Machine(AnimatedModel):
             nd = nodes.at(i)
             nm = nd.GetName()
             if "col_shape" in nm:
-                f, mm = nd.GetObject().GetMinMax(self.res)
+                f, mm = self.get_object_minmax(nd)
                 size = (mm.mx - mm.mn)
-                mdl = hg.CreateCubeModel(self.vs_decl, size.x, size.y, size.z)
-                ref = self.res.AddModel('col_shape' + str(i), mdl)
+                if AnimatedModel.flag_load_resources:
+                    mdl = hg.CreateCubeModel(self.vs_decl, size.x, size.y, size.z)
+                    ref = self.res.AddModel('col_shape' + str(i), mdl)
+                else:
+                    ref = hg.InvalidModelRef  # The object is removed below, only the physics shape is used
                 pos = nd.GetTransform().GetPos()
                 rot = nd.GetTransform().GetRot()
                 parent = nd.GetTransform().GetParent()
@@ -522,7 +567,7 @@ class Destroyable_Machine(AnimatedModel):
                 new_node.GetTransform().SetParent(parent)
                 new_node.RemoveObject()
                 self.scene.DestroyNode(nd)
-                self.collision_nodes.append(new_node)
+                self.add_collision_node(new_node)
                 self.collision_boxes.append({"node": new_node, "size": hg.Vec3(size)})
                 self.scene_physics.NodeCreatePhysicsFromAssets(new_node)
         hg.SceneGarbageCollectSystems(self.scene, self.scene_physics)
@@ -584,7 +629,7 @@ class Destroyable_Machine(AnimatedModel):
             nd = nodes.at(i)
             if nd.HasObject():
                 mat = nd.GetTransform().GetWorld() * mdl_mat
-                f, mm = nd.GetObject().GetMinMax(self.res)
+                f, mm = self.get_object_minmax(nd)
                 bounding_box = [hg.Vec3(mm.mn.x, mm.mn.y, mm.mn.z), hg.Vec3(mm.mn.x, mm.mx.y, mm.mn.z), hg.Vec3(mm.mx.x, mm.mx.y, mm.mn.z), hg.Vec3(mm.mx.x, mm.mn.y, mm.mn.z),
                                 hg.Vec3(mm.mn.x, mm.mn.y, mm.mx.z), hg.Vec3(mm.mn.x, mm.mx.y, mm.mx.z), hg.Vec3(mm.mx.x, mm.mx.y, mm.mx.z), hg.Vec3(mm.mx.x, mm.mn.y, mm.mx.z)]
 
@@ -618,7 +663,7 @@ class Destroyable_Machine(AnimatedModel):
 
     def get_world_bounding_boxe(self):
         if self.bounding_boxe is not None:
-            matrix = self.parent_node.GetTransform().GetWorld()
+            matrix = self.get_world_matrix()
             bb = []
             for p in self.bounding_boxe:
                 bb.append(matrix * p)
@@ -661,14 +706,14 @@ class Destroyable_Machine(AnimatedModel):
         return self.parent_node.GetTransform().GetPos().y
 
     def get_pitch_attitude(self):
-        aZ = hg.GetZ(self.get_parent_node().GetTransform().GetWorld())
+        aZ = hg.GetZ(self.get_world_matrix())
         horizontal_aZ = hg.Normalize(hg.Vec3(aZ.x, 0, aZ.z))
         pitch_attitude = degrees(acos(max(-1, min(1, hg.Dot(horizontal_aZ, aZ)))))
         if aZ.y < 0: pitch_attitude *= -1
         return pitch_attitude
 
     def get_roll_attitude(self):
-        matrix = self.get_parent_node().GetTransform().GetWorld()
+        matrix = self.get_world_matrix()
         aX = hg.GetX(matrix)
         aY = hg.GetY(matrix)
         aZ = hg.GetZ(matrix)
@@ -688,7 +733,7 @@ class Destroyable_Machine(AnimatedModel):
         return heading
 
     def get_heading(self):
-        aZ = hg.GetZ(self.get_parent_node().GetTransform().GetWorld())
+        aZ = hg.GetZ(self.get_world_matrix())
         horizontal_aZ = hg.Normalize(hg.Vec3(aZ.x, 0, aZ.z))
         return self.calculate_heading(horizontal_aZ)
 
@@ -843,6 +888,7 @@ class Missile(Destroyable_Machine):
 
         self.target = None
         self.target_collision_test_distance_max = 100
+        self.kinetics_id = None  # Row in Physics.MissilesKinetics while in flight
 
         # Missile constantes:
         self.f_thrust = 150  # 从 100 增加到 150 (+50%)，基础导弹推力
@@ -896,6 +942,7 @@ class Missile(Destroyable_Machine):
 
     def destroy(self):
         if not self.flag_destroyed:
+            Physics.MissilesKinetics.remove(self)
             self.get_parent_node().GetTransform().ClearParent()
             self.destroy_particles()
             self.destroy_nodes()
@@ -942,6 +989,7 @@ class Missile(Destroyable_Machine):
 
     def deactivate(self):
         # CONFUSION - ADD HIDE() Function
+        Physics.MissilesKinetics.remove(self)
         Destroyable_Machine.deactivate(self)
         self.disable_nodes()
         for p in self.smoke:
@@ -953,6 +1001,10 @@ class Missile(Destroyable_Machine):
     def get_engines_slots(self):
         return self.get_slots("engine_slot")
 
+    def reset_matrix(self, pos, rot):
+        Physics.MissilesKinetics.remove(self)
+        Destroyable_Machine.reset_matrix(self, pos, rot)
+
     def reset(self, position=None, rotation=None):
 
         # Don't call parent's function, World Matrix mustn't be reseted !
@@ -1163,7 +1215,12 @@ class Missile(Destroyable_Machine):
                 self.start_explosion()
             if not self.wreck:
 
-                if not self.flag_custom_physics_mode:
+                if not self.flag_custom_physics_mode and self.kinetics_id is not None and not self.flag_user_control:
+                    # Integrated with the other missiles in flight, by Main.update_kinetics()
+                    mat, self.v_move = Physics.MissilesKinetics.get_kinetics(self)
+
+                elif not self.flag_custom_physics_mode:
+                    Physics.MissilesKinetics.remove(self)
                     mat, pos, rot, aX, aY, aZ = self.decompose_matrix()
                     # Rotation
                     self.angular_levels.x, self.angular_levels.y, self.angular_levels.z = 0, 0, 0
@@ -1195,9 +1252,11 @@ class Missile(Destroyable_Machine):
                     #debug
                     if self.flag_user_control:
                         self.v_move *= 0
-
+                    else:
+                        Physics.MissilesKinetics.add(self, mat, self.v_move)
 
                 else:
+                    Physics.MissilesKinetics.remove(self)
                     if self.custom_matrix is not None:
                         mat = self.custom_matrix
                     else:
@@ -1233,6 +1292,7 @@ class Missile(Destroyable_Machine):
     def start_explosion(self):
         if not self.wreck:
             self.wreck = True
+            Physics.MissilesKinetics.remove(self)
             if self.explode is not None:
                 self.explode.flow = 3000
             self.disable_nodes()
@@ -1273,18 +1333,30 @@ class Aircraft(Destroyable_Machine):
         
         # JSBSim 飞行动力学引擎（优先启用，失败时自动降级）
         # 如果没有显式指定，从全局配置读取
+        jsbsim_rate = None
+        jsbsim_workers = 0
         if use_jsbsim is None:
             from master import Main
             use_jsbsim = Main.flag_use_jsbsim if hasattr(Main, 'flag_use_jsbsim') else True  # 默认启用
             jsbsim_aircraft = Main.jsbsim_aircraft_type if hasattr(Main, 'jsbsim_aircraft_type') else "f16"
+            jsbsim_rate = Main.jsbsim_rate
+            jsbsim_workers = Main.jsbsim_workers
         
         self.use_jsbsim = use_jsbsim
         self.jsbsim_adapter = None
+        self.jsbsim_submitted = False  # Controls submitted to the JSBSim workers pool this tick (see submit_kinetics_jsbsim())
         
         if use_jsbsim:
             try:
-                from JSBSimAdapter import JSBSimAdapter
-                self.jsbsim_adapter = JSBSimAdapter(jsbsim_aircraft, use_jsbsim=True)
+                if jsbsim_workers > 0:
+                    from JSBSimWorkers import JSBSimWorkers, JSBSimRemoteAdapter
+                    if JSBSimWorkers.start(jsbsim_workers):
+                        # FDM in a worker process (see JSBSimWorkers.py)
+                        self.jsbsim_adapter = JSBSimRemoteAdapter(jsbsim_aircraft, rate=jsbsim_rate, num_workers=jsbsim_workers)
+                if self.jsbsim_adapter is None:
+                    # Workers pool disabled or not started: FDM in the main process
+                    from JSBSimAdapter import JSBSimAdapter
+                    self.jsbsim_adapter = JSBSimAdapter(jsbsim_aircraft, use_jsbsim=True, rate=jsbsim_rate)
                 
                 if self.jsbsim_adapter.enabled:
                     print(f"✈️  {name}: 已启用 JSBSim 真实飞行动力学 (型号: {jsbsim_aircraft})")
@@ -1500,6 +1572,8 @@ class Aircraft(Destroyable_Machine):
         for pcp in self.post_combustion_particles:
             pcp.destroy()
         self.post_combustion_particles = []
+        if self.jsbsim_adapter is not None:
+            self.jsbsim_adapter.close()
         self.destroy_nodes()
         self.flag_destroyed = True
 
@@ -2079,13 +2153,74 @@ class Aircraft(Destroyable_Machine):
 
                 self.update_feedbacks(dts)
 
+    def reset_jsbsim_state(self, position, rotation, linear_speed, flag_trim=False):
+        """
+        JSBSim FDM reset to a position / rotation / speed, without model reloading (see JSBSimAdapter.reset_state())
+        """
+        if self.use_jsbsim and self.jsbsim_adapter is not None and self.jsbsim_adapter.enabled:
+            self.jsbsim_adapter.reset_state(position, rotation, linear_speed, flag_trim)
+            self.jsbsim_submitted = False
+            self._jsbsim_initialized = True  # FDM synchronized: no first update sync
+
     def update_kinetics_jsbsim(self, dts):
         """
         使用 JSBSim 引擎更新飞机运动学
         """
+        flag_submitted = self.jsbsim_submitted
+        self.jsbsim_submitted = False
         if not self.activated:
             return
-        
+
+        if self.jsbsim_adapter.is_lost():
+            self.fall_back_jsbsim()
+            if not self.use_jsbsim:
+                return
+            if flag_submitted:
+                # Devices already updated this tick (see submit_kinetics_jsbsim())
+                state = self.jsbsim_adapter.update(dts, self.jsbsim_adapter.harfang_to_jsbsim_controls(self))
+                self.apply_state_jsbsim(state, dts)
+                return
+
+        if flag_submitted:
+            # Controls submitted and FDM already stepped by the workers pool (see Main.update_kinetics())
+            state = self.jsbsim_adapter.get_state()
+        else:
+            controls = self.update_controls_jsbsim(dts)
+            # 更新 JSBSim 物理模拟
+            state = self.jsbsim_adapter.update(dts, controls)
+
+        self.apply_state_jsbsim(state, dts)
+
+    def fall_back_jsbsim(self):
+        """
+        JSBSim worker process lost: the FDM is loaded in the main process and reset on the aircraft node state
+        """
+        remote_adapter = self.jsbsim_adapter
+        remote_adapter.close()
+        from JSBSimAdapter import JSBSimAdapter
+        self.jsbsim_adapter = JSBSimAdapter(remote_adapter.aircraft_name, use_jsbsim=True, rate=remote_adapter.rate)
+        if not self.jsbsim_adapter.enabled:
+            print(f"⚠️  {self.name}: JSBSim 初始化失败，使用简化物理模型")
+            self.use_jsbsim = False
+            return
+        _, pos, rot, _, _, _ = self.decompose_matrix(self.parent_node.GetTransform().GetWorld())
+        self.reset_jsbsim_state(pos, rot, self.get_linear_speed())
+
+    def submit_kinetics_jsbsim(self, dts):
+        """
+        JSBSim workers pool, first pass: devices and controls are updated and submitted,
+        JSBSimWorkers.step() then steps all the FDMs at once, update_kinetics_jsbsim() applies the states.
+        """
+        if not self.activated:
+            return
+        controls = self.update_controls_jsbsim(dts)
+        self.jsbsim_adapter.submit(dts, controls)
+        self.jsbsim_submitted = True
+
+    def update_controls_jsbsim(self, dts):
+        """
+        更新设备与控制面, returns the JSBSim controls
+        """
         # 更新设备（控制输入等）
         self.update_devices(dts)
         
@@ -2129,10 +2264,16 @@ class Aircraft(Destroyable_Machine):
             )
             self._jsbsim_initialized = True
             print(f"{self.name}: JSBSim 状态已同步")
-        
-        # 更新 JSBSim 物理模拟
-        state = self.jsbsim_adapter.update(dts, controls)
-        
+
+        return controls
+
+    def apply_state_jsbsim(self, state, dts):
+        """
+        JSBSim 状态 -> Harfang 节点
+        state: adapter state record, overwritten by the next FDM update: its fields are read here, not kept
+        """
+        current_pos = hg.GetT(self.parent_node.GetTransform().GetWorld())
+
         if state is not None:
             # 将 JSBSim 状态转换为 Harfang 矩阵和速度
             mat, velocity = self.jsbsim_adapter.jsbsim_to_harfang_matrix(state, current_pos)
@@ -0,0 +1,232 @@
+# Machines states registry: world states of all the machines in contiguous arrays, refreshed once per tick,
+# and a spatial index over their positions for range and nearest queries.
+
+import harfang as hg
+import numpy as np
+from math import floor
+
+
+class MachinesStates:
+    """
+    World states of all the machines (all arenas), in contiguous arrays.
+    Updated once per tick by Main.update_machines_states(), after the scene systems update.
+    Between two updates, the machines world matrices are read here instead of the scene nodes:
+    they don't change until the next scene update, except by reset_matrix() (see invalidate()).
+    """
+
+    flag_valid = False
+    version = 0  # Incremented when the registered machines change
+    machines = []
+    world_matrices = []  # hg.Mat4, None if invalidated
+    default_radius = 50
+
+    positions = np.zeros((0, 3))
+    velocities = np.zeros((0, 3))
+    orientations = np.zeros((0, 3, 3))  # Rows: X, Y, Z axis
+    euler_angles = np.zeros((0, 3))
+    health_levels = np.zeros(0)
+    nationalities = np.zeros(0, dtype=np.int32)
+    types = np.zeros(0, dtype=np.int32)
+    arenas_ids = np.zeros(0, dtype=np.int32)
+    activated = np.zeros(0, dtype=bool)
+    wrecks = np.zeros(0, dtype=bool)
+    radiuses = np.zeros(0)  # Bounding spheres around the machines origins
+    bounds_min = np.zeros((0, 3))  # Local bounding boxes (Destroyable_Machine.bounding_boxe)
+    bounds_max = np.zeros((0, 3))
+    has_bounds = np.zeros(0, dtype=bool)
+
+    @classmethod
+    def reset(cls):
+        cls.flag_valid = False
+        cls.version += 1
+        cls.machines = []
+        cls.world_matrices = []
+        cls.allocate(0)
+        MachinesSpatialIndex.reset()
+
+    @classmethod
+    def allocate(cls, n):
+        cls.positions = np.zeros((n, 3))
+        cls.velocities = np.zeros((n, 3))
+        cls.orientations = np.zeros((n, 3, 3))
+        cls.euler_angles = np.zeros((n, 3))
+        cls.health_levels = np.zeros(n)
+        cls.nationalities = np.zeros(n, dtype=np.int32)
+        cls.types = np.zeros(n, dtype=np.int32)
+        cls.arenas_ids = np.zeros(n, dtype=np.int32)
+        cls.activated = np.zeros(n, dtype=bool)
+        cls.wrecks = np.zeros(n, dtype=bool)
+        cls.radiuses = np.zeros(n)
+        cls.bounds_min = np.zeros((n, 3))
+        cls.bounds_max = np.zeros((n, 3))
+        cls.has_bounds = np.zeros(n, dtype=bool)
+
+    @classmethod
+    def get_bounding_radius(cls, machine):
+        if machine.bounding_boxe is None:
+            return cls.default_radius
+        return max([hg.Len(p) for p in machine.bounding_boxe])
+
+    @classmethod
+    def update(cls, machines):
+        if len(machines) != len(cls.machines) or any([m is not machine for m, machine in zip(cls.machines, machines)]):
+            cls.version += 1
+            cls.allocate(len(machines))
+            for i, machine in enumerate(machines):
+                cls.radiuses[i] = cls.get_bounding_radius(machine)
+                if machine.bounding_boxe is not None:
+                    corners = np.array([[p.x, p.y, p.z] for p in machine.bounding_boxe])
+                    cls.bounds_min[i] = np.min(corners, axis=0)
+                    cls.bounds_max[i] = np.max(corners, axis=0)
+                    cls.has_bounds[i] = True
+        cls.machines = list(machines)
+        cls.world_matrices = []
+        for i, machine in enumerate(cls.machines):
+            machine.state_id = i
+            matrix = machine.parent_node.GetTransform().GetWorld()
+            cls.world_matrices.append(matrix)
+            aX, aY, aZ = hg.GetX(matrix), hg.GetY(matrix), hg.GetZ(matrix)
+            pos = hg.GetT(matrix)
+            rot = hg.GetR(matrix)
+            v = machine.v_move
+            cls.positions[i] = pos.x, pos.y, pos.z
+            cls.velocities[i] = v.x, v.y, v.z
+            cls.orientations[i] = [[aX.x, aX.y, aX.z], [aY.x, aY.y, aY.z], [aZ.x, aZ.y, aZ.z]]
+            cls.euler_angles[i] = rot.x, rot.y, rot.z
+            cls.health_levels[i] = machine.health_level
+            cls.nationalities[i] = machine.nationality
+            cls.types[i] = machine.type
+            cls.arenas_ids[i] = machine.arena_id
+            cls.activated[i] = machine.activated
+            cls.wrecks[i] = machine.wreck
+        cls.flag_valid = True
+        MachinesSpatialIndex.update()
+
+    @classmethod
+    def get_state_id(cls, machine):
+        # Index of the machine in the arrays, None if not registered or out of date
+        sid = machine.state_id
+        if cls.flag_valid and sid is not None and sid < len(cls.machines) and cls.machines[sid] is machine and cls.world_matrices[sid] is not None:
+            return sid
+        return None
+
+    @classmethod
+    def invalidate(cls, machine):
+        # The machine world matrix was set outside the scene update
+        sid = machine.state_id
+        if sid is not None and sid < len(cls.machines) and cls.machines[sid] is machine:
+            cls.world_matrices[sid] = None
+
+    @classmethod
+    def get_world_matrix(cls, machine):
+        # A copy, as GetWorld(): callers can modify it without corrupting the registry
+        sid = cls.get_state_id(machine)
+        if sid is None:
+            return machine.parent_node.GetTransform().GetWorld()
+        return hg.Mat4(cls.world_matrices[sid])
+
+
+class MachinesSpatialIndex:
+    """
+    Uniform horizontal grid over the MachinesStates positions (active machines only), updated after each registry update:
+    only the machines that changed of cell are moved.
+    Queries return states ids (MachinesStates arrays indices), distances are measured to the machines bounding spheres.
+    """
+
+    cell_size = 1000
+    cells = {}  # (i, j) -> set of states ids
+    keys = np.zeros((0, 2), dtype=np.int64)
+    indexed = np.zeros(0, dtype=bool)
+    version = -1  # MachinesStates version of the grid
+    max_radius = 0
+
+    @classmethod
+    def reset(cls):
+        cls.cells = {}
+        cls.keys = np.zeros((0, 2), dtype=np.int64)
+        cls.indexed = np.zeros(0, dtype=bool)
+        cls.version = -1
+        cls.max_radius = 0
+
+    @classmethod
+    def update(cls):
+        keys = np.floor(MachinesStates.positions[:, [0, 2]] / cls.cell_size).astype(np.int64)
+        indexed = MachinesStates.activated & ~MachinesStates.wrecks
+        if cls.version != MachinesStates.version:
+            cls.cells = {}
+            moved = np.nonzero(indexed)[0]
+            cls.version = MachinesStates.version
+            cls.max_radius = np.max(MachinesStates.radiuses) if len(MachinesStates.radiuses) > 0 else 0
+        else:
+            moved = np.nonzero(np.any(keys != cls.keys, axis=1) | (indexed != cls.indexed))[0]
+            for sid in moved:
+                if cls.indexed[sid]:
+                    cell_key = (cls.keys[sid, 0], cls.keys[sid, 1])
+                    cell = cls.cells[cell_key]
+                    cell.discard(sid)
+                    if len(cell) == 0:
+                        cls.cells.pop(cell_key)
+        for sid in moved:
+            if indexed[sid]:
+                cell_key = (keys[sid, 0], keys[sid, 1])
+                if cell_key not in cls.cells:
+                    cls.cells[cell_key] = set()
+                cls.cells[cell_key].add(sid)
+        cls.keys = keys
+        cls.indexed = indexed
+
+    @classmethod
+    def get_candidates(cls, position, radius):
+        # States ids of the cells overlapping the query circle
+        r = radius + cls.max_radius
+        i0, i1 = int(floor((position.x - r) / cls.cell_size)), int(floor((position.x + r) / cls.cell_size))
+        j0, j1 = int(floor((position.z - r) / cls.cell_size)), int(floor((position.z + r) / cls.cell_size))
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(cls.cells):
+            return np.nonzero(cls.indexed)[0]
+        ids = []
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                if (i, j) in cls.cells:
+                    ids += cls.cells[(i, j)]
+        return np.array(ids, dtype=np.int64)
+
+    @classmethod
+    def get_distances(cls, position, ids):
+        v = MachinesStates.positions[ids] - np.array([position.x, position.y, position.z])
+        return np.linalg.norm(v, axis=1) - MachinesStates.radiuses[ids]
+
+    @classmethod
+    def query_range(cls, position: hg.Vec3, radius, mask=None):
+        ids = cls.get_candidates(position, radius)
+        if mask is not None:
+            ids = ids[mask[ids]]
+        if len(ids) == 0:
+            return ids
+        return ids[cls.get_distances(position, ids) < radius]
+
+    @classmethod
+    def query_nearest(cls, position: hg.Vec3, mask):
+        # Nearest indexed machine of the mask, None if there is none
+        ids = np.nonzero(mask & cls.indexed)[0]
+        if len(ids) == 0:
+            return None
+        return ids[np.argmin(cls.get_distances(position, ids))]
+
+    @classmethod
+    def get_mask(cls, machines):
+        # Mask of the listed machines over the MachinesStates arrays.
+        # None if the registry is out of date: a listed machine is active but not registered.
+        if not MachinesStates.flag_valid:
+            return None
+        mask = np.zeros(len(MachinesStates.machines), dtype=bool)
+        for machine in machines:
+            sid = MachinesStates.get_state_id(machine)
+            if sid is not None:
+                mask[sid] = True
+            elif machine.activated and not machine.wreck:
+                return None
+        return mask & cls.indexed
+
+    @classmethod
+    def get_machines(cls, ids):
+        return [MachinesStates.machines[sid] for sid in ids]
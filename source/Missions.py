@@ -487,6 +487,29 @@ class Missions:
 			else:
 				print("Mission configuration json file empty : " + file_name)
 
+		# Same machines setup in each arena:
+		for arena in main.arenas:
+			main.set_current_arena(arena.arena_id)
+			cls.network_mode_setup_arena(main, mission)
+		main.set_current_arena(0)
+
+		# --------- Views setup
+		main.setup_views_carousel(True)
+		main.set_view_carousel("Aircraft_ally_1")# + str(main.num_players_allies))
+		main.set_track_view("back")
+
+		main.user_aircraft = main.get_player_from_caroursel_id(main.views_carousel[main.views_carousel_ptr])
+		main.user_aircraft.set_focus()
+
+		uctrl = main.user_aircraft.get_device("UserControlDevice")
+		if uctrl is not None:
+			uctrl.activate()
+
+		netws.init_server(main)
+		netws.start_server()
+
+	@classmethod
+	def network_mode_setup_arena(cls, main, mission):
 		main.create_aircraft_carriers(mission.allies_carriers, mission.ennemies_carriers)
 		main.create_players(mission.allies, mission.ennemies)
 
@@ -558,23 +581,8 @@ class Missions:
 		ml = main.missile_launchers_ennemies[0]
 		ml.set_platform(plateform)
 
-		# --------- Views setup
-		main.setup_views_carousel(True)
-		main.set_view_carousel("Aircraft_ally_1")# + str(main.num_players_allies))
-		main.set_track_view("back")
-
 		main.init_playground()
 
-		main.user_aircraft = main.get_player_from_caroursel_id(main.views_carousel[main.views_carousel_ptr])
-		main.user_aircraft.set_focus()
-
-		uctrl = main.user_aircraft.get_device("UserControlDevice")
-		if uctrl is not None:
-			uctrl.activate()
-
-		netws.init_server(main)
-		netws.start_server()
-
 	@classmethod
 	def network_mode_end_test(cls, main):
 		"""
@@ -610,14 +618,15 @@ class Missions:
 		Overlays.add_text2D(msg_debriefing, hg.Vec2(0.5, 701 / 900 - 0.15), 0.02, hg.Color(1, 0.9, 0.8, 1), main.hud_font, hg.DTHA_Center)
 
 	@classmethod
-	def init(cls):
-		cls.beep_ref = hg.LoadWAVSoundAsset("sfx/blip.wav")
-		cls.beep_state = tools.create_stereo_sound_state(hg.SR_Once)
-		cls.beep_state.volume = 0.25
-
-		cls.validation_ref = hg.LoadWAVSoundAsset("sfx/blip2.wav")
-		cls.validation_state = tools.create_stereo_sound_state(hg.SR_Once)
-		cls.validation_state.volume = 0.5
+	def init(cls, flag_load_sfx=True):
+		if flag_load_sfx:
+			cls.beep_ref = hg.LoadWAVSoundAsset("sfx/blip.wav")
+			cls.beep_state = tools.create_stereo_sound_state(hg.SR_Once)
+			cls.beep_state.volume = 0.25
+
+			cls.validation_ref = hg.LoadWAVSoundAsset("sfx/blip2.wav")
+			cls.validation_state = tools.create_stereo_sound_state(hg.SR_Once)
+			cls.validation_state.volume = 0.5
 
 		cls.missions.append(Mission("One on one", ["Rafale"], ["F16"], 1, 1, Missions.mission_setup_players, Missions.mission_one_against_x_end_test, Missions.mission_one_against_x_end_phase_update))
 		cls.missions.append(Mission("Network mode", ["F16"], ["F16"], 1, 1, Missions.network_mode_setup, Missions.network_mode_end_test, Missions.network_mode_end_phase_update))
@@ -5,6 +5,7 @@ from MathsSupp import *
 from math import radians, degrees, pi, sqrt, exp
 from random import uniform, random
 import tools
+from Profiler import Profiler
 
 
 class Particle:
@@ -158,6 +159,7 @@ class ParticlesEngine:
 		self.life_t = 0
 
 	def update_kinetics(self, position: hg.Vec3, direction: hg.Vec3, v0: hg.Vec3, axisY: hg.Vec3, dts):
+		Profiler.begin("Particles")
 
 		if self.life_time > 0:
 			self.life_t = min(self.life_time, self.life_t + dts)
@@ -228,3 +230,5 @@ class ParticlesEngine:
 
 			self.num_alive = n
 			if n == 0 and not self.loop: self.end = True
+
+		Profiler.end("Particles")
@@ -1,10 +1,15 @@
 # Copyright (C) 2018-2021 Eric Kernin, NWNC HARFANG.
 
 import harfang as hg
+import numpy as np
+import ctypes
+import zlib
+from os import path
 from math import radians, degrees, pi, sqrt, exp, floor, acos, asin
 from MathsSupp import *
 import tools as tools
 from overlays import *
+from Profiler import Profiler
 
 # ================================================================================
 # 物理常量
@@ -17,17 +22,27 @@ scene = None
 scene_physics = None
 water_level = 0
 
+# Arenas (see Arenas.py): collision nodes uid -> arena id. Nodes not registered (terrain, scene) are shared.
+num_arenas = 1
+nodes_arenas = {}
+
+# Collision nodes uid -> owner object (Machines.Collisions_Object), see get_object_by_collision_node()
+nodes_objects = {}
+
 terrain_heightmap = None
+terrain_heights = None  # (h, w) float32: heightmap pixels altitudes (m), before water level clamp
+terrain_normals = None  # (h, w, 3) float32: terrain normals (not normalized) at the heightmap pixels
 terrain_position = hg.Vec3(-24896, -296.87, 9443)
 terrain_scale = hg.Vec3(41480, 1000, 19587)
 map_bounds = hg.Vec2(0, 255)
+terrain_sample_tolerance = 0.5  # m: max horizontal distance between a machine and its tick terrain sample
 
 
 # ================================================================================
 # 地形和环境工具函数
 # ================================================================================
 
-def init_physics(scn, scn_physics, terrain_heightmap_file, p_terrain_pos, p_terrain_scale, p_map_bounds):
+def init_physics(scn, scn_physics, terrain_heightmap_file, p_terrain_pos, p_terrain_scale, p_map_bounds, flag_terrain_cache=True):
 	"""初始化物理系统（地形碰撞等）"""
 	global scene, scene_physics, terrain_heightmap, terrain_position, terrain_scale, map_bounds
 	scene = scn
@@ -36,32 +51,142 @@ def init_physics(scn, scn_physics, terrain_heightmap_file, p_terrain_pos, p_terr
 	terrain_position = p_terrain_pos
 	terrain_scale = p_terrain_scale
 	map_bounds = p_map_bounds
-	hg.LoadPicture(terrain_heightmap, terrain_heightmap_file)
+	if not hg.LoadPicture(terrain_heightmap, terrain_heightmap_file):
+		print("ERROR - Physics - Can't load terrain heightmap: " + terrain_heightmap_file)
+		return
+	init_terrain_grids(terrain_heightmap_file, flag_terrain_cache)
+
+
+def init_terrain_grids(terrain_heightmap_file, flag_terrain_cache):
+	"""
+	Decodes the heightmap once in terrain_heights / terrain_normals.
+	Cache: "<heightmap>.<terrain parameters crc>.npy", rebuilt when the heightmap is newer.
+	"""
+	global terrain_heights, terrain_normals
+	parameters = "%f %f %f %f %f %f %f %f %f" % (terrain_position.x, terrain_position.y, terrain_position.z, terrain_scale.x, terrain_scale.y, terrain_scale.z, map_bounds.x, map_bounds.y, water_level)
+	cache_file = terrain_heightmap_file + ".%08x.npy" % zlib.crc32(parameters.encode())
+
+	if flag_terrain_cache and path.exists(cache_file) and path.getmtime(cache_file) >= path.getmtime(terrain_heightmap_file):
+		grids = np.load(cache_file)
+	else:
+		grids = compute_terrain_grids(terrain_heightmap)
+		if flag_terrain_cache:
+			try:
+				np.save(cache_file, grids)
+			except OSError:
+				print("WARNING - Physics - Can't write terrain cache: " + cache_file)
+	terrain_heights = np.ascontiguousarray(grids[:, :, 0])
+	terrain_normals = np.ascontiguousarray(grids[:, :, 1:4])
+
+
+def compute_terrain_grids(picture: hg.Picture):
+	"""(h, w, 4) float32 array: pixels altitudes and normals (same altitude differences as the heightmap bilinear sampling)"""
+	w = picture.GetWidth()
+	h = picture.GetHeight()
+	# Pictures are loaded in RGBA32, altitude is in the red channel:
+	pixels = np.ctypeslib.as_array((ctypes.c_uint8 * (w * h * 4)).from_address(picture.GetData())).reshape(h, w, 4)
+	heights = ((pixels[:, :, 0].astype(np.float32) - map_bounds.x) / (map_bounds.y - map_bounds.x)) * terrain_scale.y + terrain_position.y
+
+	# Normal: altitudes differences at +/- 1 / max(w, h) in map coordinates, i.e. at fractional pixels offsets
+	def sample_altitude(offset, axis):
+		d = abs(offset)
+		a = heights * (1 - d) + np.roll(heights, -1 if offset > 0 else 1, axis) * d
+		return np.maximum(water_level, a)
+
+	f = 1 / max(w, h)
+	dx = f * w
+	dy = f * h
+	normals = np.empty((h, w, 3), dtype=np.float32)
+	normals[:, :, 0] = sample_altitude(-dx, 1) - sample_altitude(dx, 1)
+	normals[:, :, 1] = 2 * f
+	normals[:, :, 2] = sample_altitude(-dy, 0) - sample_altitude(dy, 0)
+	# Not normalized: interpolated, then normalized by the lookups
+
+	grids = np.empty((h, w, 4), dtype=np.float32)
+	grids[:, :, 0] = heights
+	grids[:, :, 1:4] = normals
+	return grids
 
 
 def get_terrain_altitude(pos: hg.Vec3):
 	"""获取地形高度和法线"""
-	global terrain_position, terrain_scale, terrain_heightmap, map_bounds
-	pos2 = hg.Vec2((pos.x - terrain_position.x) / terrain_scale.x, 1 - (pos.z - terrain_position.z) / terrain_scale.z)
-	return get_map_altitude(pos2), get_terrain_normale(pos2)
+	return get_map_altitude_normale((pos.x - terrain_position.x) / terrain_scale.x, 1 - (pos.z - terrain_position.z) / terrain_scale.z)
+
+
+def get_map_altitude_normale(u, v):
+	"""Altitude and normal at map coordinates (u, v): bilinear sampling of the terrain grids"""
+	h, w = terrain_heights.shape
+	x = (u * w - 0.5) % w
+	y = (v * h - 0.5) % h
+	xi = min(int(x), w - 1)
+	yi = min(int(y), h - 1)
+	xf = x - xi
+	yf = y - yi
+	xi1 = (xi + 1) % w
+	yi1 = (yi + 1) % h
+	k1 = (1 - xf) * (1 - yf)
+	k2 = xf * (1 - yf)
+	k3 = (1 - xf) * yf
+	k4 = xf * yf
+	hs = terrain_heights
+	a = hs.item(yi, xi) * k1 + hs.item(yi, xi1) * k2 + hs.item(yi1, xi) * k3 + hs.item(yi1, xi1) * k4
+	ns = terrain_normals
+	n = hg.Vec3(ns.item(yi, xi, 0) * k1 + ns.item(yi, xi1, 0) * k2 + ns.item(yi1, xi, 0) * k3 + ns.item(yi1, xi1, 0) * k4,
+				ns.item(yi, xi, 1) * k1 + ns.item(yi, xi1, 1) * k2 + ns.item(yi1, xi, 1) * k3 + ns.item(yi1, xi1, 1) * k4,
+				ns.item(yi, xi, 2) * k1 + ns.item(yi, xi1, 2) * k2 + ns.item(yi1, xi, 2) * k3 + ns.item(yi1, xi1, 2) * k4)
+	return max(water_level, a), hg.Normalize(n)
+
+
+def get_terrain_altitudes_normales(x: np.ndarray, z: np.ndarray):
+	"""Vectorized get_terrain_altitude(): world x, z arrays -> altitudes (n,) and normals (n, 3) float32 arrays"""
+	h, w = terrain_heights.shape
+	px = ((x - terrain_position.x) / terrain_scale.x * w - 0.5) % w
+	py = ((1 - (z - terrain_position.z) / terrain_scale.z) * h - 0.5) % h
+	xi = np.minimum(px.astype(np.int32), w - 1)
+	yi = np.minimum(py.astype(np.int32), h - 1)
+	xf = (px - xi).astype(np.float32)
+	yf = (py - yi).astype(np.float32)
+	xi1 = (xi + 1) % w
+	yi1 = (yi + 1) % h
+	k1 = (1 - xf) * (1 - yf)
+	k2 = xf * (1 - yf)
+	k3 = (1 - xf) * yf
+	k4 = xf * yf
+	hs = terrain_heights
+	altitudes = np.maximum(water_level, hs[yi, xi] * k1 + hs[yi, xi1] * k2 + hs[yi1, xi] * k3 + hs[yi1, xi1] * k4)
+	ns = terrain_normals
+	normals = ns[yi, xi] * k1[:, None] + ns[yi, xi1] * k2[:, None] + ns[yi1, xi] * k3[:, None] + ns[yi1, xi1] * k4[:, None]
+	normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+	return altitudes, normals
+
+
+def get_terrain_altitudes(positions: np.ndarray):
+	"""Terrain altitudes (n,) and normals (n, 3) below the (n, 3) positions array"""
+	return get_terrain_altitudes_normales(positions[:, 0], positions[:, 2])
+
+
+def update_terrain_samples(collisions_objects, positions: np.ndarray):
+	altitudes, normals = get_terrain_altitudes(positions)
+	for collisions_object, pos, alt, nrm in zip(collisions_objects, positions.tolist(), altitudes.tolist(), normals.tolist()):
+		collisions_object.terrain_sample = (pos[0], pos[2], alt, hg.Vec3(nrm[0], nrm[1], nrm[2]))
+
+
+def get_collisions_object_terrain_altitude(collisions_object, pos: hg.Vec3):
+	"""Terrain sample of the tick if it was taken close enough to pos, else terrain lookup"""
+	sample = collisions_object.terrain_sample
+	if sample is not None and abs(sample[0] - pos.x) < terrain_sample_tolerance and abs(sample[1] - pos.z) < terrain_sample_tolerance:
+		return sample[2], sample[3]
+	return get_terrain_altitude(pos)
 
 
 def get_map_altitude(pos2d):
 	"""获取地图高度"""
-	global terrain_position, terrain_scale, terrain_heightmap, map_bounds
-	a = (tools.get_pixel_bilinear(terrain_heightmap, pos2d).r * 255 - map_bounds.x) / (map_bounds.y - map_bounds.x)
-	a = max(water_level, a * terrain_scale.y + terrain_position.y)
-	return a
+	return get_map_altitude_normale(pos2d.x, pos2d.y)[0]
 
 
 def get_terrain_normale(pos2d):
 	"""获取地形法线"""
-	w = terrain_heightmap.GetWidth()
-	h = terrain_heightmap.GetHeight()
-	f = 1 / max(w, h)
-	xd = hg.Vec2(f, 0)
-	zd = hg.Vec2(0, f)
-	return hg.Normalize(hg.Vec3(get_map_altitude(pos2d - xd) - get_map_altitude(pos2d + xd), 2 * f, get_map_altitude(pos2d - zd) - get_map_altitude(pos2d + zd)))
+	return get_map_altitude_normale(pos2d.x, pos2d.y)[1]
 
 
 def _compute_atmosphere_temp(altitude):
@@ -86,7 +211,7 @@ def _compute_atmosphere_temp(altitude):
 	return reference_temp + temperature_gradient * (altitude_diff / 1000)
 
 
-def compute_atmosphere_density(altitude):
+def _compute_atmosphere_density(altitude):
 	"""计算大气密度（使用气压公式）"""
 	# Barometric formula
 	# temperature_K : based on ICAO Standard Atmosphere
@@ -98,8 +223,89 @@ def compute_atmosphere_density(altitude):
 	return d
 
 
+# ------------- Atmosphere table: density, temperature, speed of sound and pressure vs altitude
+
+atmosphere_table_step = 1  # m
+atmosphere_table_max_altitude = 30000  # m, above: direct computation
+air_specific_gas_constant = 287.05  # J/(kg·K)
+air_heat_capacity_ratio = 1.4
+
+
+def _build_atmosphere_table():
+	altitudes = np.arange(0, atmosphere_table_max_altitude + atmosphere_table_step, atmosphere_table_step, dtype=np.float64)
+	temperatures = np.where(altitudes < 11e3, 288.15 - 6.5 * altitudes / 1000, 216.65)
+	densities = np.array([_compute_atmosphere_density(alt) for alt in altitudes.tolist()])
+	table = np.empty((len(altitudes), 4), dtype=np.float64)
+	table[:, 0] = densities
+	table[:, 1] = temperatures
+	table[:, 2] = np.sqrt(air_heat_capacity_ratio * air_specific_gas_constant * temperatures)  # speed of sound
+	table[:, 3] = densities * air_specific_gas_constant * temperatures  # pressure (ideal gas)
+	return table
+
+
+atmosphere_table = _build_atmosphere_table()  # columns: density (kg/m3), temperature (K), speed of sound (m/s), pressure (Pa)
+atmosphere_table_rows = atmosphere_table.tolist()  # Python floats for the scalar lookups
+atmosphere_densities = atmosphere_table[:, 0].tolist()
+
+
+def get_atmosphere(altitude):
+	"""(density, temperature, speed of sound, pressure) at altitude, linear interpolation in the atmosphere table"""
+	if 0 <= altitude < atmosphere_table_max_altitude:
+		x = altitude / atmosphere_table_step
+		i = int(x)
+		f = x - i
+		r0 = atmosphere_table_rows[i]
+		r1 = atmosphere_table_rows[i + 1]
+		return r0[0] + (r1[0] - r0[0]) * f, r0[1] + (r1[1] - r0[1]) * f, r0[2] + (r1[2] - r0[2]) * f, r0[3] + (r1[3] - r0[3]) * f
+	t = _compute_atmosphere_temp(altitude)
+	d = _compute_atmosphere_density(altitude)
+	return d, t, sqrt(air_heat_capacity_ratio * air_specific_gas_constant * t), d * air_specific_gas_constant * t
+
+
+def get_atmosphere_array(altitudes: np.ndarray):
+	"""Vectorized get_atmosphere(): (n, 4) array. Altitudes are clamped to the table range"""
+	x = np.clip(altitudes / atmosphere_table_step, 0, len(atmosphere_table) - 1)
+	i = np.minimum(x.astype(np.int32), len(atmosphere_table) - 2)
+	f = (x - i)[:, None]
+	return atmosphere_table[i] * (1 - f) + atmosphere_table[i + 1] * f
+
+
+def compute_atmosphere_density(altitude):
+	"""计算大气密度（大气表插值）"""
+	if 0 <= altitude < atmosphere_table_max_altitude:
+		x = altitude / atmosphere_table_step
+		i = int(x)
+		d0 = atmosphere_densities[i]
+		return d0 + (atmosphere_densities[i + 1] - d0) * (x - i)
+	return _compute_atmosphere_density(altitude)
+
+
+def compute_mach(speed, altitude):
+	return speed / get_atmosphere(altitude)[2]
+
+
+def get_object_by_collision_node(node: hg.Node):
+	"""Object owning the collision node (raycast hit node), None if the node isn't a registered collision node."""
+	return nodes_objects.get(node.GetUid())
+
+
+def raycast_first_hit(p0: hg.Vec3, p1: hg.Vec3, arena_id=0):
+	"""First hit of the ray in the arena (machines of the other arenas are ignored). None if no hit."""
+	if num_arenas <= 1:
+		return scene_physics.RaycastFirstHit(scene, p0, p1)
+	hits = scene_physics.RaycastAllHits(scene, p0, p1)
+	first_hit = None
+	for i in range(hits.size()):
+		hit = hits.at(i)
+		if nodes_arenas.get(hit.node.GetUid(), arena_id) == arena_id:
+			if first_hit is None or hit.t < first_hit.t:
+				first_hit = hit
+	return first_hit
+
+
 def update_collisions(matrix: hg.Mat4, collisions_object, collisions_raycasts):
 	"""更新碰撞检测"""
+	Profiler.begin("Physics.update_collisions")
 	rays_hits = []
 
 	for collision_ray in collisions_raycasts:
@@ -108,15 +314,17 @@ def update_collisions(matrix: hg.Mat4, collisions_object, collisions_raycasts):
 		c_dir = matrix * (collision_ray["position"] + collision_ray["direction"])
 		rc_len = hg.Len(collision_ray["direction"])
 
-		hit = scene_physics.RaycastFirstHit(scene, c_pos, c_dir)
+		hit = raycast_first_hit(c_pos, c_dir, collisions_object.arena_id)
 
-		if 0 < hit.t < rc_len:
+		if hit is not None and 0 < hit.t < rc_len:
 			if not collisions_object.test_collision(hit.node):
 				ray_hits["hits"].append(hit)
 		rays_hits.append(ray_hits)
 
-	terrain_alt, terrain_nrm = get_terrain_altitude(hg.GetT(matrix))
+	terrain_alt, terrain_nrm = get_collisions_object_terrain_altitude(collisions_object, hg.GetT(matrix))
+	collisions_object.terrain_sample = None
 
+	Profiler.end("Physics.update_collisions")
 	return rays_hits, terrain_alt, terrain_nrm
 
 
@@ -241,3 +449,197 @@ def update_physics(matrix, collisions_object, physics_parameters, dts):
 	mat = hg.TransformationMat4(pos, rot_mat)
 
 	return mat, {"v_move": physics_parameters["v_move"], "pitch_attitude": pitch_attitude, "heading": heading, "roll_attitude": roll_attitude}
+
+
+# ================================================================================
+# 导弹向量化积分（structure of arrays）
+# ================================================================================
+#
+# Same guidance and physics as Missile.update_kinetics() + update_physics() (thrust level 1, no lift, no easy steering),
+# computed with NumPy for all the missiles in flight. Orientations are unit quaternions (w, x, y, z).
+# The missiles nodes are only written by Missile.update_collisions(), from get_kinetics().
+
+
+def matrix_to_quaternion(aX: hg.Vec3, aY: hg.Vec3, aZ: hg.Vec3):
+	"""Unit quaternion (w, x, y, z) of the rotation matrix whose columns are aX, aY, aZ"""
+	trace = aX.x + aY.y + aZ.z
+	if trace > 0:
+		s = sqrt(trace + 1) * 2
+		q = [0.25 * s, (aY.z - aZ.y) / s, (aZ.x - aX.z) / s, (aX.y - aY.x) / s]
+	elif aX.x > aY.y and aX.x > aZ.z:
+		s = sqrt(1 + aX.x - aY.y - aZ.z) * 2
+		q = [(aY.z - aZ.y) / s, 0.25 * s, (aY.x + aX.y) / s, (aZ.x + aX.z) / s]
+	elif aY.y > aZ.z:
+		s = sqrt(1 + aY.y - aX.x - aZ.z) * 2
+		q = [(aZ.x - aX.z) / s, (aY.x + aX.y) / s, 0.25 * s, (aZ.y + aY.z) / s]
+	else:
+		s = sqrt(1 + aZ.z - aX.x - aY.y) * 2
+		q = [(aX.y - aY.x) / s, (aZ.x + aX.z) / s, (aZ.y + aY.z) / s, 0.25 * s]
+	n = sqrt(q[0] * q[0] + q[1] * q[1] + q[2] * q[2] + q[3] * q[3])
+	return [q[0] / n, q[1] / n, q[2] / n, q[3] / n]
+
+
+def quaternions_to_matrices(q: np.ndarray):
+	"""(n, 4) unit quaternions -> (n, 3, 3) rotation matrices, columns are the X, Y, Z axes"""
+	w, x, y, z = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+	m = np.empty((len(q), 3, 3))
+	m[:, 0, 0] = 1 - 2 * (y * y + z * z)
+	m[:, 0, 1] = 2 * (x * y - w * z)
+	m[:, 0, 2] = 2 * (x * z + w * y)
+	m[:, 1, 0] = 2 * (x * y + w * z)
+	m[:, 1, 1] = 1 - 2 * (x * x + z * z)
+	m[:, 1, 2] = 2 * (y * z - w * x)
+	m[:, 2, 0] = 2 * (x * z - w * y)
+	m[:, 2, 1] = 2 * (y * z + w * x)
+	m[:, 2, 2] = 1 - 2 * (x * x + y * y)
+	return m
+
+
+def compute_atmosphere_density_array(altitudes: np.ndarray):
+	"""Vectorized compute_atmosphere_density()"""
+	densities = get_atmosphere_array(altitudes)[:, 0]
+	outside = (altitudes < 0) | (altitudes >= atmosphere_table_max_altitude)
+	if outside.any():
+		alt = altitudes[outside]
+		temperatures = np.where(alt < 11e3, 288.15 - 6.5 * alt / 1000, 216.65)
+		densities[outside] = air_density0 * np.exp(-alt / (8.3144621 * temperatures / (0.0289652 * 9.80665)))
+	return densities
+
+
+class MissilesKinetics:
+	missiles = []  # Row i of the arrays is missiles[i], missile.kinetics_id = i
+	n = 0  # Live rows, the arrays capacity doubles when full
+	capacity = 16
+	positions = np.zeros((capacity, 3))
+	velocities = np.zeros((capacity, 3))
+	orientations = np.zeros((capacity, 4))
+	thrust_forces = np.zeros(capacity)
+	drag_coefficients = np.zeros((capacity, 3))
+	angular_frictions = np.zeros((capacity, 3))
+	speed_ceilings = np.zeros(capacity)
+	kinetics_rows = []  # Python lists [position (3), rotation matrix (9, row major), velocity (3)] after the last update
+
+	@classmethod
+	def reset(cls):
+		for missile in cls.missiles:
+			missile.kinetics_id = None
+		cls.missiles = []
+		cls.n = 0
+		cls.kinetics_rows = []
+
+	@classmethod
+	def grow(cls):
+		cls.capacity *= 2
+		for name in ("positions", "velocities", "orientations", "thrust_forces", "drag_coefficients", "angular_frictions", "speed_ceilings"):
+			a = getattr(cls, name)
+			b = np.zeros((cls.capacity,) + a.shape[1:])
+			b[:cls.n] = a[:cls.n]
+			setattr(cls, name, b)
+
+	@classmethod
+	def add(cls, missile, matrix: hg.Mat4, v_move: hg.Vec3):
+		"""Missile state after its current tick: integrated by the next update()"""
+		if missile.kinetics_id is not None:
+			return
+		if cls.n == cls.capacity:
+			cls.grow()
+		i = cls.n
+		pos = hg.GetT(matrix)
+		missile.kinetics_id = i
+		cls.missiles.append(missile)
+		cls.positions[i] = (pos.x, pos.y, pos.z)
+		cls.velocities[i] = (v_move.x, v_move.y, v_move.z)
+		cls.orientations[i] = matrix_to_quaternion(hg.GetX(matrix), hg.GetY(matrix), hg.GetZ(matrix))
+		cls.thrust_forces[i] = missile.f_thrust
+		cls.drag_coefficients[i] = (missile.drag_coeff.x, missile.drag_coeff.y, missile.drag_coeff.z)
+		cls.angular_frictions[i] = (missile.angular_frictions.x, missile.angular_frictions.y, missile.angular_frictions.z)
+		cls.speed_ceilings[i] = missile.speed_ceiling
+		cls.n += 1
+
+	@classmethod
+	def remove(cls, missile):
+		# The last row moves to the removed one
+		i = missile.kinetics_id
+		if i is None:
+			return
+		missile.kinetics_id = None
+		last = cls.n - 1
+		if i != last:
+			moved = cls.missiles[last]
+			cls.missiles[i] = moved
+			moved.kinetics_id = i
+			for a in (cls.positions, cls.velocities, cls.orientations, cls.thrust_forces, cls.drag_coefficients, cls.angular_frictions, cls.speed_ceilings):
+				a[i] = a[last]
+			if len(cls.kinetics_rows) > last:
+				cls.kinetics_rows[i] = cls.kinetics_rows[last]
+		cls.missiles.pop()
+		cls.n = last
+		del cls.kinetics_rows[last:]
+
+	@classmethod
+	def update(cls, dts):
+		n = cls.n
+		if n == 0:
+			cls.kinetics_rows = []
+			return
+		# Views on the live rows: positions and velocities are integrated in place
+		pos = cls.positions[:n]
+		v = cls.velocities[:n]
+		rot = quaternions_to_matrices(cls.orientations[:n])
+		aX, aY, aZ = rot[:, :, 0], rot[:, :, 1], rot[:, :, 2]
+
+		# Guidance: rotation levels toward the targets
+		targets_positions = np.zeros((n, 3))
+		has_target = np.zeros(n, dtype=bool)
+		for i, missile in enumerate(cls.missiles):
+			if missile.target is not None:
+				p = missile.target.get_parent_node().GetTransform().GetPos()
+				targets_positions[i] = (p.x, p.y, p.z)
+				has_target[i] = True
+		target_dir = targets_positions - pos
+		target_dist = np.linalg.norm(target_dir, axis=1, keepdims=True)
+		target_dir = np.divide(target_dir, target_dist, out=np.zeros_like(target_dir), where=target_dist > 0)
+		axis_rot = np.cross(aZ, target_dir)
+		axis_len = np.linalg.norm(axis_rot, axis=1, keepdims=True)
+		steer = has_target[:, None] & (axis_len > 0.001)
+		moment = np.divide(axis_rot, axis_len, out=np.zeros_like(axis_rot), where=steer)
+		angular_levels = np.einsum("nij,ni->nj", rot, moment)
+
+		# Axis speeds, dynamic pressure:
+		spd = np.einsum("nij,ni->nj", rot, v)
+		air_density = compute_atmosphere_density_array(pos[:, 1])
+		q = spd * spd * (0.5 * air_density)[:, None]
+
+		# Thrust, drag, gravity:
+		F_thrust = aZ * cls.thrust_forces[:n, None]
+		F_drag = np.einsum("nij,nj->ni", rot, np.sign(spd) * q * cls.drag_coefficients[:n])
+		v += (F_thrust - F_drag + (F_gravity.x, F_gravity.y, F_gravity.z)) * dts
+		pos += v * dts
+
+		# Rotation:
+		gaussian = np.exp(-np.square(np.abs(spd[:, 2]) * 3.6 * 3 / cls.speed_ceilings[:n]) / 2)
+		angular_speed = angular_levels * q[:, 2:3] * cls.angular_frictions[:n] * gaussian[:, None]
+		torque = np.einsum("nij,nj->ni", rot, angular_speed)
+		moment_speed = np.linalg.norm(torque, axis=1)
+		axis = np.divide(torque, moment_speed[:, None], out=np.zeros_like(torque), where=moment_speed[:, None] > 0)
+		half_angle = moment_speed * dts / 2
+		dq = np.concatenate(((np.cos(half_angle))[:, None], axis * np.sin(half_angle)[:, None]), axis=1)
+		o = cls.orientations[:n]
+		w0, x0, y0, z0 = dq[:, 0], dq[:, 1], dq[:, 2], dq[:, 3]
+		w1, x1, y1, z1 = o[:, 0], o[:, 1], o[:, 2], o[:, 3]
+		o = np.stack((w0 * w1 - x0 * x1 - y0 * y1 - z0 * z1,
+					  w0 * x1 + x0 * w1 + y0 * z1 - z0 * y1,
+					  w0 * y1 - x0 * z1 + y0 * w1 + z0 * x1,
+					  w0 * z1 + x0 * y1 - y0 * x1 + z0 * w1), axis=1)
+		o /= np.linalg.norm(o, axis=1, keepdims=True)
+		cls.orientations[:n] = o
+
+		rot = quaternions_to_matrices(o)
+		cls.kinetics_rows = np.concatenate((pos, rot.reshape(n, 9), v), axis=1).tolist()
+
+	@classmethod
+	def get_kinetics(cls, missile):
+		"""World matrix and v_move of the missile after the last update()"""
+		r = cls.kinetics_rows[missile.kinetics_id]
+		rot = hg.Mat3(hg.Vec3(r[3], r[6], r[9]), hg.Vec3(r[4], r[7], r[10]), hg.Vec3(r[5], r[8], r[11]))
+		return hg.TransformationMat4(hg.Vec3(r[0], r[1], r[2]), rot), hg.Vec3(r[12], r[13], r[14])
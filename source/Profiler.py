@@ -0,0 +1,113 @@
+# Per-subsystem tick profiler.
+# Named scopes are timed with Profiler.begin(name) / Profiler.end(name). The times of a scope are summed over a tick
+# (one Main.update() call), then Profiler.end_tick() stores them in the scope ring buffer (history_size ticks).
+# Scopes are inclusive: nested scopes times are counted in their parent scope too.
+# Shown in the "Profiler" ImGui window (F12) and sent by the GET_PROFILE network command.
+
+import time
+import numpy as np
+
+
+class ProfilerScope:
+
+    def __init__(self, name, history_size):
+        self.name = name
+        self.history = np.zeros(history_size)  # ms per tick
+        self.calls = np.zeros(history_size, dtype=np.int32)  # calls per tick
+        self.index = 0
+        self.count = 0
+
+    def add(self, t, calls):
+        self.history[self.index] = t
+        self.calls[self.index] = calls
+        self.index = (self.index + 1) % len(self.history)
+        self.count = min(self.count + 1, len(self.history))
+
+    def get_stats(self):
+        if self.count == 0:
+            return None
+        values = self.history[:self.count]
+        last = self.history[self.index - 1]
+        return {"last": float(last), "min": float(np.min(values)), "mean": float(np.mean(values)),
+                "p99": float(np.percentile(values, 99)), "max": float(np.max(values)),
+                "calls": float(np.mean(self.calls[:self.count])), "ticks": self.count}
+
+
+class Profiler:
+
+    flag_enabled = False
+    history_size = 600  # Ticks kept per scope
+
+    scopes = {}  # name: ProfilerScope
+    starts = {}  # name: start time of the running scopes
+    tick_times = {}  # name: time summed over the current tick (s)
+    tick_calls = {}  # name: calls in the current tick
+    num_ticks = 0
+
+    @classmethod
+    def enable(cls, flag=True):
+        if flag and not cls.flag_enabled:
+            cls.reset()
+        cls.flag_enabled = flag
+
+    @classmethod
+    def reset(cls):
+        cls.scopes = {}
+        cls.starts = {}
+        cls.tick_times = {}
+        cls.tick_calls = {}
+        cls.num_ticks = 0
+
+    @classmethod
+    def begin(cls, name):
+        if cls.flag_enabled:
+            cls.starts[name] = time.perf_counter()
+
+    @classmethod
+    def end(cls, name):
+        if cls.flag_enabled:
+            t0 = cls.starts.pop(name, None)
+            if t0 is not None:
+                cls.tick_times[name] = cls.tick_times.get(name, 0.0) + time.perf_counter() - t0
+                cls.tick_calls[name] = cls.tick_calls.get(name, 0) + 1
+
+    @classmethod
+    def pause(cls, name):
+        # Stops timing a running scope without counting a call (e.g. a network command around the ticks it runs)
+        if cls.flag_enabled:
+            t0 = cls.starts.pop(name, None)
+            if t0 is not None:
+                cls.tick_times[name] = cls.tick_times.get(name, 0.0) + time.perf_counter() - t0
+
+    @classmethod
+    def resume(cls, name):
+        cls.begin(name)
+
+    @classmethod
+    def end_tick(cls):
+        if not cls.flag_enabled:
+            return
+        for name in cls.tick_times:
+            if name not in cls.scopes:
+                cls.scopes[name] = ProfilerScope(name, cls.history_size)
+        # Known scopes that did not run this tick: 0 ms, 0 calls
+        for name, scope in cls.scopes.items():
+            scope.add(cls.tick_times.get(name, 0.0) * 1000, cls.tick_calls.get(name, 0))
+        cls.tick_times = {}
+        cls.tick_calls = {}
+        cls.num_ticks += 1
+
+    @classmethod
+    def get_stats(cls):
+        # name: {"last", "min", "mean", "p99", "max" (ms per tick), "calls" (mean calls per tick), "ticks"}
+        # Ticks a scope did not run count as 0 ms
+        stats = {}
+        for name, scope in cls.scopes.items():
+            s = scope.get_stats()
+            if s is not None:
+                stats[name] = s
+        return stats
+
+    @classmethod
+    def get_profile(cls):
+        return {"enabled": cls.flag_enabled, "num_ticks": cls.num_ticks, "history_size": cls.history_size, "scopes": cls.get_stats()}
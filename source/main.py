@@ -3,6 +3,8 @@ import argparse
 from network_server import set_init_port
 p = argparse.ArgumentParser()
 p.add_argument('--port', type=int, default=57805)
+p.add_argument('--headless', action='store_true', help="no window, GPU context nor audio: physics, machines and network server only")
+p.add_argument('--arenas', type=int, default=1, help="number of independent arenas simulated in the network mission")
 args = p.parse_args()
 set_init_port(args.port)
 import network_server as netws
@@ -54,6 +56,37 @@ if json_script != "":
     # JSBSim 配置
     Main.flag_use_jsbsim = script_parameters.get("UseJSBSim", False)
     Main.jsbsim_aircraft_type = script_parameters.get("JSBSimAircraft", "f16")
+    Main.jsbsim_rate = script_parameters.get("JSBSimRate", 120)
+    Main.jsbsim_workers = script_parameters.get("JSBSimWorkers", 0)
+    Main.flag_fixed_timestep = script_parameters.get("FixedTimestep", False)
+
+Main.flag_headless = args.headless
+
+# --------------- Headless mode (training farms): no window, GPU context, audio nor visual assets
+
+if Main.flag_headless:
+    hg.SetLogDetailed(False)
+    hg.AddAssetsFolder(Main.assets_compiled)
+
+    Main.init_game_headless()
+    Main.init_arenas(max(1, args.arenas))
+    hg.ResetClock()
+    Main.current_state = states.init_headless_phase()
+
+    try:
+        while not Main.flag_exit:
+            netws.process_commands()
+            if not Main.flag_client_update_mode:
+                Main.update()
+                # No vsync: wait for network commands until the next frame
+                netws.process_commands(Main.timestep / Main.simulation_speed)
+            else:
+                netws.process_commands((1 / 120) / Main.simulation_speed)
+    except KeyboardInterrupt:
+        pass
+
+    netws.stop_server()
+    sys.exit()
 
 # If the VR is enabled the main window becomes useless
 # so we downsize it.
@@ -141,6 +174,7 @@ hg.ImGuiInit(10, imgui_prg, imgui_img_prg)
 # --------------------- Setup dogfight sim
 hg.AudioInit()
 Main.init_game()
+Main.init_arenas(max(1, args.arenas))
 node = Main.scene.GetNode("platform.S400")
 nm = node.GetName()
 
@@ -155,6 +189,9 @@ Main.current_state = states.init_menu_phase()
 while not Main.flag_exit:
     
         Main.update_inputs()
+
+        # Network commands are executed here, between two ticks
+        netws.process_commands()
         
         if (not Main.flag_client_update_mode) or ((not Main.flag_renderless) and Main.flag_client_ask_update_scene):
             # if Main.flag_client_ask_update_scene:
@@ -163,8 +200,8 @@ while not Main.flag_exit:
             Main.update()
         else:
            # 🔧 优化：网络客户端模式下也支持加速
-           # 根据加速倍率调整等待时间
-           time.sleep((1 / 120) / Main.simulation_speed)
+           # 根据加速倍率调整等待时间 - the client drives the simulation: wait for its commands
+           netws.process_commands((1 / 120) / Main.simulation_speed)
             
         Main.update_window()
         # print('line163 launch update window')
@@ -20,6 +20,7 @@ from missile_S400 import *
 from addon_cft import *
 from SmartCamera import *
 import json
+import numpy as np
 import data_converter as dc
 import network_server as netws
 from Sprites import *
@@ -29,9 +30,32 @@ from Missions import *
 from planet_render import *
 from WaterReflection import *
 from overlays import *
+from Arenas import *
+from Profiler import Profiler
 from math import atan
 
 
+class LatchedInput:
+    """
+    Input device polled once per frame (Main.update_inputs()).
+    With several simulation steps per frame, pressed / released events are seen by the first step only, down states by all steps.
+    """
+
+    flag_first_step = True  # Cleared by Main.update_fixed_steps() after the first step of the frame
+
+    def __init__(self, device):
+        self.device = device
+
+    def __getattr__(self, name):
+        return getattr(self.device, name)
+
+    def Pressed(self, *args):
+        return LatchedInput.flag_first_step and self.device.Pressed(*args)
+
+    def Released(self, *args):
+        return LatchedInput.flag_first_step and self.device.Released(*args)
+
+
 class Main:
 
     # Main display configuration (user-defined in "config.json" file)
@@ -77,6 +101,13 @@ class Main:
     simulation_speed = 1.0  # 仿真速度倍数（1.0 = 正常，2.0 = 2倍速，0.5 = 半速）
     max_simulation_speed = 10.0  # 最大加速倍数
     min_simulation_speed = 0.1  # 最小减速倍数
+
+    # Fixed timestep mode ("FixedTimestep" in config.json): the simulation advances by exact timestep increments,
+    # several steps per frame when accelerated. The time left over is kept for the next frame.
+    flag_fixed_timestep = False
+    timestep_accumulator = 0
+    num_frame_steps = 0  # Steps run by the last update
+    max_steps_per_frame = 20  # Beyond, the simulation slows down instead of accumulating late steps
     
     # 性能监控
     flag_show_performance = False  # 显示性能统计
@@ -88,6 +119,12 @@ class Main:
     # JSBSim 飞行动力学引擎
     flag_use_jsbsim = True  # 使用 JSBSim 真实飞行动力学（默认启用）
     jsbsim_aircraft_type = "f16"  # JSBSim 飞机型号 (c172p最稳定, f16战斗机, 737等)
+    jsbsim_rate = 120  # JSBSim 积分频率 (Hz), independent of the frame rate and simulation speed
+    jsbsim_workers = 0  # JSBSim worker processes, all the FDMs stepped concurrently (see JSBSimWorkers.py). 0: FDMs run in the main process
+
+    # Arenas: independent machines sets simulated together (see Arenas.py). The network commands address them by id.
+    arenas = []
+    current_arena_id = 0
 
     flag_network_mode = False
     flag_client_update_mode = False
@@ -96,6 +133,8 @@ class Main:
     wait_till_finish = False #by hs
 
     flag_renderless = False
+    flag_headless = False  # No window, GPU context nor audio (--headless)
+    flag_skip_render = False  # update() simulates only, the frame is not rendered (STEP ticks before the last one)
     flag_running = False
     flag_display_radar_in_renderless = True
     frame_time = 0 # Used to synchronize Renderless display informations
@@ -240,11 +279,12 @@ class Main:
     @classmethod
     def init(cls):
         cls.pl_resources = hg.PipelineResources()
-        cls.keyboard = hg.Keyboard()
-        cls.mouse = hg.Mouse()
-        cls.gamepad = hg.Gamepad()
-        cls.generic_controller = hg.Joystick()
-        Overlays.init()
+        cls.keyboard = LatchedInput(hg.Keyboard())
+        cls.mouse = LatchedInput(hg.Mouse())
+        cls.gamepad = LatchedInput(hg.Gamepad())
+        cls.generic_controller = LatchedInput(hg.Joystick())
+        if not cls.flag_headless:
+            Overlays.init()
         ControlDevice.init(cls.keyboard, cls.mouse, cls.gamepad, cls.generic_controller)
 
     @classmethod
@@ -301,26 +341,8 @@ class Main:
         hg.LoadSceneFromAssets("main.scn", cls.scene, cls.pl_resources, hg.GetForwardPipelineInfo())
         Destroyable_Machine.world_node = cls.scene.GetNode("world_node")
 
-        # Remove Dummies objects:
-
-        nl = cls.scene.GetAllNodes()
-        num = nl.size()
-        for i in range(num):
-            nd = nl.at(i)
-            node_name = nd.GetName()
-            if node_name.split("_")[0] == "dummy":
-                nd.RemoveObject()
-                cls.scene.GarbageCollect()
-
-        # print("GARBAGE: "+str(cls.scene.GarbageCollect()))
-
-        cls.camera_cokpit = cls.scene.GetNode("Camera_cokpit")
-        cls.camera = cls.scene.GetNode("Camera_follow")
-        cls.camera_fps = cls.scene.GetNode("Camera_fps")
-        cls.satellite_camera = cls.scene.GetNode("Camera_satellite")
-        cls.smart_camera = SmartCamera(SmartCamera.TYPE_FOLLOW, cls.keyboard, cls.mouse)
-        #  Camera used in start phase :
-        cls.camera_intro = cls.scene.GetNode("Camera_intro")
+        cls.remove_dummies()
+        cls.setup_cameras()
 
         # Shadows setup
         sun = cls.scene.GetNode("Sun")
@@ -389,6 +411,87 @@ class Main:
 
         cls.scene.Update(0)
 
+    @classmethod
+    def init_game_headless(cls):
+        """
+        Training farms init (--headless): scene graph, physics, machines and network server only.
+        Models, materials and textures are not loaded, there is no window, GPU context nor audio.
+        """
+        AnimatedModel.flag_load_resources = False
+        AnimatedModel.assets_folder = cls.assets_compiled
+        cls.flag_renderless = True
+        cls.flag_display_radar_in_renderless = False
+        cls.flag_sfx = False
+        Destroyable_Machine.flag_activate_particles = False
+
+        cls.init()
+
+        cls.scene = hg.Scene()
+        cls.scene_physics = hg.SceneBullet3Physics()
+        cls.clocks = hg.SceneClocks()
+        cls.scene_physics.StepSimulation(hg.time_from_sec_f(1 / 60))
+
+        hg.LoadSceneFromAssets("main.scn", cls.scene, cls.pl_resources, hg.GetForwardPipelineInfo(), hg.LSSF_All | hg.LSSF_DoNotLoadResources)
+        tools.setup_instances(cls.scene, cls.scene.GetAllNodes(), cls.pl_resources)
+        Destroyable_Machine.world_node = cls.scene.GetNode("world_node")
+
+        cls.remove_dummies()
+        cls.setup_cameras()
+
+        F14.init(cls.scene)
+        F14_2.init(cls.scene)
+        Rafale.init(cls.scene)
+        Sidewinder.init(cls.scene)
+        Meteor.init(cls.scene)
+        Mica.init(cls.scene)
+
+        cls.load_json_script()
+        Missions.init(False)
+
+        terrain_position, terrain_scale = cls.load_terrain_parameters()
+        Physics.init_physics(cls.scene, cls.scene_physics, "pictures/height.png", hg.Vec3(terrain_position.x, -292, terrain_position.z), hg.Vec3(terrain_scale.x, 1000, terrain_scale.z), hg.Vec2(0, 255))
+
+        cls.scene.Update(0)
+
+    @classmethod
+    def remove_dummies(cls):
+        nl = cls.scene.GetAllNodes()
+        num = nl.size()
+        for i in range(num):
+            nd = nl.at(i)
+            node_name = nd.GetName()
+            if node_name.split("_")[0] == "dummy":
+                nd.RemoveObject()
+                cls.scene.GarbageCollect()
+
+        # print("GARBAGE: "+str(cls.scene.GarbageCollect()))
+
+    @classmethod
+    def setup_cameras(cls):
+        cls.camera_cokpit = cls.scene.GetNode("Camera_cokpit")
+        cls.camera = cls.scene.GetNode("Camera_follow")
+        cls.camera_fps = cls.scene.GetNode("Camera_fps")
+        cls.satellite_camera = cls.scene.GetNode("Camera_satellite")
+        cls.smart_camera = SmartCamera(SmartCamera.TYPE_FOLLOW, cls.keyboard.device, cls.mouse.device)  # hg.FpsController() needs the hg devices
+        #  Camera used in start phase :
+        cls.camera_intro = cls.scene.GetNode("Camera_intro")
+
+    @classmethod
+    def load_terrain_parameters(cls, file_name="scripts/planet_parameters.json"):
+        # Terrain placement without PlanetRender (headless mode)
+        terrain_position, terrain_scale = Physics.terrain_position, Physics.terrain_scale
+        file = hg.OpenText(file_name)
+        if not file:
+            print("ERROR - Can't open json file : " + file_name)
+        else:
+            json_script = hg.ReadString(file)
+            hg.Close(file)
+            if json_script != "":
+                script_parameters = json.loads(json_script)
+                terrain_position = dc.list_to_vec3(script_parameters["terrain_position"])
+                terrain_scale = dc.list_to_vec3(script_parameters["terrain_scale"])
+        return terrain_position, terrain_scale
+
     @classmethod
     def update_user_control_mode(cls):
         for machine in cls.destroyables_list:
@@ -434,6 +537,8 @@ class Main:
 
     @classmethod
     def set_renderless_mode(cls, flag: bool):
+        if cls.flag_headless:
+            return  # Always renderless
         cls.flag_renderless = flag
         cls.flag_running = False
         if flag:
@@ -461,8 +566,44 @@ class Main:
             cls.num_fps += ne
         cls.num_fps = cls.num_fps / len(cls.nfps)
 
+    # ----------------- Arenas -------------------------------------------------------------------
+
+    @classmethod
+    def init_arenas(cls, num_arenas):
+        cls.arenas = []
+        for arena_id in range(num_arenas):
+            arena = Arena(arena_id)
+            cls.arenas.append(arena)
+        cls.current_arena_id = 0
+        cls.arenas[0].save(cls)
+        Collisions_Object.current_arena_id = 0
+        Physics.num_arenas = num_arenas
+
+    @classmethod
+    def set_current_arena(cls, arena_id):
+        if arena_id != cls.current_arena_id:
+            cls.arenas[cls.current_arena_id].save(cls)
+            cls.arenas[arena_id].load(cls)
+            cls.current_arena_id = arena_id
+
+    @classmethod
+    def update_timestamps(cls):
+        current_arena_id = cls.current_arena_id
+        for arena in cls.arenas:
+            cls.set_current_arena(arena.arena_id)
+            cls.timestamp += 1
+        cls.set_current_arena(current_arena_id)
+
     @classmethod
     def destroy_players(cls):
+        current_arena_id = cls.current_arena_id
+        for arena in cls.arenas:
+            cls.set_current_arena(arena.arena_id)
+            cls.destroy_arena_players()
+        cls.set_current_arena(current_arena_id)
+
+    @classmethod
+    def destroy_arena_players(cls):
         for aircraft in cls.players_ennemies:
             aircraft.destroy()
         for aircraft in cls.players_allies:
@@ -488,6 +629,7 @@ class Main:
         cls.aircraft_carrier_ennemies = []
         cls.missile_launchers_allies = []
         cls.missile_launchers_ennemies = []
+        Destroyable_Machine.update_list = []
 
         cls.scene_cockpit_aircrafts = []
 
@@ -1224,6 +1366,10 @@ class Main:
                 cls.simulation_speed = 10.0
             
             hg.ImGuiText("Current: %.1fx | Keys: PageUp/PageDown to adjust, Home to reset" % cls.simulation_speed)
+            d, f = hg.ImGuiCheckbox("Fixed timestep", cls.flag_fixed_timestep)
+            if d:
+                cls.flag_fixed_timestep = f
+                cls.timestep_accumulator = 0
             hg.ImGuiSeparator()
 
             d, f = hg.ImGuiCheckbox("Display FPS", cls.flag_display_fps)
@@ -1318,6 +1464,8 @@ class Main:
 
         hg.ImGuiEnd()
 
+        cls.gui_profiler()
+
         cls.selected_aircraft = aircrafts[cls.selected_aircraft_id]
         cls.selected_aircraft.gui()
 
@@ -1356,9 +1504,94 @@ class Main:
         #for dm in Destroyable_Machine.update_list:
         #    dm.update_collision_nodes_matrices()
 
-        for dm in Destroyable_Machine.update_list:
-            dm.update_kinetics(dts)
-            cls.display_machine_vectors(dm)
+        # Missiles in flight, all arenas:
+        Profiler.begin("MissilesKinetics")
+        Physics.MissilesKinetics.update(dts)
+        Profiler.end("MissilesKinetics")
+
+        current_arena_id = cls.current_arena_id
+        machines = []
+        for arena in cls.arenas:
+            cls.set_current_arena(arena.arena_id)
+            machines += Destroyable_Machine.update_list
+        Profiler.begin("TerrainSamples")
+        cls.update_terrain_samples(machines, dts)
+        Profiler.end("TerrainSamples")
+
+        if cls.jsbsim_workers > 0:
+            Profiler.begin("JSBSimWorkers")
+            cls.update_jsbsim_workers(dts)
+            Profiler.end("JSBSimWorkers")
+
+        for arena in cls.arenas:
+            cls.set_current_arena(arena.arena_id)
+            for dm in Destroyable_Machine.update_list:
+                scope = "Kinetics." + type(dm).__name__
+                Profiler.begin(scope)
+                dm.update_kinetics(dts)
+                Profiler.end(scope)
+                cls.display_machine_vectors(dm)
+        cls.set_current_arena(current_arena_id)
+
+        # Bullets fired this tick, all arenas:
+        Profiler.begin("MachineGun.bullets_hits")
+        MachineGun.update_bullets_hits()
+        Profiler.end("MachineGun.bullets_hits")
+
+    @classmethod
+    def gui_profiler(cls):
+        if hg.ImGuiBegin("Profiler"):
+            hg.ImGuiSetWindowPos("Profiler", hg.Vec2(670, 60), hg.ImGuiCond_Once)
+            hg.ImGuiSetWindowSize("Profiler", hg.Vec2(620, 400), hg.ImGuiCond_Once)
+            d, f = hg.ImGuiCheckbox("Profile ticks", Profiler.flag_enabled)
+            if d: Profiler.enable(f)
+            hg.ImGuiSameLine()
+            if hg.ImGuiButton("Reset"):
+                Profiler.reset()
+            hg.ImGuiText("Ticks: %d (history: %d) - ms per tick" % (Profiler.num_ticks, Profiler.history_size))
+            hg.ImGuiSeparator()
+            hg.ImGuiText("%-32s %8s %8s %8s %8s %6s" % ("Scope", "last", "min", "mean", "p99", "calls"))
+            stats = Profiler.get_stats()
+            for name in sorted(stats, key=lambda n: -stats[n]["mean"]):
+                s = stats[name]
+                hg.ImGuiText("%-32s %8.3f %8.3f %8.3f %8.3f %6.1f" % (name, s["last"], s["min"], s["mean"], s["p99"], s["calls"]))
+        hg.ImGuiEnd()
+
+    @classmethod
+    def update_jsbsim_workers(cls, dts):
+        # Controls of all the arenas JSBSim aircrafts, then one concurrent step of their FDMs (see Aircraft.submit_kinetics_jsbsim())
+        from JSBSimWorkers import JSBSimWorkers, JSBSimRemoteAdapter
+        current_arena_id = cls.current_arena_id
+        for arena in cls.arenas:
+            cls.set_current_arena(arena.arena_id)
+            for dm in Destroyable_Machine.update_list:
+                if dm.type == Destroyable_Machine.TYPE_AIRCRAFT and dm.use_jsbsim and isinstance(dm.jsbsim_adapter, JSBSimRemoteAdapter) and dm.jsbsim_adapter.enabled and not dm.jsbsim_adapter.is_lost():
+                    dm.submit_kinetics_jsbsim(dts)
+        cls.set_current_arena(current_arena_id)
+        JSBSimWorkers.step()
+
+    @classmethod
+    def update_machines_states(cls):
+        # World states of all the arenas machines, once the scene systems have applied the kinetics (see Machines.MachinesStates)
+        current_arena_id = cls.current_arena_id
+        machines = []
+        for arena in cls.arenas:
+            cls.set_current_arena(arena.arena_id)
+            machines += Destroyable_Machine.machines_list
+        cls.set_current_arena(current_arena_id)
+        MachinesStates.update(machines)
+
+    @classmethod
+    def update_terrain_samples(cls, machines, dts):
+        # One vectorized terrain query for all the machines, at their predicted positions (see Physics.update_collisions())
+        machines = [dm for dm in machines if dm.activated]
+        if len(machines) == 0:
+            return
+        positions = []
+        for dm in machines:
+            pos = dm.get_parent_node().GetTransform().GetPos() + dm.v_move * dts
+            positions.append([pos.x, pos.y, pos.z])
+        Physics.update_terrain_samples(machines, np.array(positions))
 
     @classmethod
     def clear_display_lists(cls):
@@ -1532,6 +1765,7 @@ class Main:
         res_x = int(cls.resolution.x)
         res_y = int(cls.resolution.y)
         # ========== Display Reflect scene ===================
+        Profiler.begin("Render.reflection")
         cls.water_reflexion.set_camera(cls.scene)
 
         #cls.scene.canvas.color = cls.sea_render.high_atmosphere_color
@@ -1549,15 +1783,19 @@ class Main:
         vid, passId = hg.SubmitSceneToForwardPipeline(vid, cls.scene, hg.IntRect(0, 0, res_x, res_y), vs, cls.pipeline, cls.render_data, cls.pl_resources, cls.water_reflexion.quad_frameBuffer.handle)
 
         cls.water_reflexion.restore_camera(cls.scene)
+        Profiler.end("Render.reflection")
 
         # ========== Display raymarch scene ===================
+        Profiler.begin("Render.sea")
 
         cls.scene.canvas.clear_z = True
         cls.scene.canvas.clear_color = True
         c = cls.scene.GetCurrentCamera()
         vid = cls.sea_render.render(vid, c, hg.Vec2(res_x, res_y), hg.GetColorTexture(cls.water_reflexion.quad_frameBuffer), hg.GetDepthTexture(cls.water_reflexion.quad_frameBuffer), cls.post_process.quad_frameBuffer)
+        Profiler.end("Render.sea")
 
         # ========== Display models scene ===================
+        Profiler.begin("Render.scene")
 
         cls.scene.canvas.clear_z = False
         cls.scene.canvas.clear_color = False
@@ -1569,8 +1807,10 @@ class Main:
 
         # Get quad_frameBuffer.handle to define output frameBuffer
         vid, passId = hg.SubmitSceneToForwardPipeline(vid, cls.scene, hg.IntRect(0, 0, res_x, res_y), vs, cls.pipeline, cls.render_data, cls.pl_resources, cls.post_process.quad_frameBuffer.handle)
+        Profiler.end("Render.scene")
 
         # ==================== Display 3D Overlays ===========
+        Profiler.begin("Render.overlays")
         hg.SetViewFrameBuffer(vid, cls.post_process.quad_frameBuffer.handle)
         hg.SetViewRect(vid, 0, 0, res_x, res_y)
         cam = cls.scene.GetCurrentCamera()
@@ -1621,11 +1861,14 @@ class Main:
 
 
         vid += 1
+        Profiler.end("Render.overlays")
         # ========== Post process:
+        Profiler.begin("Render.post_process")
         cls.scene.canvas.clear_z = True
         cls.scene.canvas.clear_color = True
         cls.post_process.display(vid, cls.pl_resources, cls.resolution)
         cls.max_view_id = vid
+        Profiler.end("Render.post_process")
 
     @classmethod
     def update_renderless(cls, dt):
@@ -1702,6 +1945,7 @@ class Main:
 
             real_dt = hg.TickClock()
             forced_dt = hg.time_from_sec_f(cls.timestep)
+            Profiler.begin("Frame")
 
             if cls.keyboard.Pressed(hg.K_Escape):
                 cls.flag_exit = True
@@ -1740,7 +1984,7 @@ class Main:
                 cls.flag_show_performance = not cls.flag_show_performance
                 print(f"Performance monitor: {'ON' if cls.flag_show_performance else 'OFF'}")
 
-            if cls.flag_gui:
+            if cls.flag_gui and not cls.flag_skip_render:
                 hg.ImGuiBeginFrame(int(cls.resolution.x), int(cls.resolution.y), real_dt, hg.ReadMouse(), hg.ReadKeyboard())
                 cls.smart_camera.update_hovering_ImGui()
                 cls.gui()
@@ -1758,15 +2002,17 @@ class Main:
             import time
             perf_start = time.perf_counter() if cls.flag_show_performance else 0
             
-            # 先计算基础时间步长
-            base_dt = min(forced_dt * 2, real_dt)
-            # 转换为秒并应用仿真速度倍数
-            dt_seconds = hg.time_to_sec_f(base_dt) * cls.simulation_speed
-            # 转换回时间类型用于物理引擎
-            used_dt = hg.time_from_sec_f(dt_seconds)
-            
-            cls.current_state = cls.current_state(dt_seconds) # Minimum frame rate security
-            hg.SceneUpdateSystems(cls.scene, cls.clocks, used_dt, cls.scene_physics, used_dt, 1000)  # ,10,1000)
+            if cls.flag_fixed_timestep:
+                cls.update_fixed_steps(real_dt)
+            else:
+                # 先计算基础时间步长
+                base_dt = min(forced_dt * 2, real_dt)
+                # 转换为秒并应用仿真速度倍数
+                dt_seconds = hg.time_to_sec_f(base_dt) * cls.simulation_speed
+                # 转换回时间类型用于物理引擎
+                used_dt = hg.time_from_sec_f(dt_seconds)
+
+                cls.update_tick(dt_seconds, used_dt) # Minimum frame rate security
             #在这里进行整个物理模型的更新，如果注释掉飞机是停住的，但是不影响选关
             
             # 性能监控：记录物理/逻辑更新时间
@@ -1775,8 +2021,14 @@ class Main:
                 perf_render_start = time.perf_counter()
 
             # =========== Render scene visuals:
-            if not cls.flag_renderless:
+            if cls.flag_headless or cls.flag_skip_render:
+                if cls.flag_show_performance:
+                    cls.perf_render_time = 0
+                    cls.perf_total_time = cls.perf_physics_time
 
+            elif not cls.flag_renderless:
+
+                Profiler.begin("Render")
                 if cls.flag_vr:
                     cls.render_frame_vr()
                 else:
@@ -1784,7 +2036,10 @@ class Main:
 
                 if cls.flag_gui:
                     hg.ImGuiEndFrame(255)
+                Profiler.begin("Render.frame")
                 hg.Frame()
+                Profiler.end("Render.frame")
+                Profiler.end("Render")
                 if cls.flag_vr:
                     hg.OpenVRSubmitFrame(cls.vr_left_fb, cls.vr_right_fb)
                 #hg.UpdateWindow(cls.win)
@@ -1803,15 +2058,57 @@ class Main:
                     cls.perf_render_time = 0
                     cls.perf_total_time = cls.perf_physics_time
 
-            cls.clear_display_lists()
+            # No step this frame (fixed timestep): the last step displays are rendered again
+            if not cls.flag_fixed_timestep or cls.num_frame_steps > 0:
+                cls.clear_display_lists()
+
+            Profiler.end("Frame")
+            Profiler.end_tick()
 
         cls.flag_client_ask_update_scene = False
         cls.wait_till_finish = True #by hs
 
+    @classmethod
+    def update_fixed_steps(cls, real_dt):
+        # Client update mode: one step per update, the client drives the simulation time
+        if cls.flag_client_update_mode:
+            num_steps = 1
+        else:
+            cls.timestep_accumulator += hg.time_to_sec_f(real_dt) * cls.simulation_speed
+            num_steps = int(cls.timestep_accumulator / cls.timestep)
+            if num_steps > cls.max_steps_per_frame:
+                num_steps = cls.max_steps_per_frame
+                cls.timestep_accumulator = num_steps * cls.timestep
+            cls.timestep_accumulator -= num_steps * cls.timestep
+
+        cls.num_frame_steps = num_steps
+        step_dt = hg.time_from_sec_f(cls.timestep)
+        for i in range(num_steps):
+            if i > 0:
+                # Only the last step displays are rendered, and keys are pressed on the first step only
+                cls.clear_display_lists()
+                LatchedInput.flag_first_step = False
+            cls.update_tick(cls.timestep, step_dt)
+        LatchedInput.flag_first_step = True
+
+    @classmethod
+    def update_tick(cls, dts, used_dt):
+        # One simulation step: state function, scene systems, then machines states
+        Profiler.begin("State")
+        cls.current_state = cls.current_state(dts)
+        Profiler.end("State")
+        Profiler.begin("SceneUpdateSystems")
+        hg.SceneUpdateSystems(cls.scene, cls.clocks, used_dt, cls.scene_physics, used_dt, 1000)  # ,10,1000)
+        Profiler.end("SceneUpdateSystems")
+        Profiler.begin("MachinesStates")
+        cls.update_machines_states()
+        Profiler.end("MachinesStates")
+
     @classmethod
     def update_window(cls):
         #if not cls.flag_renderless_mode:
-        hg.UpdateWindow(cls.win)
+        if not cls.flag_headless:
+            hg.UpdateWindow(cls.win)
 
     # ================================ Network ============================================
 
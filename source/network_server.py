@@ -1,8 +1,16 @@
 import threading
+import selectors
+import socket
+import queue
+import struct
+import traceback
+from collections import deque
+from concurrent.futures import Future
 
 import socket_lib
 from Machines import *
 from overlays import *
+from Profiler import Profiler
 import math
 
 # port = [50888, 60886, 60887, 60863, 60864]
@@ -28,6 +36,45 @@ listen_socket_thread = None
 flag_print_log = True
 fire_missile_count = 0
 commands_functions = []
+# Commands sending an answer: a failing one sends an error answer instead, the others no answer (see execute_command())
+answered_commands = {
+	"GET_RUNNING", "GET_TIMESTEP", "STEP", "GET_ARENAS", "STEP_ARENAS", "BATCH", "GET_STATE_SCHEMA",
+	"REGISTER_OBSERVATION_SPEC", "GET_OBSERVATION", "GET_PROFILE",
+	"GET_MACHINE_MISSILES_LIST", "GET_TARGETS_LIST", "GET_HEALTH", "GET_MACHINE_GUN_STATE", "GET_MISSILESDEVICE_SLOTS_STATE",
+	"GET_TARGET_IDX", "GET_MACHINE_CUSTOM_PHYSICS_MODE", "GET_MOBILE_PARTS_LIST", "IS_AUTOPILOT_ACTIVATED", "IS_IA_ACTIVATED",
+	"IS_USER_CONTROL_ACTIVATED",
+	"GET_PLANES_LIST", "GET_PLANESLIST", "GET_PLANE_STATE", "GET_FINISH_FLAG", "GET_GAMEPAD_ACTION", "GET_PLANE_THRUST",
+	"GET_MISSILES_LIST", "GET_MISSILESLIST", "GET_MISSILE_STATE", "GET_MISSILE_TARGETS_LIST",
+	"GET_MISSILE_LAUNCHERS_LIST", "GET_MISSILE_LAUNCHER_STATE"
+}
+max_clients = 8
+clients = []  # Connected clients
+client = None  # Client whose command is running
+# Commands received by the network thread, executed by the main loop between two ticks (see process_commands())
+# Items: (handler, client, data)
+command_queue = queue.Queue()
+wakeup_sockets = None  # Socket pair used by the main loop to wake up the network thread when answers are ready
+
+# Binary states layouts: (field, number of float32). Booleans are encoded 0 / 1, strings fields are json only.
+states_binary_layouts = {
+	"plane": [("timestamp", 1), ("timestep", 1), ("position", 3), ("Euler_angles", 3), ("easy_steering", 1),
+			  ("health_level", 1), ("destroyed", 1), ("wreck", 1), ("crashed", 1), ("active", 1), ("nationality", 1),
+			  ("thrust_level", 1), ("brake_level", 1), ("flaps_level", 1), ("horizontal_speed", 1), ("vertical_speed", 1),
+			  ("linear_speed", 1), ("move_vector", 3), ("linear_acceleration", 1), ("altitude", 1), ("heading", 1),
+			  ("pitch_attitude", 1), ("roll_attitude", 1), ("post_combustion", 1), ("user_pitch_level", 1),
+			  ("user_roll_level", 1), ("user_yaw_level", 1), ("gear", 1), ("ia", 1), ("autopilot", 1),
+			  ("autopilot_heading", 1), ("autopilot_speed", 1), ("autopilot_altitude", 1), ("target_locked", 1)],
+	"missile": [("timestamp", 1), ("timestep", 1), ("position", 3), ("Euler_angles", 3), ("move_vector", 3),
+				("destroyed", 1), ("wreck", 1), ("crashed", 1), ("active", 1), ("nationality", 1), ("altitude", 1),
+				("heading", 1), ("pitch_attitude", 1), ("roll_attitude", 1), ("horizontal_speed", 1),
+				("vertical_speed", 1), ("linear_speed", 1), ("life_delay", 1), ("life_time", 1)],
+	"missile_launcher": [("timestamp", 1), ("timestep", 1), ("position", 3), ("Euler_angles", 3), ("health_level", 1),
+						 ("destroyed", 1), ("wreck", 1), ("active", 1), ("nationality", 1), ("altitude", 1),
+						 ("heading", 1), ("target_locked", 1)]
+}
+states_binary_structs = {}
+for state_type, layout in states_binary_layouts.items():
+	states_binary_structs[state_type] = struct.Struct("<%df" % sum(size for name, size in layout))
 
 
 def set_init_port(port):
@@ -56,8 +103,19 @@ def init_server(main_):
 		"GET_TIMESTEP": get_timestep,
 		"SET_CLIENT_UPDATE_MODE": set_client_update_mode,
 		"UPDATE_SCENE": update_scene,
+		"STEP": step,
+		"GET_ARENAS": get_arenas,
+		"STEP_ARENAS": step_arenas,
 		"DISPLAY_VECTOR": display_vector,
 		"DISPLAY_2DTEXT": display_2DText,
+		"BATCH": batch,
+		"SET_STATE_ENCODING": set_state_encoding,
+		"GET_STATE_SCHEMA": get_state_schema,
+		"REGISTER_OBSERVATION_SPEC": register_observation_spec,
+		"GET_OBSERVATION": get_observation,
+		"ENABLE_PROFILER": enable_profiler,
+		"DISABLE_PROFILER": disable_profiler,
+		"GET_PROFILE": get_profile,
 
 		# Machines
 		"GET_MACHINE_MISSILES_LIST": get_machine_missiles_list,
@@ -78,6 +136,7 @@ def init_server(main_):
 		"SET_TARGET_ID": set_target_id,
 		"RESET_MACHINE_MATRIX": reset_machine_matrix,
 		"RESET_MACHINE": reset_machine,
+		"RESET_MACHINE_STATE": reset_machine_state,
 		"SET_MACHINE_CUSTOM_PHYSICS_MODE": set_machine_custom_physics_mode,
 		"GET_MACHINE_CUSTOM_PHYSICS_MODE": get_machine_custom_physics_mode,
 		"UPDATE_MACHINE_KINETICS": update_machine_kinetics,
@@ -124,7 +183,13 @@ def init_server(main_):
 
 		# Missile launchers
 		"GET_MISSILE_LAUNCHERS_LIST": get_missile_launchers_list,
-		"GET_MISSILE_LAUNCHER_STATE": get_missile_launcher_state
+		"GET_MISSILE_LAUNCHER_STATE": get_missile_launcher_state,
+
+		# Names sent by the clients getters / easy steering functions
+		"GET_PLANESLIST": get_planes_list,
+		"GET_MISSILESLIST": get_missiles_list,
+		"ACTIVATE_EASY_STEERING": activate_plane_easy_steering,
+		"DEACTIVATE_EASY_STEERING": deactivate_plane_easy_steering
 	}
 	server_log = ""
 	msg = "Hostname: %s, IP: %s, port: %d" % (socket_lib.hostname, socket_lib.HOST, dogfight_network_port)
@@ -132,12 +197,57 @@ def init_server(main_):
 	print(msg)
 
 
+class ClientConnection:
+	"""
+	One connected client: framed json stream (4 bytes big endian size + json message) and per connection settings.
+	"""
+
+	def __init__(self, sock, address):
+		self.sock = sock
+		self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		self.address = address
+		self.received = bytearray()
+		self.state_encoding = "json"  # "json" or "binary", chosen by the client with SET_STATE_ENCODING
+		self.observation_specs = {}  # {spec_id: {"fields": [...], "struct": struct.Struct}}
+		self.pending_commands = deque()  # Futures of the queued commands, in reception order
+		self.answers = None  # Answers of the running command
+		self.batch_answers = None  # Answers collected while a BATCH command is running
+
+	def receive(self):
+		# Returns the complete messages received, None if the client is disconnected
+		data = self.sock.recv(65536)
+		if len(data) == 0:
+			return None
+		self.received += data
+		messages = []
+		while len(self.received) >= 4:
+			size = int.from_bytes(self.received[0:4], "big")
+			if len(self.received) < 4 + size:
+				break
+			messages.append(bytes(self.received[4:4 + size]))
+			del self.received[0:4 + size]
+		return messages
+
+	def send_message(self, message):
+		socket_lib.send_message_to(self.sock, message)
+
+	def send_answers(self):
+		# Sends the answers of the executed commands, in order. Failing commands have an error answer (see execute_command()),
+		# only socket errors end the connection.
+		while len(self.pending_commands) > 0 and self.pending_commands[0].done():
+			for answer in self.pending_commands.popleft().result():
+				self.send_message(answer)
+
+	def close(self):
+		self.sock.close()
+
+
 def start_server():
 	global flag_server_running, listen_socket_thread
 	main.flag_client_connected = False
 	flag_server_running = True
-	listen_socket_tread = threading.Thread(target=server_update)
-	listen_socket_tread.start()
+	listen_socket_thread = threading.Thread(target=server_update)
+	listen_socket_thread.start()
 
 
 def stop_server():
@@ -151,43 +261,251 @@ def stop_server():
 
 
 def server_update():
-	global flag_server_running, server_log, flag_server_connected
+	global server_log, wakeup_sockets
+
+	selector = selectors.DefaultSelector()
+	server_socket = socket_lib.create_server_socket(dogfight_network_port, max_clients)
+	selector.register(server_socket, selectors.EVENT_READ, "accept")
+	wakeup_sockets = socket.socketpair()
+	wakeup_sockets[1].setblocking(False)
+	selector.register(wakeup_sockets[0], selectors.EVENT_READ, "wakeup")
 
 	while flag_server_running:
+		for key, mask in selector.select(timeout=0.1):
+			if key.data == "accept":
+				sock, address = server_socket.accept()
+				connected_client = ClientConnection(sock, address)
+				selector.register(sock, selectors.EVENT_READ, connected_client)
+				add_client(connected_client)
+
+			elif key.data == "wakeup":
+				wakeup_sockets[0].recv(4096)
+				for connected_client in list(clients):
+					try:
+						connected_client.send_answers()
+					except Exception as e:
+						print("network_server.py - command ERROR: " + repr(e))
+						selector.unregister(connected_client.sock)
+						remove_client(connected_client)
+
+			else:
+				connected_client = key.data
+				try:
+					messages = connected_client.receive()
+					if messages is None:
+						server_log += "Disconnected"
+					else:
+						for message in messages:
+							future = Future()
+							connected_client.pending_commands.append(future)
+							command_queue.put((execute_command, connected_client, (json.loads(message), future)))
+				except:
+					print("network_server.py - server_update ERROR")
+					messages = None
+				if messages is None:
+					selector.unregister(connected_client.sock)
+					remove_client(connected_client)
+
+	for connected_client in list(clients):
+		selector.unregister(connected_client.sock)
+		remove_client(connected_client)
+	selector.close()
+	server_socket.close()
+	for sock in wakeup_sockets:
+		sock.close()
+	wakeup_sockets = None
+
+
+def add_client(connected_client):
+	global server_log
+	clients.append(connected_client)
+	msg = "{} connected".format(connected_client.address)
+	print(msg)
+	server_log += msg
+	command_queue.put((client_connected, connected_client, None))
+
+
+def remove_client(connected_client):
+	global server_log
+	clients.remove(connected_client)
+	connected_client.close()
+	msg = "Socket closed"
+	server_log += msg
+	print(msg)
+	command_queue.put((client_disconnected, connected_client, None))
+
+
+def process_commands(timeout=0):
+	"""
+	Called by the main loop: executes the queued network commands.
+	timeout: time to wait for a first command (seconds), 0: returns immediately if the queue is empty.
+	"""
+	flag_answers = False
+	try:
+		if timeout > 0:
+			item = command_queue.get(timeout=timeout)
+		else:
+			item = command_queue.get_nowait()
+		while True:
+			handler, connected_client, data = item
+			handler(connected_client, data)
+			flag_answers = True
+			item = command_queue.get_nowait()
+	except queue.Empty:
+		pass
+
+	if flag_answers and wakeup_sockets is not None:
 		try:
-			socket_lib.listener_socket(dogfight_network_port)
-			print(socket_lib.logger)
-			server_log += socket_lib.logger
-			flag_server_connected = True
-			main.flag_client_connected = True
-			while flag_server_connected:
-				answ = socket_lib.get_answer()
-				answ.decode()
-				command = json.loads(answ)
-				if command == "":
-					server_log += "Disconnected"
-					flag_server_connected = False
-					main.flag_client_connected = False
-				else:
-					msg = "command:" + command["command"]
-					if flag_print_log:
-						print(msg)
-						server_log += msg
-					commands_functions[command["command"]](command["args"])
-
-		except:
-			print("network_server.py - server_update ERROR")
-			flag_server_connected = False
-			main.flag_client_connected = False
-			main.flag_client_update_mode = False
-			main.set_renderless_mode(False)
-			msg = "Socket closed"
-			server_log += msg
-			print(msg)
+			wakeup_sockets[1].send(b"\0")
+		except BlockingIOError:
+			pass  # The network thread already has wake-ups to read
+
+
+def client_connected(connected_client, data):
+	global flag_server_connected
+	flag_server_connected = True
+	main.flag_client_connected = True
+
+
+def client_disconnected(connected_client, data):
+	global flag_server_connected
+	# Last client gone: back to the standalone simulation
+	if len(clients) == 0:
+		flag_server_connected = False
+		main.flag_client_connected = False
+		main.flag_client_update_mode = False
+		main.set_renderless_mode(False)
+
+
+def execute_command(connected_client, data):
+	global client, server_log
+	command, future = data
+	if flag_print_log:
+		msg = "command:" + command["command"]
+		print(msg)
+		server_log += msg
+	client = connected_client
+	client.answers = []
+	Profiler.begin("Network.commands")
+	try:
+		run_command(command)
+		future.set_result(client.answers)
+	except Exception as e:
+		# The connection stays open: the client gets an error answer if it waits for one
+		future.set_result(get_error_answers(command, e))
+	finally:
+		client.answers = None
+		client = None
+		Profiler.end("Network.commands")
+
+
+def get_error_answers(command, exception):
+	name = command.get("command") if isinstance(command, dict) else None
+	name = name if isinstance(name, str) else None
+	print("ERROR - Network command " + str(name) + " failed: " + repr(exception))
+	traceback.print_exc()
+	if len(client.answers) > 0:
+		return client.answers  # Answer already sent before the error
+	if name in answered_commands or name not in commands_functions:
+		# Unknown command: the client may be waiting for an answer
+		return [str.encode(json.dumps({"error": repr(exception)}))]
+	return []
+
+
+def run_command(command):
+	# "arena" argument: the command runs on this arena, then the current arena is restored
+	function = commands_functions.get(command["command"])
+	if function is None:
+		raise ValueError("Unknown command: " + str(command["command"]))
+	args = command["args"]
+	if isinstance(args, dict) and "arena" in args:
+		current_arena_id = main.current_arena_id
+		main.set_current_arena(args["arena"])
+		try:
+			function(args)
+		finally:
+			main.set_current_arena(current_arena_id)
+	else:
+		function(args)
+
+
+def send_message(message):
+	# Answers are sent by the network thread. While a BATCH is running, they are collected and sent back in one message.
+	if client.batch_answers is not None:
+		client.batch_answers.append(message)
+	else:
+		client.answers.append(message)
+
+
+def encode_state(state, state_type):
+	values = []
+	for name, size in states_binary_layouts[state_type]:
+		if size == 1:
+			values.append(float(state[name]))
+		else:
+			values += state[name]
+	return states_binary_structs[state_type].pack(*values)
+
+
+def send_state(state, state_type):
+	# Binary encoding is not used inside a BATCH, whose answer is a json list
+	if client.state_encoding == "binary" and client.batch_answers is None:
+		send_message(encode_state(state, state_type))
+	else:
+		send_message(str.encode(json.dumps(state)))
 
 
 # Globals
 
+def set_state_encoding(args):
+	if args["encoding"] in ["json", "binary"]:
+		client.state_encoding = args["encoding"]
+	else:
+		print("ERROR - Unknown state encoding: " + str(args["encoding"]))
+
+
+def get_state_schema(args):
+	"""
+	Binary layout of a state type ("plane", "missile", "missile_launcher").
+	Offsets and sizes are counted in float32 (little endian).
+	"""
+	state_type = args["state_type"]
+	fields = {}
+	offset = 0
+	for name, size in states_binary_layouts[state_type]:
+		fields[name] = {"offset": offset, "size": size}
+		offset += size
+	schema = {"state_type": state_type, "dtype": "<f4", "size": offset, "fields": fields}
+	send_message(str.encode(json.dumps(schema)))
+
+
+def batch(args):
+	"""
+	Runs an ordered list of commands and sends back all their answers in one message.
+	args["commands"]: list of {"command": name, "args": {...}}
+	Answer: json list with one entry per command (null for commands without answer, {"error": ...} for failing commands).
+	"""
+	answers = []
+	try:
+		for command in args["commands"]:
+			client.batch_answers = []
+			if flag_print_log:
+				print("batch command:" + command["command"])
+			try:
+				run_command(command)
+			except Exception as e:
+				print("ERROR - Batch command " + str(command.get("command")) + " failed: " + repr(e))
+				traceback.print_exc()
+				client.batch_answers = [str.encode(json.dumps({"error": repr(e)}))]
+			if len(client.batch_answers) > 0:
+				answers.append(client.batch_answers[0])
+			else:
+				answers.append(b"null")
+	finally:
+		client.batch_answers = None
+	send_message(b"[" + b",".join(answers) + b"]")
+
+
 def disable_log(args):
 	global flag_print_log
 	flag_print_log = False
@@ -198,17 +516,155 @@ def enable_log(args):
 	flag_print_log = True
 
 
+def enable_profiler(args):
+	# History is reset when the profiler is turned on
+	Profiler.enable(True)
+
+
+def disable_profiler(args):
+	Profiler.enable(False)
+
+
+def get_profile(args):
+	# Per scope: last / min / mean / p99 / max ms per tick, mean calls per tick (see Profiler.get_stats())
+	send_message(str.encode(json.dumps(Profiler.get_profile())))
+
+
 def update_scene(args):
 	main.wait_till_finish = False
 	if main.flag_client_update_mode:
 		if main.flag_renderless:
+			Profiler.pause("Network.commands")  # The tick has its own scopes
 			main.update() # No display, but fast simulation
+			Profiler.resume("Network.commands")
 		else:
 			main.flag_client_ask_update_scene = True # display simulation at 60 fps
 	elif flag_print_log:
 		print("Update_scene ERROR - Client update mode is FALSE")
 
 
+def step(args):
+	"""
+	Fused step: applies the actions, advances the simulation and returns the observations in one message.
+	args["actions"]: {plane_id: {"pitch": level, "roll": level, "yaw": level, "thrust": level, "fire": slot_id}} - all keys optional
+	args["ticks"]: number of Main.update() calls (action repeat)
+	args["observe"]: list of machines ids
+	args["spec_id"]: optional registered observation spec. "observe" items can then be [machine_id, other_id] (see GET_OBSERVATION)
+	Answer: json list of states (same dicts as GET_PLANE_STATE / GET_MISSILE_STATE / GET_MISSILE_LAUNCHER_STATE, or observations)
+	"""
+	apply_actions(args["actions"])
+	advance_simulation(args.get("ticks", 1), "Step")
+
+	flag_binary = client.state_encoding == "binary" and client.batch_answers is None
+	observations = get_step_observations(args, flag_binary)
+	if flag_binary:
+		send_message(observations)
+	else:
+		send_message(str.encode(json.dumps(observations)))
+
+
+def step_arenas(args):
+	"""
+	STEP on all arenas: the actions are applied in each arena, the simulation advances once for all of them.
+	args["actions"]: list of actions dicts (see STEP), one per arena
+	args["ticks"], args["observe"], args["spec_id"]: see STEP. The same machines are observed in each arena.
+	Answer: json list of observations lists, one per arena - binary encoding: records concatenated arena by arena
+	"""
+	current_arena_id = main.current_arena_id
+	try:
+		for arena_id, actions in enumerate(args["actions"]):
+			main.set_current_arena(arena_id)
+			apply_actions(actions)
+	finally:
+		main.set_current_arena(current_arena_id)
+
+	advance_simulation(args.get("ticks", 1), "Step_arenas")
+
+	flag_binary = client.state_encoding == "binary" and client.batch_answers is None
+	arenas_observations = []
+	try:
+		for arena in main.arenas:
+			main.set_current_arena(arena.arena_id)
+			arenas_observations.append(get_step_observations(args, flag_binary))
+	finally:
+		main.set_current_arena(current_arena_id)
+	if flag_binary:
+		send_message(b"".join(arenas_observations))
+	else:
+		send_message(str.encode(json.dumps(arenas_observations)))
+
+
+def get_arenas(args):
+	send_message(str.encode(json.dumps({"num_arenas": len(main.arenas)})))
+
+
+def apply_actions(actions):
+	for plane_id, action in actions.items():
+		machine = main.destroyables_items[plane_id]
+		if "pitch" in action:
+			machine.set_pitch_level(action["pitch"])
+		if "roll" in action:
+			machine.set_roll_level(action["roll"])
+		if "yaw" in action:
+			machine.set_yaw_level(action["yaw"])
+		if "thrust" in action:
+			machine.set_thrust_level(action["thrust"])
+		if action.get("fire") is not None:
+			md = machine.get_device("MissilesDevice")
+			if md is not None:
+				md.fire_missile(int(action["fire"]))
+
+
+def advance_simulation(ticks, command_name):
+	main.wait_till_finish = False
+	if main.flag_client_update_mode:
+		# Network.commands times the command handling only, the ticks have their own scopes
+		Profiler.pause("Network.commands")
+		# Display mode: only the last tick is rendered, the main loop presents it (one window update per frame)
+		try:
+			for i in range(ticks):
+				main.flag_skip_render = i < ticks - 1 and not main.flag_renderless
+				main.update()
+		finally:
+			main.flag_skip_render = False
+		Profiler.resume("Network.commands")
+	elif flag_print_log:
+		print(command_name + " ERROR - Client update mode is FALSE")
+
+
+def get_step_observations(args, flag_binary):
+	"""
+	Observations of the current arena machines listed in args["observe"].
+	Returns the concatenated binary records if flag_binary, else a json-serializable list.
+	"""
+	if args.get("spec_id") is not None:
+		spec = client.observation_specs[args["spec_id"]]
+		observations = []
+		for item in args.get("observe", []):
+			if isinstance(item, str):
+				observations.append(compute_observation(spec, main.destroyables_items[item], None))
+			else:
+				observations.append(compute_observation(spec, main.destroyables_items[item[0]], item[1]))
+		if flag_binary:
+			return b"".join([encode_observation(spec, observation) for observation in observations])
+		return observations
+
+	states = []
+	for machine_id in args.get("observe", []):
+		machine = main.destroyables_items[machine_id]
+		if machine.type == Destroyable_Machine.TYPE_MISSILE:
+			states.append((get_missile_state_dict(machine), "missile"))
+		elif machine.type == Destroyable_Machine.TYPE_MISSILE_LAUNCHER:
+			states.append((get_missile_launcher_state_dict(machine), "missile_launcher"))
+		else:
+			states.append((get_plane_state_dict(machine), "plane"))
+
+	# Binary encoding: states records are concatenated in "observe" order
+	if flag_binary:
+		return b"".join([encode_state(state, state_type) for state, state_type in states])
+	return [state for state, state_type in states]
+
+
 def display_vector(args):
 	if main.flag_client_update_mode:
 		position = hg.Vec3(args["position"][0], args["position"][1], args["position"][2])
@@ -235,12 +691,12 @@ def set_timestep(args):
 
 def get_timestep(args):
 	ts = {"timestep": main.timestep}
-	socket_lib.send_message(str.encode(json.dumps(ts)))
+	send_message(str.encode(json.dumps(ts)))
 
 
 def get_running(args):
 	state = {"running": main.flag_running}
-	socket_lib.send_message(str.encode(json.dumps(state)))
+	send_message(str.encode(json.dumps(state)))
 
 
 def set_renderless_mode(args):
@@ -255,6 +711,125 @@ def set_client_update_mode(args):
 	main.flag_client_update_mode = args["flag"]
 
 
+# Observation specs
+# Only the registered fields are computed. Relative fields ("relative_...") are computed against the "other" machine
+# given in the request, or the current target of the TargettingDevice if none.
+
+
+def vec3_to_list(v):
+	return [v.x, v.y, v.z]
+
+
+def get_targetting_device_value(machine, name):
+	td = machine.get_device("TargettingDevice")
+	if td is None:
+		return 0
+	return getattr(td, name)
+
+
+def get_relative_heading(machine, other):
+	h = other.get_heading() - machine.get_heading()
+	return (h + 180) % 360 - 180
+
+
+def get_relative_angle(machine, other):
+	v = other.get_position() - machine.get_position()
+	if hg.Len(v) < 1e-6:
+		return 0
+	return degrees(acos(max(-1, min(1, hg.Dot(machine.get_Z_axis(), hg.Normalize(v))))))
+
+
+# field: (number of values, function(machine, other))
+observation_fields = {
+	"timestamp": (1, lambda machine, other: main.timestamp),
+	"position": (3, lambda machine, other: vec3_to_list(machine.get_position())),
+	"Euler_angles": (3, lambda machine, other: vec3_to_list(machine.get_Euler())),
+	"move_vector": (3, lambda machine, other: vec3_to_list(machine.get_move_vector())),
+	"linear_speed": (1, lambda machine, other: machine.get_linear_speed()),
+	"horizontal_speed": (1, lambda machine, other: machine.get_world_speed()[0]),
+	"vertical_speed": (1, lambda machine, other: machine.get_world_speed()[1]),
+	"linear_acceleration": (1, lambda machine, other: machine.get_linear_acceleration()),
+	"altitude": (1, lambda machine, other: machine.get_altitude()),
+	"heading": (1, lambda machine, other: machine.get_heading()),
+	"pitch_attitude": (1, lambda machine, other: machine.get_pitch_attitude()),
+	"roll_attitude": (1, lambda machine, other: machine.get_roll_attitude()),
+	"health_level": (1, lambda machine, other: machine.health_level),
+	"thrust_level": (1, lambda machine, other: machine.get_thrust_level()),
+	"destroyed": (1, lambda machine, other: machine.flag_destroyed),
+	"wreck": (1, lambda machine, other: machine.wreck),
+	"crashed": (1, lambda machine, other: machine.flag_crashed),
+	"active": (1, lambda machine, other: machine.activated),
+	"target_locked": (1, lambda machine, other: get_targetting_device_value(machine, "target_locked")),
+	"target_angle": (1, lambda machine, other: get_targetting_device_value(machine, "target_angle")),
+	"target_distance": (1, lambda machine, other: get_targetting_device_value(machine, "target_distance")),
+	"target_heading": (1, lambda machine, other: get_targetting_device_value(machine, "target_heading")),
+	"target_altitude": (1, lambda machine, other: get_targetting_device_value(machine, "target_altitude")),
+	"relative_position": (3, lambda machine, other: vec3_to_list(other.get_position() - machine.get_position())),
+	"relative_move_vector": (3, lambda machine, other: vec3_to_list(other.get_move_vector() - machine.get_move_vector())),
+	"relative_distance": (1, lambda machine, other: hg.Len(other.get_position() - machine.get_position())),
+	"relative_angle": (1, get_relative_angle),
+	"relative_heading": (1, get_relative_heading)
+}
+
+
+def compute_observation(spec, machine, other_id):
+	other = None
+	if other_id is not None:
+		other = main.destroyables_items[other_id]
+	else:
+		td = machine.get_device("TargettingDevice")
+		if td is not None:
+			other = td.get_target()
+	observation = {}
+	for name in spec["fields"]:
+		size, compute = observation_fields[name]
+		if other is None and name.startswith("relative_"):
+			observation[name] = 0 if size == 1 else [0] * size
+		else:
+			observation[name] = compute(machine, other)
+	return observation
+
+
+def encode_observation(spec, observation):
+	values = []
+	for name in spec["fields"]:
+		if observation_fields[name][0] == 1:
+			values.append(float(observation[name]))
+		else:
+			values += observation[name]
+	return spec["struct"].pack(*values)
+
+
+def register_observation_spec(args):
+	"""
+	args["spec_id"]: spec name, args["fields"]: list of observation_fields names.
+	Answer: binary layout of the spec, offsets and sizes counted in float32.
+	"""
+	fields = []
+	layout = {}
+	offset = 0
+	for name in args["fields"]:
+		if name not in observation_fields:
+			print("ERROR - Unknown observation field: " + str(name))
+		else:
+			fields.append(name)
+			size = observation_fields[name][0]
+			layout[name] = {"offset": offset, "size": size}
+			offset += size
+	client.observation_specs[args["spec_id"]] = {"fields": fields, "struct": struct.Struct("<%df" % offset)}
+	schema = {"spec_id": args["spec_id"], "dtype": "<f4", "size": offset, "fields": layout}
+	send_message(str.encode(json.dumps(schema)))
+
+
+def get_observation(args):
+	spec = client.observation_specs[args["spec_id"]]
+	observation = compute_observation(spec, main.destroyables_items[args["machine_id"]], args.get("other_id"))
+	if client.state_encoding == "binary" and client.batch_answers is None:
+		send_message(encode_observation(spec, observation))
+	else:
+		send_message(str.encode(json.dumps(observation)))
+
+
 # Machines
 
 
@@ -275,7 +850,7 @@ def get_machine_custom_physics_mode(args):
 	if flag_print_log:
 		print(args["machine_id"])
 		print(str(state))
-	socket_lib.send_message(str.encode(json.dumps(state)))
+	send_message(str.encode(json.dumps(state)))
 
 
 def update_machine_kinetics(args):
@@ -315,6 +890,21 @@ def reset_machine_matrix(args):
 		machine.flag_landed = False
 
 
+def reset_machine_state(args):
+	# Episode reset: matrix, speed, thrust and JSBSim FDM (restored from initial conditions, the model is not reloaded)
+	machine = main.destroyables_items[args["machine_id"]]
+	pos = hg.Vec3(args["position"][0], args["position"][1], args["position"][2])
+	rot = hg.Vec3(args["rotation"][0], args["rotation"][1], args["rotation"][2])
+	machine.reset_matrix(pos, rot)
+	linear_speed = args.get("linear_speed", 0)
+	machine.set_linear_speed(linear_speed)
+	if machine.type == Destroyable_Machine.TYPE_AIRCRAFT:
+		machine.flag_landed = False
+		if args.get("thrust_level") is not None:
+			machine.reset_thrust_level(args["thrust_level"])
+		machine.reset_jsbsim_state(pos, rot, linear_speed, args.get("trim", False))
+
+
 def get_machine_missiles_list(args):
 	machine = main.destroyables_items[args["machine_id"]]
 	missiles = []
@@ -327,7 +917,7 @@ def get_machine_missiles_list(args):
 				missiles.append(missile.name)
 	else:
 		print("ERROR - Machine '" + args["machine_id"] + "' has no MissilesDevice !")
-	socket_lib.send_message(str.encode(json.dumps(missiles)))
+	send_message(str.encode(json.dumps(missiles)))
 
 
 def get_targets_list(args):
@@ -348,7 +938,7 @@ def get_targets_list(args):
 	else:
 		tlist = []
 		print("ERROR - Machine '" + args["machine_id"] + "' has no TargettingDevice !")
-	socket_lib.send_message(str.encode(json.dumps(tlist)))
+	send_message(str.encode(json.dumps(tlist)))
 
 
 def get_mobile_parts_list(args):
@@ -357,7 +947,7 @@ def get_mobile_parts_list(args):
 	parts_id = []
 	for part_id in parts:
 		parts_id.append(part_id)
-	socket_lib.send_message(str.encode(json.dumps(parts_id)))
+	send_message(str.encode(json.dumps(parts_id)))
 
 
 def get_machine_gun_state(args):
@@ -381,7 +971,7 @@ def get_machine_gun_state(args):
 		if flag_print_log:
 			print(args["machine_id"])
 			print(str(state))
-		socket_lib.send_message(str.encode(json.dumps(state)))
+		send_message(str.encode(json.dumps(state)))
 	else:
 		print("ERROR - Machine '" + args["machine_id"] + "' has no MachineGunDevice !")
 
@@ -398,7 +988,7 @@ def get_missiles_device_slots_state(args):
 		if flag_print_log:
 			print(args["machine_id"])
 			print(str(state))
-		socket_lib.send_message(str.encode(json.dumps(state)))
+		send_message(str.encode(json.dumps(state)))
 	else:
 		print("ERROR - Machine '" + args["machine_id"] + "' has no MissilesDevice !")
 
@@ -453,7 +1043,7 @@ def get_health(args):
 	if flag_print_log:
 		print(args["machine_id"])
 		print(str(state))
-	socket_lib.send_message(str.encode(json.dumps(state)))
+	send_message(str.encode(json.dumps(state)))
 
 
 def set_health(args):
@@ -483,7 +1073,7 @@ def get_target_idx(args):
 		}
 		print("ERROR - Machine '" + args["machine_id"] + "' has no TargettingDevice !")
 
-	socket_lib.send_message(str.encode(json.dumps(state)))
+	send_message(str.encode(json.dumps(state)))
 
 
 def set_target_id(args):
@@ -551,7 +1141,7 @@ def is_autopilot_activated(args):
 			"timestep": main.timestep,
 			"autopilot": False
 		}
-	socket_lib.send_message(str.encode(json.dumps(state)))
+	send_message(str.encode(json.dumps(state)))
 
 
 def is_ia_activated(args):
@@ -572,7 +1162,7 @@ def is_ia_activated(args):
 			"timestep": main.timestep,
 			"ia": False
 		}
-	socket_lib.send_message(str.encode(json.dumps(state)))
+	send_message(str.encode(json.dumps(state)))
 
 
 def is_user_control_activated(args):
@@ -593,7 +1183,7 @@ def is_user_control_activated(args):
 			"timestep": main.timestep,
 			"user": False
 		}
-	socket_lib.send_message(str.encode(json.dumps(state)))
+	send_message(str.encode(json.dumps(state)))
 
 
 def activate_user_control(args):
@@ -638,11 +1228,18 @@ def reset_dogfight_loc(args):
 
 def get_finish_flag(args):
 	flag = main.wait_till_finish
-	socket_lib.send_message(str.encode(json.dumps(flag)))
+	send_message(str.encode(json.dumps(flag)))
 
 
 def get_plane_state(args):
-	machine = main.destroyables_items[args["plane_id"]]
+	state = get_plane_state_dict(main.destroyables_items[args["plane_id"]])
+	if flag_print_log:
+		print(args["plane_id"])
+		print(str(state))
+	send_state(state, "plane")
+
+
+def get_plane_state_dict(machine):
 	h_spd, v_spd = machine.get_world_speed()
 
 	gear = machine.get_device("Gear")
@@ -722,10 +1319,7 @@ def get_plane_state(args):
 		"target_id": target_id,
 		"target_locked": target_locked
 	}
-	if flag_print_log:
-		print(args["plane_id"])
-		print(str(state))
-	socket_lib.send_message(str.encode(json.dumps(state)))
+	return state
 
 
 def get_gamepad_action(args):
@@ -741,7 +1335,7 @@ def get_gamepad_action(args):
 		"THRUST": auc.current_thrust,
 		"FIRE": auc.current_fire_missile_count,
 	}
-	socket_lib.send_message(str.encode(json.dumps(action)))
+	send_message(str.encode(json.dumps(action)))
 
 def send_gamepad_action(args):
 	machine = main.destroyables_items[args["plane_id"]]
@@ -756,7 +1350,7 @@ def send_gamepad_action(args):
 		"THRUST": auc.current_thrust,
 		"FIRE": auc.current_fire_missile_count,
 	}
-	socket_lib.send_message(str.encode(json.dumps(action)))
+	send_message(str.encode(json.dumps(action)))
 
 
 def get_planes_list(args):
@@ -766,7 +1360,7 @@ def get_planes_list(args):
 		if dm.type == Destroyable_Machine.TYPE_AIRCRAFT:
 			print(dm.name)
 			planes.append(dm.name)
-	socket_lib.send_message(str.encode(json.dumps(planes)))
+	send_message(str.encode(json.dumps(planes)))
 
 
 def record_plane_start_state(args):
@@ -804,7 +1398,7 @@ def get_plane_thrust(args):
 	if flag_print_log:
 		print(args["plane_id"])
 		print(str(state))
-	socket_lib.send_message(str.encode(json.dumps(state)))
+	send_message(str.encode(json.dumps(state)))
 
 
 def activate_pc(args):
@@ -938,11 +1532,19 @@ def get_missile_launchers_list(args):
 		print(dm.name)
 		if dm.type == Destroyable_Machine.TYPE_MISSILE_LAUNCHER:
 			missile_launchers.append(dm.name)
-	socket_lib.send_message(str.encode(json.dumps(missile_launchers)))
+	send_message(str.encode(json.dumps(missile_launchers)))
 
 
 def get_missile_launcher_state(args):
-	machine = main.destroyables_items[args["machine_id"]]
+	state = get_missile_launcher_state_dict(main.destroyables_items[args["machine_id"]])
+	print("State OK")
+	if flag_print_log:
+		print(args["machine_id"])
+		print(str(state))
+	send_state(state, "missile_launcher")
+
+
+def get_missile_launcher_state_dict(machine):
 	position = machine.get_position()
 	rotation = machine.get_Euler()
 	td = machine.get_device("TargettingDevice")
@@ -968,11 +1570,7 @@ def get_missile_launcher_state(args):
 		"target_id": target_id,
 		"target_locked": target_locked
 	}
-	print("State OK")
-	if flag_print_log:
-		print(args["machine_id"])
-		print(str(state))
-	socket_lib.send_message(str.encode(json.dumps(state)))
+	return state
 
 # Missiles
 
@@ -984,11 +1582,18 @@ def get_missiles_list(args):
 		if dm.type == Destroyable_Machine.TYPE_MISSILE:
 			print(dm.name)
 			missiles.append(dm.name)
-	socket_lib.send_message(str.encode(json.dumps(missiles)))
+	send_message(str.encode(json.dumps(missiles)))
 
 
 def get_missile_state(args):
-	machine = main.destroyables_items[args["missile_id"]]
+	state = get_missile_state_dict(main.destroyables_items[args["missile_id"]])
+	if flag_print_log:
+		print(args["missile_id"])
+		print(str(state))
+	send_state(state, "missile")
+
+
+def get_missile_state_dict(machine):
 	position = machine.get_position()
 	rotation = machine.get_Euler()
 	v_move = machine.get_move_vector()
@@ -1016,10 +1621,7 @@ def get_missile_state(args):
 		"life_delay": machine.life_delay,
 		"life_time": machine.life_cptr
 		}
-	if flag_print_log:
-		print(args["missile_id"])
-		print(str(state))
-	socket_lib.send_message(str.encode(json.dumps(state)))
+	return state
 
 
 def set_missile_life_delay(args):
@@ -1038,4 +1640,4 @@ def get_missile_targets_list(args):
 	targets_ids = ["-None-"]
 	for t in targets:
 		targets_ids.append(t.name)
-	socket_lib.send_message(str.encode(json.dumps(targets_ids)))
+	send_message(str.encode(json.dumps(targets_ids)))
@@ -26,6 +26,8 @@ def connect_socket(c_host, port):
 	# Create a socket (SOCK_STREAM means a TCP socket)
 	sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 	# sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	# Small commands are sent right away (no Nagle delay before the next command answer)
+	sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 	# Connect to server and send data
 	while (1):
 		try:
@@ -47,6 +49,15 @@ def listener_socket(port_):
 	logger = "{} connected".format(address)
 
 
+def create_server_socket(port_, backlog=1):
+	# Listening socket for servers accepting several clients
+	server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	server_socket.bind((HOST, port_))
+	server_socket.listen(backlog)
+	return server_socket
+
+
 def close_socket():
 	sock.close()
 
@@ -100,6 +111,11 @@ def send_message(message):
 	"""
 
 
+def send_message_to(sock_, message):
+	# Same as send_message(), on a given socket
+	sock_.sendall(len(message).to_bytes(4, byteorder='big') + message)
+
+
 def get_answer_header_with_id():
 	received = sock.recv(8)
 	if len(received) <= 0:
@@ -144,3 +160,38 @@ def get_answer(with_id=False, max_size_before_flush=-1):
 		logger = "Error: Crash socket get answer\n {0}".format(sys.exc_info()[0])
 		return None
 
+
+def drain(size):
+	# Reads and discards size bytes
+	while size > 0:
+		received = sock.recv(min(size, 65536))
+		if len(received) == 0:
+			raise ConnectionError("socket closed by the peer")
+		size -= len(received)
+
+
+def get_answer_into(buffer):
+	# Receives a message directly into a writable buffer (bytearray, numpy array...), returns its size
+	global logger
+	try:
+		size = get_answer_header()
+		if size is None:
+			return None
+		view = memoryview(buffer).cast("B")
+		if size > len(view):
+			# The payload is dropped: the next answer header must be read from the stream
+			drain(size)
+			logger = "Error: answer size {0} > buffer size {1}".format(size, len(view))
+			return None
+
+		received = 0
+		while received < size:
+			n = sock.recv_into(view[received:size], size - received)
+			if n == 0:
+				raise ConnectionError("socket closed by the peer")
+			received += n
+
+		return size
+	except Exception:
+		logger = "Error: Crash socket get answer into\n {0}".format(sys.exc_info()[0])
+		return None
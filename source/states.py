@@ -2,6 +2,7 @@
 
 import harfang as hg
 from master import Main
+from Profiler import Profiler
 from Missions import *
 from SmartCamera import *
 from HUD import *
@@ -287,9 +288,25 @@ def init_main_phase():
     return update_main_phase
 
 
+def init_headless_phase():
+    # Training farms (--headless): no menu nor fading, the current mission must be a network mission
+    Main.flag_running = False
+    ParticlesEngine.reset_engines()
+    Destroyable_Machine.reset_machines()
+    mission = Missions.get_current_mission()
+    if mission.setup_players_f != Missions.network_mode_setup:
+        print("WARNING - Headless mode needs a network mission, '" + mission.title + "' started")
+    mission.setup_players(Main)
+
+    Main.num_start_frames = 10
+    Main.timestamp = 0
+    Main.flag_running = True
+    return update_main_phase
+
+
 def update_main_phase(dts):
 
-    Main.timestamp += 1
+    Main.update_timestamps()
     if not Main.flag_renderless:
         Main.post_process.update_fading(dts)
         if Main.flag_sfx:
@@ -304,6 +321,7 @@ def update_main_phase(dts):
         if Main.flag_control_views:
             Main.control_views(Main.keyboard) #进入这里以后开始判断各个按键是否按下，来切换视角
 
+        Profiler.begin("HUD")
         if Main.flag_display_HUD:
             if Main.user_aircraft is not None:
                 if Main.user_aircraft.type == Destroyable_Machine.TYPE_AIRCRAFT:
@@ -313,6 +331,7 @@ def update_main_phase(dts):
 
             if Main.flag_display_selected_aircraft and Main.selected_aircraft is not None:
                 HUD_MissileTarget.display_selected_target(Main, Main.selected_aircraft)
+        Profiler.end("HUD")
 
         if Main.flag_display_landing_trajectories:
             if Main.user_aircraft is not None:
@@ -351,7 +370,9 @@ def update_main_phase(dts):
 
     else:
         if Main.user_aircraft is not None and Main.flag_display_radar_in_renderless:
+            Profiler.begin("HUD")
             HUD_Radar.update(Main, Main.user_aircraft, Main.destroyables_list)
+            Profiler.end("HUD")
 
     # Destroyable_Machines physics & movements update
     Main.update_kinetics(dts)
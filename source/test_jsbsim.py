@@ -58,7 +58,7 @@ def test_jsbsim():
         
         state = adapter_f16.update(1.0/60.0, controls)
         
-        if state and i % 10 == 0:  # 每10帧输出一次
+        if state is not None and i % 10 == 0:  # 每10帧输出一次
             print(f"{i:<8} {state['altitude']:<12.1f} {state['u']:<12.1f} {state['pitch']:<12.2f}")
     
     print("-" * 60)
@@ -84,7 +84,7 @@ def test_jsbsim():
             'brake': 0.0
         })
         
-        if state:
+        if state is not None:
             print(f"  初始状态: 高度={state['altitude']:.1f}m, 速度={state['u']:.1f}m/s")
     
     print()
@@ -218,7 +218,7 @@ def test_jsbsim_detailed():
         }
         state = adapter.update(1.0/60.0, controls)
         
-        if state:
+        if state is not None:
             speeds.append(state['u'])
             altitudes.append(state['altitude'])
     
@@ -1,6 +1,7 @@
 # Copyright (C) 2018-2021 Eric Kernin, NWNC HARFANG.
 
 import harfang as hg
+import struct
 
 
 def get_hierarchy_strate(parent: dict, nodes: hg.NodeList):  # parent={"node":parent_node,"children":[]}
@@ -126,3 +127,65 @@ def get_pixel_bilinear(picture: hg.Picture, pos: hg.Vec2):
     c34 = c3 * (1 - xf) + c4 * xf
     c = c12 * (1 - yf) + c34 * yf
     return c
+
+
+# ------------- Headless loading (no GPU context)
+
+# Compiled model file header: "HGFF" magic, model marker, version, then the bgfx vertex layout (80 bytes)
+model_file_magic = 0x46464748
+model_file_marker = 0x20
+model_file_layout_size = 80
+
+
+def setup_instances(scene: hg.Scene, nodes: hg.NodeList, resources: hg.PipelineResources, flags=hg.LSSF_All | hg.LSSF_DoNotLoadResources):
+    # Scenes loaded with LSSF_DoNotLoadResources don't setup their instances: setup them recursively
+    for i in range(nodes.size()):
+        nd = nodes.at(i)
+        if nd.HasInstance():
+            nd.SetupInstanceFromAssets(resources, hg.GetForwardPipelineInfo(), flags)
+            setup_instances(scene, nd.GetInstanceSceneView().GetNodes(scene), resources, flags)
+
+
+def get_model_file_minmax(file_name):
+    """
+    Reads the bounds stored in a compiled model file, without creating the GPU buffers.
+    Returns the same (flag, hg.MinMax) pair as hg.Object.GetMinMax()
+    """
+    try:
+        with open(file_name, "rb") as file:
+            data = file.read()
+    except OSError:
+        print("ERROR - Can't open model file : " + file_name)
+        return False, hg.MinMax()
+
+    magic, marker, version = struct.unpack_from("<IBB", data, 0)
+    if magic != model_file_magic or marker != model_file_marker or version > 2:
+        print("ERROR - Invalid model file : " + file_name)
+        return False, hg.MinMax()
+
+    offset = 6 + model_file_layout_size
+    bounds = None
+    while True:
+        if version > 1:
+            idx_type_size = data[offset]
+            offset += 1
+            if idx_type_size == 0:
+                break
+        size, = struct.unpack_from("<I", data, offset)  # index buffer
+        if version < 2 and size == 0:
+            break
+        offset += 4 + size
+        size, = struct.unpack_from("<I", data, offset)  # vertex buffer
+        offset += 4 + size
+        size, = struct.unpack_from("<I", data, offset)  # bones table
+        offset += 4 + size * 2
+        mm = struct.unpack_from("<6f", data, offset)
+        offset += 24 + 2  # bounds, material index
+        if bounds is None:
+            bounds = list(mm)
+        else:
+            bounds = [min(bounds[0], mm[0]), min(bounds[1], mm[1]), min(bounds[2], mm[2]), max(bounds[3], mm[3]), max(bounds[4], mm[4]), max(bounds[5], mm[5])]
+
+    if bounds is None:
+        return False, hg.MinMax()
+    return True, hg.MinMax(hg.Vec3(bounds[0], bounds[1], bounds[2]), hg.Vec3(bounds[3], bounds[4], bounds[5]))